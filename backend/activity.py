@@ -0,0 +1,184 @@
+"""In-process pub/sub for friend activity, behind the /feed/stream SSE endpoint.
+
+Writes (`rate_place`, `add_review`, `end_trip`) publish an activity item
+under its author's id. Each open stream subscribes with its user's friend
+ids and is woken only by its friends' events. Published events get an
+increasing sequence number and the last HISTORY of them are kept, so a
+client that reconnects with a Last-Event-ID gets what it missed. Event ids
+carry the hub's epoch: an id from before a restart (or older than the
+history) can't be resumed from, and the stream says so, so the client
+refetches /feed instead.
+
+Events only reach streams connected to the process that handled the write.
+With several workers, a client sees other workers' activity the next time it
+loads /feed, which it does whenever it reconnects without a usable id.
+"""
+import threading
+import time
+from collections import deque
+
+HISTORY = 1000
+
+
+class Subscription:
+    def __init__(self, hub, user_id, friend_ids, last_seq):
+        self.hub = hub
+        self.user_id = user_id
+        self.friend_ids = set(friend_ids)
+        self.last_seq = last_seq
+        # Set when the user's friendships change, so the stream reloads them
+        self.stale = False
+        # Set when a newer stream of the same user took this one's place
+        self.closed = False
+        self._cond = threading.Condition()
+        self._woken = False
+
+    def wake(self):
+        with self._cond:
+            self._woken = True
+            self._cond.notify()
+
+    def wait(self, timeout):
+        """Block until a friend publishes (or `timeout` passes); returns the events not yet seen.
+
+        Returns None when events were missed because the history moved past
+        `last_seq` while this subscriber wasn't reading.
+        """
+        with self._cond:
+            if not self._woken:
+                self._cond.wait(timeout)
+            self._woken = False
+        events = self.hub.since(self.last_seq)
+        if events is None:
+            self.last_seq = self.hub.seq
+            return None
+        if events:
+            self.last_seq = events[-1][0]
+        return [(seq, item) for seq, author_id, item in events if author_id in self.friend_ids]
+
+    def set_friends(self, friend_ids):
+        self.hub._refollow(self, friend_ids)
+
+
+class ActivityHub:
+    def __init__(self, history=HISTORY, max_subscribers=None, max_per_user=None):
+        # Distinguishes this process's event ids from those of earlier runs
+        self.epoch = format(time.time_ns() // 1_000_000, 'x')
+        self.max_subscribers = max_subscribers
+        self.max_per_user = max_per_user
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._history = deque(maxlen=history)  # (seq, author_id, item)
+        self._followers = {}  # author_id -> subscriptions of their friends
+        self._subscriptions = {}  # user_id -> that user's subscriptions (a dict, oldest first)
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def event_id(self, seq):
+        return f"{self.epoch}-{seq}"
+
+    def parse_event_id(self, event_id):
+        """The sequence number in one of this hub's event ids, or None if it can't be resumed from"""
+        epoch, _, seq = (event_id or '').partition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        with self._lock:
+            oldest = self._history[0][0] if self._history else self._seq + 1
+            if seq > self._seq or seq < oldest - 1:
+                return None
+        return seq
+
+    def publish(self, author_id, item):
+        with self._lock:
+            self._seq += 1
+            self._history.append((self._seq, author_id, item))
+            followers = list(self._followers.get(author_id, ()))
+        for subscription in followers:
+            subscription.wake()
+
+    def since(self, seq):
+        """Events after `seq`, oldest first; None if some of them have already been dropped"""
+        with self._lock:
+            if self._history and self._history[0][0] > seq + 1:
+                return None
+            events = []
+            for event in reversed(self._history):
+                if event[0] <= seq:
+                    break
+                events.append(event)
+        events.reverse()
+        return events
+
+    def subscribe(self, user_id, friend_ids, last_seq=None):
+        """A subscription that sees `friend_ids`' events after `last_seq` (default: from now on).
+
+        A user already at `max_per_user` streams has their oldest closed to
+        make room, so one user can't hold every slot. Returns None when
+        `max_subscribers` streams are already open.
+        """
+        replaced = []
+        with self._lock:
+            own = self._subscriptions.get(user_id, {})
+            while self.max_per_user is not None and own and len(own) >= self.max_per_user:
+                oldest = next(iter(own))
+                self._remove(oldest)
+                oldest.closed = True
+                replaced.append(oldest)
+            if self.max_subscribers is not None and self._count() >= self.max_subscribers:
+                return None
+            subscription = Subscription(self, user_id, (), self._seq if last_seq is None else last_seq)
+            self._subscriptions.setdefault(user_id, {})[subscription] = None
+        for old in replaced:
+            old.wake()
+        self._refollow(subscription, friend_ids)
+        return subscription
+
+    def _refollow(self, subscription, friend_ids):
+        with self._lock:
+            if subscription.closed:
+                return
+            for author_id in subscription.friend_ids - set(friend_ids):
+                self._discard(self._followers, author_id, subscription)
+            for author_id in friend_ids:
+                self._followers.setdefault(author_id, set()).add(subscription)
+            subscription.friend_ids = set(friend_ids)
+            subscription.stale = False
+
+    @staticmethod
+    def _discard(index, key, subscription):
+        subscriptions = index.get(key)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del index[key]
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._remove(subscription)
+
+    def _remove(self, subscription):
+        for author_id in subscription.friend_ids:
+            self._discard(self._followers, author_id, subscription)
+        own = self._subscriptions.get(subscription.user_id)
+        if own is not None:
+            own.pop(subscription, None)
+            if not own:
+                del self._subscriptions[subscription.user_id]
+
+    def friendships_changed(self, *user_ids):
+        """Have these users' open streams reload their friends"""
+        with self._lock:
+            subscriptions = [s for user_id in user_ids for s in self._subscriptions.get(user_id, ())]
+        for subscription in subscriptions:
+            subscription.stale = True
+            subscription.wake()
+
+    def _count(self):
+        return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def stats(self):
+        with self._lock:
+            return {'subscribers': self._count(), 'seq': self._seq, 'history': len(self._history)}
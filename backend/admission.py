@@ -0,0 +1,183 @@
+"""Admission control for the endpoints that spend Google and OpenAI quota.
+
+`RateLimiter` keeps a token bucket per key (a user, or a client address),
+so one client's burst can't use up everyone's quota. `ConcurrencyLimiter`
+caps the calls in flight to an upstream across all requests in a process.
+Callers over the cap wait in a bounded queue that takes turns between
+keys, so a user with many queued calls can't starve another user's single
+call. When the queue is full, or a caller has waited `timeout` seconds, it
+gets `Overloaded` right away instead of piling up behind a slow upstream.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError
+from contextlib import asynccontextmanager, contextmanager
+
+from metrics import Counter
+
+admission_decisions = Counter(
+    'wander_admission_total', 'Admission decisions by limit (admitted, queued, cache_only, rejected, timeout)',
+    ('limit', 'outcome')
+)
+
+
+class Overloaded(Exception):
+    """A limit turned the call away; retrying after `retry_after` seconds may succeed"""
+
+    def __init__(self, limit, retry_after=1.0):
+        super().__init__(f"{limit} is over capacity")
+        self.limit = limit
+        self.retry_after = retry_after
+
+
+def parse_rate(value):
+    """'10/60' -> (10, 60.0): 10 requests per 60 seconds. '0' or 'off' disables the limit"""
+    if not value or value.strip().lower() in ('0', 'off', 'none'):
+        return None
+    requests, _, period = value.partition('/')
+    return int(requests), float(period or 1)
+
+
+class RateLimiter:
+    """Token bucket per key: `requests` per `period` seconds, and bursts of up to `burst`.
+
+    Buckets live in process memory. When `processes` workers each keep their
+    own, a client's requests are spread between them, so each bucket holds
+    that worker's share of the rate (and room for at least one request).
+    Buckets for the least recently seen keys are dropped past `max_keys`,
+    which at worst gives an idle client a fresh bucket.
+    """
+
+    def __init__(self, name, requests, period, burst=None, processes=1, max_keys=100000):
+        self.name = name
+        self.capacity = max(1.0, float(burst or requests) / processes)
+        self.refill_rate = requests / period / processes
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+
+    def acquire(self, key, cost=1.0):
+        """Take `cost` tokens; returns 0 when admitted, or the seconds until there will be enough"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated_at) * self.refill_rate)
+            admitted = tokens >= cost
+            if admitted:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        if admitted:
+            return 0.0
+        return (cost - tokens) / self.refill_rate
+
+
+class ConcurrencyLimiter:
+    """At most `limit` calls at once; up to `max_waiting` more wait, at most `max_waiting_per_key` per key.
+
+    Waiting is done on thread-safe futures, so sync (`slot`) and async
+    (`slot_async`) callers share the limit across threads and event loops.
+    """
+
+    def __init__(self, name, limit, max_waiting=None, max_waiting_per_key=4, timeout=2.0):
+        self.name = name
+        self.limit = limit
+        self.max_waiting = limit * 2 if max_waiting is None else max_waiting
+        self.max_waiting_per_key = max_waiting_per_key
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiting = 0
+        self._queues = OrderedDict()  # key -> deque of futures, served round-robin
+
+    def _enter(self, key):
+        """None when a slot was free, otherwise a future that resolves once one is handed over"""
+        with self._lock:
+            if self._active < self.limit and not self._waiting:
+                self._active += 1
+                admission_decisions.inc(limit=self.name, outcome='admitted')
+                return None
+            queue = self._queues.get(key)
+            if self._waiting >= self.max_waiting or (queue and len(queue) >= self.max_waiting_per_key):
+                admission_decisions.inc(limit=self.name, outcome='rejected')
+                raise Overloaded(self.name)
+            future = Future()
+            self._queues.setdefault(key, deque()).append(future)
+            self._waiting += 1
+            admission_decisions.inc(limit=self.name, outcome='queued')
+            return future
+
+    def _exit(self):
+        with self._lock:
+            while self._queues:
+                key, queue = next(iter(self._queues.items()))
+                future = queue.popleft()
+                self._waiting -= 1
+                if queue:
+                    self._queues.move_to_end(key)
+                else:
+                    del self._queues[key]
+                try:
+                    # The slot passes straight to the next waiter
+                    future.set_result(None)
+                    return
+                except InvalidStateError:
+                    continue
+            self._active -= 1
+
+    def _abandon(self, key, future):
+        """A waiter gave up: take it out of the queue, or give back the slot it was just handed"""
+        with self._lock:
+            queue = self._queues.get(key)
+            if not future.done() and queue is not None and future in queue:
+                future.cancel()
+                queue.remove(future)
+                self._waiting -= 1
+                if not queue:
+                    del self._queues[key]
+                return
+        if future.done() and not future.cancelled():
+            self._exit()
+
+    @contextmanager
+    def slot(self, key=None):
+        future = self._enter(key)
+        if future is not None:
+            try:
+                future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                self._abandon(key, future)
+                admission_decisions.inc(limit=self.name, outcome='timeout')
+                raise Overloaded(self.name) from None
+            except BaseException:
+                self._abandon(key, future)
+                raise
+        try:
+            yield
+        finally:
+            self._exit()
+
+    @asynccontextmanager
+    async def slot_async(self, key=None):
+        future = self._enter(key)
+        if future is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.timeout)
+            except asyncio.TimeoutError:
+                self._abandon(key, future)
+                admission_decisions.inc(limit=self.name, outcome='timeout')
+                raise Overloaded(self.name) from None
+            except BaseException:
+                self._abandon(key, future)
+                raise
+        try:
+            yield
+        finally:
+            self._exit()
+
+    def stats(self):
+        with self._lock:
+            return {'limit': self.limit, 'active': self._active, 'waiting': self._waiting}
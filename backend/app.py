@@ -1,37 +1,495 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file, url_for, Response, current_app, g, has_request_context
 from flask_cors import CORS
 import os
 import requests
 import uuid
 import json
+import math
+import random
+import asyncio
+import socket
+import ssl
+import time
+import certifi
+import httpx
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
-from functools import wraps
-from supabase import create_client, Client
-from openai import OpenAI
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.test import EnvironBuilder
+from functools import cache, wraps
+from clients import LazyClient, startup_report, timed
+from single_flight import SingleFlight
+from circuit_breaker import CircuitBreaker, CircuitOpen
+from ttl_cache import TTLCache
+from preferences import apply_rating, empty_profile, profile_from_reviews, rating_stats
+from jobs import JobQueue
+from featured import FeaturedLists, compute_featured_lists
+from place_catalog import PlaceCatalog
+from gazetteer import default_gazetteer
+from activity import ActivityHub
+from batch import BATCH_ENVIRON_KEY, Batch
+from hedging import Hedger
+from export import EXPORT_TABLES, csv_export, gzip_stream, ndjson_export
+from admission import ConcurrencyLimiter, Overloaded, RateLimiter, admission_decisions, parse_rate
+from json_provider import FastJSONProvider
+from http_cache import conditional_get
+from metrics import (
+    InstrumentedSupabase, circuit_transitions, city_geocodes, init_metrics, recommendation_rankings,
+    render_prometheus, stage, upstream_calls,
+)
+from profiling import RequestProfiler, following
+from photo_cache import PhotoCache, CONTENT_TYPES, ORIGINAL_WIDTH, RESIZE_AVAILABLE, resize_image, snap_width
 
 load_dotenv()
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
+init_metrics(app)
 CORS(app)  # Enable CORS for all routes and origins
 
+# Opt-in request profiling: send `X-Profile: 1` with the admin token, or set a
+# sample rate, then fetch results from /admin/profiles
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), '.profiles'))
+profiler = RequestProfiler(
+    app.wsgi_app,
+    PROFILE_DIR,
+    admin_token=ADMIN_TOKEN,
+    sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+    max_files=int(os.getenv("PROFILE_MAX_FILES", "100")),
+    interval=float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+)
+app.wsgi_app = profiler
+app.async_to_sync = following(app.async_to_sync)
+
+# Behind a load balancer, every request comes from the balancer's address.
+# TRUSTED_PROXIES is how many proxies set X-Forwarded-For/-Proto/-Host in
+# front of us, so remote_addr (per-address rate limits) and external URLs
+# are the client's. Leave it at 0 when clients connect directly, or they
+# could pick their own address
+TRUSTED_PROXIES = int(os.getenv("TRUSTED_PROXIES", "0"))
+if TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES, x_host=TRUSTED_PROXIES)
+
 # Google Maps API configuration
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
-PLACES_API_BASE_URL = "https://maps.googleapis.com/maps/api/place"
+GOOGLE_MAPS_API_BASE_URL = os.getenv("GOOGLE_MAPS_API_BASE_URL", "https://maps.googleapis.com/maps/api")
+PLACES_API_BASE_URL = f"{GOOGLE_MAPS_API_BASE_URL}/place"
+PLACE_DETAILS_FIELDS = [
+    'name', 'formatted_address', 'formatted_phone_number', 'website', 'rating',
+    'user_ratings_total', 'opening_hours', 'geometry', 'photos', 'reviews',
+    'types', 'price_level'
+]
+
+# /trip/recommendations is an async view, because it overlaps several upstream
+# calls, and talks to Google and OpenAI over httpx. Flask runs each async view
+# in its own event loop, so every request opens its own AsyncClient rather than
+# sharing one across loops. The TLS context is the expensive part (loading the
+# CA bundle), so it's built once. Views that make a single call stay sync and
+# use requests, with the same timeouts
+UPSTREAM_TIMEOUT = httpx.Timeout(float(os.getenv("UPSTREAM_TIMEOUT", "30")), connect=5.0)
+REQUESTS_TIMEOUT = (UPSTREAM_TIMEOUT.connect, UPSTREAM_TIMEOUT.read)
+
+
+@cache
+def upstream_ssl_context():
+    return ssl.create_default_context(cafile=certifi.where())
+
+
+def upstream_client():
+    return httpx.AsyncClient(timeout=UPSTREAM_TIMEOUT, verify=upstream_ssl_context())
+
+
+def create_supabase():
+    with timed('supabase', 'import'):
+        from supabase import create_client
+    # Wrapped so every query is timed
+    return InstrumentedSupabase(create_client(
+        os.getenv("SUPABASE_URL"),
+        os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    ))
+
+
+def create_openai():
+    with timed('openai', 'import'):
+        from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+
+# The SDKs are imported and the clients built on first use, once per worker
+# process, so booting a worker doesn't pay for them up front
+supabase = LazyClient('supabase', create_supabase)
+openai_client = LazyClient('openai', create_openai)
+
+# Identical concurrent upstream calls (e.g. many users opening the same city)
+# share one in-flight request instead of each paying for their own
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "10"))
+google_flight = SingleFlight(timeout=SINGLE_FLIGHT_TIMEOUT)
+openai_flight = SingleFlight(timeout=SINGLE_FLIGHT_TIMEOUT)
+photo_flight = SingleFlight(timeout=SINGLE_FLIGHT_TIMEOUT)
+
+# Successful Google lookups (geocodes, nearby searches, place details) are
+# reused for a while, so repeat visits to a city don't hit Google again
+GOOGLE_CACHE_TTL = float(os.getenv("GOOGLE_CACHE_TTL", "900"))
+google_cache = TTLCache(maxsize=4096, ttl=GOOGLE_CACHE_TTL)
+GOOGLE_CACHEABLE_STATUSES = {'OK', 'ZERO_RESULTS'}
+
+# Per-client token buckets for the endpoints that spend Google and OpenAI
+# quota, as "<requests>/<seconds>" ("off" disables one). A client over its
+# budget is still answered from the caches, but anything that would reach
+# Google gets a fast 429, and recommendations skip the AI ranking. The
+# buckets are per process, so each of the WEB_CONCURRENCY workers (set by
+# main.py) enforces its share of the rate
+RATE_LIMITS = {
+    'recommendations': os.getenv("RATE_LIMIT_RECOMMENDATIONS", "10/60"),
+    'attractions': os.getenv("RATE_LIMIT_ATTRACTIONS", "60/60"),
+    'attraction_details': os.getenv("RATE_LIMIT_ATTRACTION_DETAILS", "120/60"),
+    'photo': os.getenv("RATE_LIMIT_PHOTO", "120/60"),
+}
+RATE_LIMIT_PROCESSES = max(1, int(os.getenv("WEB_CONCURRENCY") or 1))
+rate_limiters = {
+    name: RateLimiter(name, *rate, processes=RATE_LIMIT_PROCESSES)
+    for name, value in RATE_LIMITS.items() if (rate := parse_rate(value))
+}
+
+# Calls in flight to each upstream, per process. Past the limit, calls wait
+# (taking turns between users) in a bounded queue for up to
+# UPSTREAM_QUEUE_TIMEOUT seconds, then fail fast with a 429
+UPSTREAM_QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "2"))
+google_limiter = ConcurrencyLimiter(
+    'google', int(os.getenv("GOOGLE_MAX_CONCURRENCY", "64")),
+    max_waiting=int(os.getenv("GOOGLE_MAX_WAITING", "128")), timeout=UPSTREAM_QUEUE_TIMEOUT,
+)
+# Google calls on these endpoints that run past the GOOGLE_HEDGE_PERCENTILE of
+# their recent latency get a duplicate call, and the first answer wins. At most
+# GOOGLE_HEDGE_MAX_RATIO extra calls are sent (0 turns hedging off)
+GOOGLE_HEDGED_ENDPOINTS = set(
+    os.getenv("GOOGLE_HEDGED_ENDPOINTS", "place/nearbysearch/json,place/details/json").split(',')
+)
+google_hedger = Hedger(
+    'google',
+    percentile=float(os.getenv("GOOGLE_HEDGE_PERCENTILE", "95")),
+    max_ratio=float(os.getenv("GOOGLE_HEDGE_MAX_RATIO", "0.05")),
+    min_delay=float(os.getenv("GOOGLE_HEDGE_MIN_DELAY", "0.1")),
+)
+# Sync views wait on their hedgeable calls from here, so they can take
+# whichever of the call and its hedge answers first
+google_hedge_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("GOOGLE_HEDGE_THREADS", "32")), thread_name_prefix='google-hedge'
+)
+openai_limiter = ConcurrencyLimiter(
+    'openai', int(os.getenv("OPENAI_MAX_CONCURRENCY", "16")),
+    max_waiting=int(os.getenv("OPENAI_MAX_WAITING", "32")), timeout=UPSTREAM_QUEUE_TIMEOUT,
+)
+
+# Work that shouldn't hold up a response, like warming caches for a new trip
+jobs = JobQueue(
+    workers=int(os.getenv("BACKGROUND_WORKERS", "2")),
+    max_queued=int(os.getenv("BACKGROUND_QUEUE_SIZE", "100")),
+    on_error=lambda name, e: app.logger.warning("Background job %s failed: %s", name, e),
+)
+
+# Featured lists are recomputed from all reviews at most every
+# FEATURED_RECOMPUTE_INTERVAL seconds and stored in Supabase, by whichever
+# worker claims the job's lease (held for FEATURED_RECOMPUTE_LEASE seconds).
+# Each worker reloads the stored snapshot every FEATURED_RELOAD_INTERVAL, and
+# /feed reads it from memory
+FEATURED_RECOMPUTE_INTERVAL = float(os.getenv("FEATURED_RECOMPUTE_INTERVAL", "3600"))
+FEATURED_RECOMPUTE_LEASE = float(os.getenv("FEATURED_RECOMPUTE_LEASE", "600"))
+FEATURED_RELOAD_INTERVAL = float(os.getenv("FEATURED_RELOAD_INTERVAL", "300"))
+FEED_FEATURED_LISTS = 10
+FEATURED_PAGE_SIZE = 20
+SUPABASE_PAGE_SIZE = 1000
+featured_lists = FeaturedLists()
+
+# Every place seen in a Google response is written to the `places` catalog
+# (in batches, off the request path), and /attraction_details answers from the
+# catalog when it has a fresh enough copy instead of calling Google again
+PLACE_CATALOG_MAX_AGE = timedelta(days=float(os.getenv("PLACE_CATALOG_MAX_AGE_DAYS", "30")))
+PLACE_DETAILS_MAX_AGE = timedelta(hours=float(os.getenv("PLACE_DETAILS_MAX_AGE_HOURS", "24")))
+PLACE_CATALOG_FLUSH_INTERVAL = float(os.getenv("PLACE_CATALOG_FLUSH_INTERVAL", "10"))
+# Detail fields the catalog's own columns can answer
+CATALOG_FIELDS = {'place_id', 'name', 'rating', 'user_ratings_total', 'types', 'geometry', 'photos'}
+place_catalog = PlaceCatalog(
+    write=lambda rows: supabase.table('places').upsert(rows, on_conflict='place_id').execute()
+)
+
+# New friend activity is pushed to open /feed/stream connections. Each stream
+# holds a worker thread, so at most FEED_STREAM_LIMIT are open per process
+# (FEED_STREAMS_PER_USER of them per user, a new one replacing the oldest),
+# and each is closed after FEED_STREAM_MAX_AGE seconds (the client reconnects
+# with its Last-Event-ID and picks up where it left off)
+FEED_STREAM_LIMIT = int(os.getenv("FEED_STREAM_LIMIT", "32"))
+FEED_STREAMS_PER_USER = int(os.getenv("FEED_STREAMS_PER_USER", "2"))
+FEED_STREAM_MAX_AGE = float(os.getenv("FEED_STREAM_MAX_AGE", "300"))
+FEED_STREAM_HEARTBEAT = float(os.getenv("FEED_STREAM_HEARTBEAT", "15"))
+FEED_STREAM_RETRY_MS = 3000
+activity_hub = ActivityHub(max_subscribers=FEED_STREAM_LIMIT, max_per_user=FEED_STREAMS_PER_USER)
+
+# /batch runs up to BATCH_MAX_REQUESTS GET sub-requests at once, on a shared
+# pool of BATCH_THREADS threads
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "10"))
+BATCH_THREADS = int(os.getenv("BATCH_THREADS", "16"))
+# Endpoints that don't return a plain JSON body
+BATCH_EXCLUDED_ENDPOINTS = {'batch', 'stream_feed', 'get_photo', 'metrics', 'export_user_data'}
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_THREADS, thread_name_prefix='batch')
 
-# Initialize OpenAI client
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-# Initialize Supabase client
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+@app.before_request
+def start_background_jobs():
+    # Cheap after the first request; starts this worker's job threads and schedules
+    jobs.start()
+
+# Recommendations must answer within RECOMMENDATIONS_DEADLINE seconds. The AI
+# selection gets at most OPENAI_STAGE_BUDGET of what's left, and is skipped
+# (falling back to sorting by rating) when OpenAI keeps failing or running slow
+RECOMMENDATIONS_DEADLINE = float(os.getenv("RECOMMENDATIONS_DEADLINE", "10"))
+OPENAI_STAGE_BUDGET = float(os.getenv("OPENAI_STAGE_BUDGET", "5"))
+OPENAI_MIN_BUDGET = 0.5
+openai_breaker = CircuitBreaker(
+    'openai',
+    failure_rate=float(os.getenv("OPENAI_BREAKER_FAILURE_RATE", "0.5")),
+    slow_call=float(os.getenv("OPENAI_BREAKER_SLOW_CALL", "3")),
+    slow_rate=float(os.getenv("OPENAI_BREAKER_SLOW_RATE", "0.5")),
+    min_calls=int(os.getenv("OPENAI_BREAKER_MIN_CALLS", "5")),
+    window=float(os.getenv("OPENAI_BREAKER_WINDOW", "60")),
+    open_for=float(os.getenv("OPENAI_BREAKER_OPEN_FOR", "30")),
+    probes=int(os.getenv("OPENAI_BREAKER_PROBES", "2")),
+    on_state_change=lambda name, state: circuit_transitions.inc(circuit=name, state=state),
 )
 
+# Place photos are proxied through /photo and cached on disk, so clients never
+# see the API key and each photo is only billed once
+PHOTO_CACHE_DIR = os.getenv("PHOTO_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), '.photo_cache'))
+PHOTO_CACHE_MAX_BYTES = int(os.getenv("PHOTO_CACHE_MAX_MB", "512")) * 1024 * 1024
+PHOTO_MAX_AGE = 60 * 60 * 24 * 365
+photo_cache = PhotoCache(PHOTO_CACHE_DIR, PHOTO_CACHE_MAX_BYTES)
+# Indexes the files already on disk (and those other workers write) off the
+# request path, instead of while the worker boots
+jobs.schedule('sync_photo_cache', photo_cache.sync, photo_cache.sync_interval)
+
+
+def google_flight_key(url, params):
+    return (url, tuple(sorted((k, str(v)) for k, v in params.items())))
+
+
+def client_key():
+    """Who the current request is for (user, else address), for per-client limits and fair queueing.
+
+    The address is only the client's when TRUSTED_PROXIES matches the proxies in front of us.
+    """
+    if not has_request_context():
+        return None
+    return getattr(request, 'user_id', None) or request.remote_addr
+
+
+def cache_only():
+    """Whether the current client is over its rate limit, and may only be served from caches"""
+    return has_request_context() and g.get('rate_limited_for') is not None
+
+
+def too_busy(e):
+    """429 response for an Overloaded limit"""
+    return jsonify({"error": "Too many requests, please try again shortly"}), 429, {
+        'Retry-After': str(max(1, math.ceil(e.retry_after)))
+    }
+
+
+def rate_limited(name):
+    """Decorator that charges a request to the client's RATE_LIMITS[name] bucket.
+
+    Requests over the limit still run, in cache-only mode (see cache_only).
+    Put it inside require_auth so the bucket is the user's, not their address's.
+    """
+    limiter = rate_limiters.get(name)
+    
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if limiter is not None:
+                retry_after = limiter.acquire(client_key())
+                if retry_after:
+                    g.rate_limited_for = retry_after
+                    admission_decisions.inc(limit=name, outcome='cache_only')
+            
+            # ensure_sync lets the decorator wrap async views too
+            return current_app.ensure_sync(f)(*args, **kwargs)
+        
+        return decorated_function
+    
+    return decorator
+
+
+def google_get(url, params):
+    """GET a Google Maps API endpoint and return the parsed JSON body"""
+    key = google_flight_key(url, params)
+    cached = google_cache.get(key)
+    if cached is not None:
+        return cached
+    if cache_only():
+        raise Overloaded('rate_limit', g.rate_limited_for)
+
+    def send():
+        upstream_calls.inc(upstream='google')
+        return requests.get(url, params=params, timeout=REQUESTS_TIMEOUT)
+
+    def fetch():
+        endpoint = url.rsplit('/api/', 1)[-1]
+        with google_limiter.slot(client_key()):
+            if endpoint in GOOGLE_HEDGED_ENDPOINTS:
+                response = google_hedger.run_sync(endpoint, send, google_hedge_executor)
+            else:
+                response = send()
+        response.raise_for_status()
+        data = response.json()
+        if data.get('status') in GOOGLE_CACHEABLE_STATUSES:
+            google_cache.put(key, data)
+        return data
+
+    with stage('google'):
+        return google_flight.do(key, fetch)
+
+
+async def google_get_async(http, url, params, warmup=None):
+    """Like `google_get`, from an async view.
+
+    On a cache miss, `warmup()` (if given) is awaited first, since it may
+    fill the cache from another worker's warm job (see load_warmup).
+    """
+    key = google_flight_key(url, params)
+    cached = google_cache.get(key)
+    if cached is None and warmup is not None:
+        await warmup()
+        cached = google_cache.get(key)
+    if cached is not None:
+        record_warmed_google(url, params, cached)
+        return cached
+    if cache_only():
+        raise Overloaded('rate_limit', g.rate_limited_for)
+
+    async def send():
+        upstream_calls.inc(upstream='google')
+        return await http.get(url, params=params)
+
+    async def fetch():
+        endpoint = url.rsplit('/api/', 1)[-1]
+        async with google_limiter.slot_async(client_key()):
+            if endpoint in GOOGLE_HEDGED_ENDPOINTS:
+                response = await google_hedger.run(endpoint, send)
+            else:
+                response = await send()
+        response.raise_for_status()
+        data = response.json()
+        if data.get('status') in GOOGLE_CACHEABLE_STATUSES:
+            google_cache.put(key, data)
+        return data
+
+    with stage('google'):
+        data = await google_flight.do_async(key, fetch)
+    record_warmed_google(url, params, data)
+    return data
+
+
+async def openai_chat_async(http, **kwargs):
+    """Run a chat completion and return the text of the first choice.
+
+    Raises CircuitOpen while OpenAI has been failing or slow. Only the call
+    that actually goes to OpenAI asks the circuit breaker and reports to it;
+    requests sharing that call through openai_flight don't, so one slow
+    call counts once.
+    """
+    key = json.dumps(kwargs, sort_keys=True)
+
+    async def fetch():
+        if not openai_breaker.allow():
+            raise CircuitOpen(openai_breaker.name)
+        started = None
+        try:
+            async with openai_limiter.slot_async(client_key()):
+                upstream_calls.inc(upstream='openai')
+                started = time.monotonic()
+                client = openai_client.with_options(http_client=http)
+                response = await client.chat.completions.create(**kwargs)
+        except asyncio.CancelledError:
+            # Cut short by our own deadline, which only says something about
+            # OpenAI if the call had already run slow
+            elapsed = time.monotonic() - started if started is not None else 0.0
+            if elapsed >= openai_breaker.slow_call:
+                openai_breaker.record(True, elapsed)
+            else:
+                openai_breaker.release()
+            raise
+        except Exception:
+            if started is None:
+                # Turned away by our own limit before it got to OpenAI
+                openai_breaker.release()
+            else:
+                openai_breaker.record(False, time.monotonic() - started)
+            raise
+        openai_breaker.record(True, time.monotonic() - started)
+        return response.choices[0].message.content
+
+    with stage('openai'):
+        return await openai_flight.do_async(key, fetch)
+
+
+def google_photo(photo_reference, max_width):
+    """Download a Place photo from Google at up to `max_width` pixels wide"""
+    if cache_only():
+        raise Overloaded('rate_limit', g.rate_limited_for)
+
+    def fetch():
+        with google_limiter.slot(client_key()):
+            upstream_calls.inc(upstream='google')
+            response = requests.get(f"{PLACES_API_BASE_URL}/photo", params={
+                'maxwidth': max_width,
+                'photoreference': photo_reference,
+                'key': GOOGLE_MAPS_API_KEY
+            }, timeout=REQUESTS_TIMEOUT)
+            response.raise_for_status()
+            return response.content
+
+    with stage('google'):
+        return google_flight.do(('photo', photo_reference, max_width), fetch)
+
+
+def parse_timestamp(value):
+    """Parse a Supabase timestamp into an aware datetime (naive values are taken as UTC)"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def requested_fields():
+    """Parse the optional `fields=` query parameter into a set of top-level keys"""
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    return {field.strip() for field in fields.split(',') if field.strip()}
+
+
+def select_fields(item, fields):
+    """Trim a response object down to the requested fields (place_id is always kept)"""
+    if fields is None:
+        return item
+    return {key: value for key, value in item.items() if key in fields or key == 'place_id'}
+
 
 def require_auth(f):
     """Decorator to require Supabase authentication"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
+        batch = request.environ.get(BATCH_ENVIRON_KEY)
+        if batch is not None:
+            # A /batch sub-request: the batch itself was authenticated
+            request.user_id = batch.user_id
+            request.user_email = batch.user_email
+            return current_app.ensure_sync(f)(*args, **kwargs)
+        
         auth_header = request.headers.get('Authorization')
         
         if not auth_header or not auth_header.startswith('Bearer '):
@@ -41,14 +499,29 @@ def require_auth(f):
         
         try:
             # Validate token with Supabase
-            user_response = supabase.auth.get_user(token)
+            with stage('auth'):
+                user_response = supabase.auth.get_user(token)
             request.user_id = user_response.user.id
             request.user_email = user_response.user.email
             
         except Exception as e:
             return jsonify({'error': 'Invalid or expired token'}), 401
         
-        return f(*args, **kwargs)
+        # ensure_sync lets the decorator wrap async views too
+        return current_app.ensure_sync(f)(*args, **kwargs)
+    
+    return decorated_function
+
+
+def require_admin(f):
+    """Decorator to restrict an endpoint to holders of the admin token"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not profiler.is_admin(request.headers.get('X-Admin-Token')):
+            return jsonify({'error': 'Admin token required'}), 403
+        
+        # ensure_sync lets the decorator wrap async views too
+        return current_app.ensure_sync(f)(*args, **kwargs)
     
     return decorated_function
 
@@ -64,6 +537,7 @@ def add_review():
     place_name = data.get('place_name')
     rating = data.get('rating')
     comment = data.get('comment')
+    category = data.get('category')
     latitude = data.get('latitude')
     longitude = data.get('longitude')
 
@@ -95,6 +569,8 @@ def add_review():
             'rating': rating,
             'comment': comment
         }
+        if category:
+            review_data['category'] = category
         
         # Add coordinates if provided
         if latitude is not None and longitude is not None:
@@ -102,6 +578,9 @@ def add_review():
             review_data['longitude'] = longitude
         
         result = supabase.table('reviews').insert(review_data).execute()
+        update_preference_profile(user_id, place_id, place_name, rating, category)
+        for row in result.data:
+            publish_activity('review', row)
         
         return jsonify({"message": "Review added successfully", "data": result.data}), 201
     except Exception as e:
@@ -118,6 +597,7 @@ def rate_place():
     place_name = data.get('place_name')  # Place name from frontend
     rating = data.get('rating')
     comment = data.get('comment', '')  # Optional comment
+    category = data.get('category')  # Optional, feeds the user's category preferences
     latitude = data.get('latitude')
     longitude = data.get('longitude')
     
@@ -141,7 +621,7 @@ def rate_place():
     
     try:
         # Check if user already rated this place
-        existing_review = supabase.table('reviews').select('id, review_id').eq(
+        existing_review = supabase.table('reviews').select('id, review_id, rating, category').eq(
             'user_id', user_id
         ).eq('place_id', place_id).execute()
         
@@ -153,6 +633,8 @@ def rate_place():
                 'comment': comment,
                 'place_name': place_name
             }
+            if category:
+                update_data['category'] = category
             
             # Add coordinates if provided
             if latitude is not None and longitude is not None:
@@ -160,6 +642,13 @@ def rate_place():
                 update_data['longitude'] = longitude
             
             result = supabase.table('reviews').update(update_data).eq('review_id', review_id).execute()
+            previous = existing_review.data[0]
+            # Without a new category the review keeps its old one
+            update_preference_profile(
+                user_id, place_id, place_name, rating, category or previous.get('category'),
+                previous['rating'], previous.get('category')
+            )
+            publish_activity('review', result.data[0])
             
             return jsonify({
                 "message": "Rating updated successfully",
@@ -178,6 +667,8 @@ def rate_place():
                 'rating': rating,
                 'comment': comment
             }
+            if category:
+                review_data['category'] = category
             
             # Add coordinates if provided
             if latitude is not None and longitude is not None:
@@ -185,6 +676,8 @@ def rate_place():
                 review_data['longitude'] = longitude
             
             result = supabase.table('reviews').insert(review_data).execute()
+            update_preference_profile(user_id, place_id, place_name, rating, category)
+            publish_activity('review', result.data[0])
             
             return jsonify({
                 "message": "Rating added successfully",
@@ -229,6 +722,7 @@ def get_user_rating():
 
 
 @app.route('/get_reviews', methods=['GET'])
+@conditional_get
 def get_reviews():
     # This endpoint can remain public - anyone can see reviews for a place
     place_id = request.args.get('place_id')
@@ -294,6 +788,7 @@ def add_friend():
             'person_1_id': min(person_id, friend_id),
             'person_2_id': max(person_id, friend_id)
         }).execute()
+        activity_hub.friendships_changed(person_id, friend_id)
         
         return jsonify({"message": "Friend added successfully", "data": result.data}), 201
     except Exception as e:
@@ -319,19 +814,22 @@ def remove_friend():
         
         if not result.data:
             return jsonify({"error": "Friend relationship not found"}), 404
+        activity_hub.friendships_changed(person_id, friend_id)
             
         return jsonify({"message": "Friend removed successfully"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/friends', methods=['GET'])
-@require_auth
-def get_friends():
-    # Use authenticated user_id - users can only get their own friends
-    user_id = request.user_id
-    
-    try:
+def memoized(key, fn):
+    """fn(), shared with the other sub-requests when this request is part of a /batch"""
+    batch = request.environ.get(BATCH_ENVIRON_KEY) if has_request_context() else None
+    return batch.memo(key, fn) if batch is not None else fn()
+
+
+def load_friendships(user_id):
+    """(friend_id, friendship_created) for each of the user's friends"""
+    def load():
         # Get friends where user is person_1_id (friend is person_2_id)
         result1 = supabase.table('friends').select(
             'person_2_id, created_at'
@@ -342,35 +840,47 @@ def get_friends():
             'person_1_id, created_at'
         ).eq('person_2_id', user_id).execute()
         
-        # Combine results and get user details
-        friends = []
+        friendships = [(row['person_2_id'], row['created_at']) for row in result1.data]
+        return friendships + [(row['person_1_id'], row['created_at']) for row in result2.data]
+    
+    return memoized(('friendships', user_id), load)
+
+
+def load_users(user_ids):
+    """id -> users row (id, email, name), in one query"""
+    user_ids = tuple(sorted(set(user_ids)))
+    if not user_ids:
+        return {}
+    
+    def load():
+        users_details = supabase.table('users').select('id, email, name').in_('id', list(user_ids)).execute()
+        return {user['id']: user for user in users_details.data}
+    
+    return memoized(('users', user_ids), load)
+
+
+@app.route('/friends', methods=['GET'])
+@require_auth
+def get_friends():
+    # Use authenticated user_id - users can only get their own friends
+    user_id = request.user_id
+    
+    try:
+        # (friend_id, friendship_created) pairs from both directions
+        friendships = load_friendships(user_id)
         
-        # Add friends where user is person_1_id
-        for row in result1.data:
-            friend_details = supabase.table('users').select(
-                'id, email, name'
-            ).eq('id', row['person_2_id']).execute()
-            
-            if friend_details.data:
-                friends.append({
-                    "friend_id": row['person_2_id'],
-                    "friend_email": friend_details.data[0]['email'],
-                    "friend_name": friend_details.data[0]['name'],
-                    "friendship_created": row['created_at']
-                })
+        # Look up all friend details in one query instead of one per friend
+        users_map = load_users(friend_id for friend_id, _ in friendships)
         
-        # Add friends where user is person_2_id
-        for row in result2.data:
-            friend_details = supabase.table('users').select(
-                'id, email, name'
-            ).eq('id', row['person_1_id']).execute()
-            
-            if friend_details.data:
+        friends = []
+        for friend_id, friendship_created in friendships:
+            user_data = users_map.get(friend_id)
+            if user_data:
                 friends.append({
-                    "friend_id": row['person_1_id'],
-                    "friend_email": friend_details.data[0]['email'],
-                    "friend_name": friend_details.data[0]['name'],
-                    "friendship_created": row['created_at']
+                    "friend_id": friend_id,
+                    "friend_email": user_data['email'],
+                    "friend_name": user_data['name'],
+                    "friendship_created": friendship_created
                 })
         
         return jsonify({"friends": friends}), 200
@@ -439,6 +949,18 @@ def start_trip():
         
         if result.data:
             trip = result.data[0]
+            # Have recommendations ready by the time the trip screen asks for them.
+            # Warming spends Google and OpenAI quota like a recommendations
+            # request does, so it's charged to the same bucket, and skipped
+            # when the user is over it
+            limiter = rate_limiters.get('recommendations')
+            if limiter is None or not limiter.acquire(client_key()):
+                jobs.submit(
+                    'warm_recommendations', warm_recommendations, user_id, city.strip(),
+                    key=('warm_recommendations', user_id, city.strip().lower())
+                )
+            else:
+                admission_decisions.inc(limit='recommendations', outcome='rejected')
             return jsonify({
                 "message": "Trip started successfully",
                 "trip": {
@@ -470,6 +992,8 @@ def end_trip():
         }).eq('user_id', user_id).eq('is_active', True).execute()
         
         if result.data:
+            for trip in result.data:
+                publish_activity('trip', trip)
             return jsonify({"message": "Trip ended successfully"}), 200
         else:
             return jsonify({"error": "No active trip found"}), 404
@@ -480,222 +1004,557 @@ def end_trip():
 
 @app.route('/trip/recommendations', methods=['GET'])
 @require_auth
-def get_recommendations():
+@rate_limited('recommendations')
+async def get_recommendations():
     """Get AI-powered place recommendations for a city using Google Places API and OpenAI"""
     city = request.args.get('city', '').strip()
+    fields = requested_fields()
     
     if not city:
         return jsonify({"error": "Missing required parameter: city"}), 400
     
+    user_id = request.user_id
+    deadline = time.monotonic() + RECOMMENDATIONS_DEADLINE
+    
+    # The user's ratings and friends don't depend on the city lookup, so load
+    # them from Supabase (in worker threads) while Google geocodes and searches
+    profile_task = asyncio.ensure_future(asyncio.to_thread(get_preference_profile, user_id))
+    friends_task = asyncio.ensure_future(asyncio.to_thread(get_user_friends, user_id))
+    # What a trip start's warm job found, which may have run on another
+    # worker; only looked up when this worker's caches miss
+    warmup = run_once(load_warmup, user_id, city)
+    
     try:
-        # Get user's previous ratings to understand preferences
-        user_id = request.user_id
-        user_ratings = supabase.table('reviews').select(
-            'place_name, rating, comment, created_at'
-        ).eq('user_id', user_id).order('created_at', desc=True).limit(20).execute()
-        
-        # First, get coordinates for the city using Geocoding API
-        geocoding_url = "https://maps.googleapis.com/maps/api/geocode/json"
-        geocoding_params = {
-            'address': city,
-            'key': GOOGLE_MAPS_API_KEY
-        }
-        
-        geocoding_response = requests.get(geocoding_url, params=geocoding_params)
-        geocoding_response.raise_for_status()
-        geocoding_data = geocoding_response.json()
-        
-        if geocoding_data.get('status') != 'OK' or not geocoding_data.get('results'):
-            return jsonify({
-                "error": f"Could not find location for city: {city}",
-                "details": geocoding_data.get('error_message', 'City not found')
-            }), 404
-        
-        # Get the coordinates of the city
-        location = geocoding_data['results'][0]['geometry']['location']
-        lat = location['lat']
-        lng = location['lng']
-        formatted_address = geocoding_data['results'][0]['formatted_address']
-        
-        # Search for tourist attractions in the city - fetch 25 instead of 10
-        places_url = f"{PLACES_API_BASE_URL}/nearbysearch/json"
-        places_params = {
-            'location': f"{lat},{lng}",
-            'radius': '10000',  # 10km radius
-            'type': 'tourist_attraction',
-            'key': GOOGLE_MAPS_API_KEY
-        }
-        
-        places_response = requests.get(places_url, params=places_params)
-        places_response.raise_for_status()
-        places_data = places_response.json()
-        
-        if places_data.get('status') != 'OK':
-            return jsonify({
-                "error": f"Google Places API error: {places_data.get('status')}",
-                "details": places_data.get('error_message', 'No error details provided')
-            }), 500
-        
-        # Process all available attractions (up to 25)
-        all_attractions = []
-        for place in places_data.get('results', [])[:25]:
-            # Map Google Places types to our categories
-            place_types = place.get('types', [])
-            category = 'Attraction'
-            if 'museum' in place_types:
-                category = 'Museum'
-            elif 'park' in place_types:
-                category = 'Park'
-            elif 'church' in place_types or 'place_of_worship' in place_types:
-                category = 'Religious Site'
-            elif 'shopping_mall' in place_types or 'store' in place_types:
-                category = 'Shopping'
-            elif 'restaurant' in place_types or 'food' in place_types:
-                category = 'Restaurant'
-            elif any(t in place_types for t in ['landmark', 'point_of_interest']):
-                category = 'Landmark'
-            
-            all_attractions.append({
-                'place_id': place.get('place_id'),
-                'name': place.get('name'),
-                'category': category,
-                'rating': place.get('rating', 0),
-                'user_ratings_total': place.get('user_ratings_total', 0),
-                'types': place_types,
-                'vicinity': place.get('vicinity', ''),
-                'photos': place.get('photos', []),
-                'location': place.get('geometry', {}).get('location', {})
-            })
-        
-        # Use OpenAI to select the best 10 attractions based on user preferences
-        selected_attractions = select_attractions_with_ai(all_attractions, user_ratings.data, city)
-        
-        # Get user's friends for friend indicators
-        friends = get_user_friends(user_id)
-        
-        # Format the final recommendations
-        recommendations = []
-        for attraction in selected_attractions:
-            # Get photo URL if available
-            photo_url = None
-            if attraction.get('photos'):
-                photo_reference = attraction['photos'][0]['photo_reference']
-                photo_url = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=400&photoreference={photo_reference}&key={GOOGLE_MAPS_API_KEY}"
-            
-            # Check for friend ratings
-            friends_who_liked, friend_indicator = get_friend_indicators(attraction['place_id'], friends)
-            
-            recommendation = {
-                'place_id': attraction['place_id'],
-                'name': attraction['name'],
-                'description': attraction['vicinity'],
-                'category': attraction['category'],
-                'rating': attraction['rating'],
-                'user_ratings_total': attraction['user_ratings_total'],
-                'image_url': photo_url,
-                'location': attraction.get('location', {}),
-                'friends_who_liked': friends_who_liked,
-                'friend_indicator': friend_indicator
-            }
-            recommendations.append(recommendation)
-        
-        return jsonify({
-            "city": city.title(),
-            "formatted_address": formatted_address,
-            "location": {"lat": lat, "lng": lng},
-            "recommendations": recommendations,
-            "total_results": len(recommendations)
-        }), 200
-        
-    except requests.RequestException as e:
+        async with upstream_client() as http:
+            return await build_recommendations(http, city, fields, profile_task, friends_task, deadline, warmup)
+    except Overloaded as e:
+        return too_busy(e)
+    except (requests.RequestException, httpx.HTTPError) as e:
         return jsonify({"error": f"Failed to fetch recommendations: {str(e)}"}), 500
     except Exception as e:
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
+    finally:
+        # Don't leave the Supabase lookups dangling when we return early
+        for task in (profile_task, friends_task):
+            task.cancel()
+
+
+def warm_recommendations(user_id, city):
+    """Background job: run the slow part of /trip/recommendations so its caches are warm.
+
+    Fills the Google cache (geocode and nearby search) and the AI selection
+    cache for this user and city, and stores what it found in Supabase, since
+    the request that follows may be served by another worker (see
+    load_warmup). That request still builds its own response, but without
+    waiting on Google or OpenAI.
+    """
+    async def warm():
+        entries = {}
+        warmed_entries.set(entries)
+        deadline = time.monotonic() + RECOMMENDATIONS_DEADLINE
+        async with upstream_client() as http:
+            try:
+                formatted_address, _, _, attractions = await find_city_attractions(http, city)
+            except (CityLookupError, Overloaded):
+                return
+            profile = await asyncio.to_thread(get_preference_profile, user_id)
+            await select_attractions_with_ai(http, attractions, profile, formatted_address, deadline)
+        supabase.table('recommendation_warmups').upsert({
+            'user_id': user_id,
+            'city': city.lower(),
+            'entries': entries,
+            'warmed_at': datetime.now(timezone.utc).isoformat()
+        }, on_conflict='user_id,city').execute()
+
+    asyncio.run(warm())
 
 
-def select_attractions_with_ai(attractions, user_ratings, city):
-    """Use OpenAI to select the 10 best attractions based on user preferences"""
+# What the running warm_recommendations job has looked up, by kind
+warmed_entries = ContextVar('warmed_entries', default=None)
+
+
+def record_warmed(kind, entry):
+    entries = warmed_entries.get()
+    if entries is not None:
+        entries.setdefault(kind, []).append(entry)
+
+
+def record_warmed_google(url, params, data):
+    if data.get('status') in GOOGLE_CACHEABLE_STATUSES:
+        # Without the API key, which has no business in the database
+        record_warmed('google', {'url': url, 'params': {k: v for k, v in params.items() if k != 'key'}, 'data': data})
+
+
+def load_warmup(user_id, city):
+    """Copy what a warm job stored for this user and city into this worker's caches.
+
+    Only what's younger than each cache's TTL is copied, and only for what's
+    left of it. A failed read just means a cold request.
+    """
     try:
-        # If no OpenAI key or no attractions, fall back to simple selection
-        if not os.getenv("OPENAI_API_KEY"):
-            return attractions[:10]
-        
-        if not attractions:
-            return []
-        
-        # Prepare user preference context
-        user_context = "No previous ratings available."
-        if user_ratings:
-            highly_rated = [r for r in user_ratings if r['rating'] >= 8]
-            poorly_rated = [r for r in user_ratings if r['rating'] <= 4]
-            
-            context_parts = []
-            if highly_rated:
-                context_parts.append(f"Places they loved (8+ rating): {', '.join([r['place_name'] for r in highly_rated[:5]])}")
-            if poorly_rated:
-                context_parts.append(f"Places they disliked (4- rating): {', '.join([r['place_name'] for r in poorly_rated[:3]])}")
-            
-            if context_parts:
-                user_context = ". ".join(context_parts)
-        
-        # Create attraction descriptions for OpenAI
-        attraction_list = []
-        for i, attraction in enumerate(attractions):
-            attraction_list.append(f"{i+1}. {attraction['name']} ({attraction['category']}) - Rating: {attraction['rating']}/5, {attraction['user_ratings_total']} reviews")
-        
-        prompt = f"""You are a travel recommendation expert. Based on a user's travel preferences, select the 10 best attractions from this list for {city}.
+        rows = supabase.table('recommendation_warmups').select('entries, warmed_at').eq(
+            'user_id', user_id
+        ).eq('city', city.lower()).execute().data
+    except Exception as e:
+        app.logger.warning("Could not load warmed recommendations for %s: %s", user_id, e)
+        return
+    if not rows:
+        return
+    
+    age = (datetime.now(timezone.utc) - parse_timestamp(rows[0]['warmed_at'])).total_seconds()
+    entries = rows[0]['entries']
+    if age < GOOGLE_CACHE_TTL:
+        for entry in entries.get('google', []):
+            key = google_flight_key(entry['url'], {**entry['params'], 'key': GOOGLE_MAPS_API_KEY})
+            google_cache.put(key, entry['data'], ttl=GOOGLE_CACHE_TTL - age)
+    if age < AI_SELECTION_CACHE_TTL:
+        for entry in entries.get('selection', []):
+            ai_selection_cache.put(entry['prompt'], entry['picks'], ttl=AI_SELECTION_CACHE_TTL - age)
+
+
+def run_once(fn, *args):
+    """An async callable that runs `fn(*args)` in a thread on its first call, and shares the result"""
+    task = None
+    
+    async def run():
+        nonlocal task
+        if task is None:
+            task = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+        return await task
+    
+    return run
+
+
+def place_category(place_types):
+    """Map Google Places types to our categories"""
+    if 'museum' in place_types:
+        return 'Museum'
+    if 'park' in place_types:
+        return 'Park'
+    if 'church' in place_types or 'place_of_worship' in place_types:
+        return 'Religious Site'
+    if 'shopping_mall' in place_types or 'store' in place_types:
+        return 'Shopping'
+    if 'restaurant' in place_types or 'food' in place_types:
+        return 'Restaurant'
+    if any(t in place_types for t in ['landmark', 'point_of_interest']):
+        return 'Landmark'
+    return 'Attraction'
+
+
+def catalog_row(place, address=None):
+    """A `places` row from a Google place (nearby search result or details)"""
+    location = place.get('geometry', {}).get('location', {})
+    place_types = place.get('types', [])
+    return {
+        'place_id': place.get('place_id'),
+        'name': place.get('name'),
+        'address': address if address is not None else place.get('vicinity'),
+        'latitude': location.get('lat'),
+        'longitude': location.get('lng'),
+        'category': place_category(place_types),
+        'types': place_types,
+        'rating': place.get('rating'),
+        'user_ratings_total': place.get('user_ratings_total'),
+        'photos': [
+            {
+                'photo_reference': photo.get('photo_reference'),
+                'width': photo.get('width'),
+                'height': photo.get('height')
+            }
+            for photo in place.get('photos', [])[:10]
+        ],
+        'refreshed_at': datetime.now(timezone.utc).isoformat()
+    }
+
+
+def remember_places(rows):
+    """Queue rows for the place catalog, flushing early once a full batch is waiting"""
+    if place_catalog.add(rows):
+        jobs.submit('flush_place_catalog', place_catalog.flush, key='flush_place_catalog')
+
 
-User's preference history: {user_context}
+def catalog_details(place_id, fields):
+    """/attraction_details from the catalog, or None if it has no fresh enough copy"""
+    rows = supabase.table('places').select('*').eq('place_id', place_id).execute().data
+    if not rows:
+        return None
+    row = rows[0]
+    now = datetime.now(timezone.utc)
+    
+    if fields is not None and fields <= CATALOG_FIELDS and row.get('refreshed_at') \
+            and now - parse_timestamp(row['refreshed_at']) < PLACE_CATALOG_MAX_AGE:
+        return {
+            'place_id': row['place_id'],
+            'name': row['name'],
+            'rating': row['rating'],
+            'user_ratings_total': row['user_ratings_total'],
+            'types': row['types'],
+            'geometry': {'location': {'lat': row['latitude'], 'lng': row['longitude']}},
+            'photos': row['photos']
+        }
+    
+    if row.get('details') and row.get('details_refreshed_at') \
+            and now - parse_timestamp(row['details_refreshed_at']) < PLACE_DETAILS_MAX_AGE:
+        details = dict(row['details'])
+        # Whether it's open right now is only true when Google said it
+        details['opening_hours'] = {
+            key: value for key, value in (details.get('opening_hours') or {}).items() if key != 'open_now'
+        }
+        return details
+    
+    return None
+
+
+# Retries of a preference profile update that lost a race with another one
+PREFERENCE_UPDATE_ATTEMPTS = 5
+
+
+def get_preference_profile(user_id):
+    """The user's stored preference profile, built from their reviews the first time"""
+    rows = supabase.table('user_preferences').select('*').eq('user_id', user_id).execute().data
+    return rows[0] if rows else build_preference_profile(user_id)
+
+
+def build_preference_profile(user_id):
+    """Build and store a profile from all of the user's reviews (users who rated before profiles existed)"""
+    reviews = supabase.table('reviews').select(
+        'place_id, place_name, category, rating, created_at'
+    ).eq('user_id', user_id).execute().data
+    if not reviews:
+        return empty_profile(user_id)
+    
+    profile = profile_from_reviews(user_id, reviews)
+    # Never overwrite a profile that appeared meanwhile; it may hold newer ratings
+    supabase.table('user_preferences').upsert(profile, on_conflict='user_id', ignore_duplicates=True).execute()
+    return profile
+
+
+def update_preference_profile(user_id, place_id, place_name, rating, category=None, previous_rating=None,
+                              previous_category=None):
+    """Fold a new or changed rating into the user's profile.
+
+    Ratings from the same user can arrive at once (two devices, a retried
+    request), so the write is a compare-and-swap on `updated_at`: it only
+    applies if nobody else wrote since our read, and otherwise the update is
+    redone on a fresh read. The rating itself is already saved, so a failure
+    here is only logged.
+    """
+    try:
+        for attempt in range(PREFERENCE_UPDATE_ATTEMPTS):
+            if attempt:
+                # Let the writer we lost to finish, without retrying in lockstep with others
+                time.sleep(random.uniform(0, 0.02 * 2 ** attempt))
+            rows = supabase.table('user_preferences').select('*').eq('user_id', user_id).execute().data
+            if not rows:
+                # The first profile is built from all reviews, which includes this one
+                build_preference_profile(user_id)
+                return
+            read_at = rows[0]['updated_at']
+            profile = apply_rating(
+                rows[0], place_id, place_name, rating, category, previous_rating, previous_category
+            )
+            query = supabase.table('user_preferences').update(profile).eq('user_id', user_id)
+            query = query.eq('updated_at', read_at) if read_at else query.is_('updated_at', 'null')
+            if query.execute().data:
+                return
+        app.logger.warning("Gave up updating preference profile for %s after concurrent updates", user_id)
+    except Exception as e:
+        app.logger.warning("Could not update preference profile for %s: %s", user_id, e)
+
+
+class CityLookupError(Exception):
+    """Google couldn't find the city or its attractions; carries the response to send"""
+
+    def __init__(self, error, details, status):
+        super().__init__(error)
+        self.error = error
+        self.details = details
+        self.status = status
+
+
+async def geocode_city(http, city, warmup=None):
+    """(lat, lng, formatted_address) for a city name, from the gazetteer or else Google Geocoding"""
+    gazetteer = default_gazetteer()
+    match = gazetteer.geocode(city) if gazetteer else None
+    if match:
+        city_geocodes.inc(source='gazetteer')
+        return match['lat'], match['lng'], match['label']
+
+    city_geocodes.inc(source='google')
+    geocoding_url = f"{GOOGLE_MAPS_API_BASE_URL}/geocode/json"
+    geocoding_params = {
+        'address': city,
+        'key': GOOGLE_MAPS_API_KEY
+    }
+    
+    geocoding_data = await google_get_async(http, geocoding_url, geocoding_params, warmup)
+    
+    if geocoding_data.get('status') != 'OK' or not geocoding_data.get('results'):
+        raise CityLookupError(
+            f"Could not find location for city: {city}",
+            geocoding_data.get('error_message', 'City not found'),
+            404
+        )
+    
+    result = geocoding_data['results'][0]
+    location = result['geometry']['location']
+    return location['lat'], location['lng'], result['formatted_address']
 
-Available attractions:
-{chr(10).join(attraction_list)}
 
-Please select exactly 10 attractions that would best match this user's preferences. Consider their past ratings and the quality/popularity of the attractions. Return only the numbers (1-{len(attractions)}) of your selected attractions, separated by commas.
+async def find_city_attractions(http, city, warmup=None):
+    """Geocode `city` and list up to 25 attractions around it.
 
-Example response: 1,3,7,12,15,18,20,22,24,25"""
+    Returns (formatted_address, lat, lng, attractions). Raises
+    CityLookupError when neither the gazetteer nor Google can find the
+    city, or Google can't list its attractions.
+    """
+    lat, lng, formatted_address = await geocode_city(http, city, warmup)
+    
+    # Search for tourist attractions in the city - fetch 25 instead of 10
+    places_url = f"{PLACES_API_BASE_URL}/nearbysearch/json"
+    places_params = {
+        'location': f"{lat},{lng}",
+        'radius': '10000',  # 10km radius
+        'type': 'tourist_attraction',
+        'key': GOOGLE_MAPS_API_KEY
+    }
+    
+    places_data = await google_get_async(http, places_url, places_params, warmup)
+    
+    if places_data.get('status') != 'OK':
+        raise CityLookupError(
+            f"Google Places API error: {places_data.get('status')}",
+            places_data.get('error_message', 'No error details provided'),
+            500
+        )
+    
+    # Process all available attractions (up to 25)
+    all_attractions = []
+    for place in places_data.get('results', [])[:25]:
+        place_types = place.get('types', [])
+        category = place_category(place_types)
         
-        response = openai_client.chat.completions.create(
+        all_attractions.append({
+            'place_id': place.get('place_id'),
+            'name': place.get('name'),
+            'category': category,
+            'rating': place.get('rating', 0),
+            'user_ratings_total': place.get('user_ratings_total', 0),
+            'types': place_types,
+            'vicinity': place.get('vicinity', ''),
+            'photos': place.get('photos', []),
+            'location': place.get('geometry', {}).get('location', {})
+        })
+    remember_places(catalog_row(place) for place in places_data.get('results', []))
+    
+    return formatted_address, lat, lng, all_attractions
+
+
+async def build_recommendations(http, city, fields, profile_task, friends_task, deadline, warmup):
+    """The body of /trip/recommendations, run inside the request's HTTP client"""
+    try:
+        formatted_address, lat, lng, all_attractions = await find_city_attractions(http, city, warmup)
+    except CityLookupError as e:
+        return jsonify({"error": e.error, "details": e.details}), e.status
+    
+    # Use OpenAI to select the best 10 attractions based on user preferences
+    profile = await profile_task
+    # The resolved name, so 'NYC' and 'new york' share a prompt (and its cached answer)
+    selected_attractions, ranking = await select_attractions_with_ai(
+        http, all_attractions, profile, formatted_address, deadline, warmup
+    )
+    recommendation_rankings.inc(**ranking)
+    
+    # Get user's friends for friend indicators
+    friends = await friends_task
+    
+    # Check for friend ratings on all selected places at once
+    friend_indicators = await asyncio.to_thread(
+        get_friend_indicators, [attraction['place_id'] for attraction in selected_attractions], friends
+    )
+    
+    # Format the final recommendations
+    recommendations = []
+    for attraction in selected_attractions:
+        # Get photo URL if available
+        photo_url = None
+        if attraction.get('photos'):
+            photo_reference = attraction['photos'][0]['photo_reference']
+            photo_url = url_for('get_photo', ref=photo_reference, width=400, _external=True)
+        
+        friends_who_liked, friend_indicator = friend_indicators.get(attraction['place_id'], ([], None))
+        
+        recommendation = {
+            'place_id': attraction['place_id'],
+            'name': attraction['name'],
+            'description': attraction['vicinity'],
+            'category': attraction['category'],
+            'rating': attraction['rating'],
+            'user_ratings_total': attraction['user_ratings_total'],
+            'image_url': photo_url,
+            'location': attraction.get('location', {}),
+            'friends_who_liked': friends_who_liked,
+            'friend_indicator': friend_indicator
+        }
+        recommendations.append(select_fields(recommendation, fields))
+    
+    return jsonify({
+        "city": city.title(),
+        "formatted_address": formatted_address,
+        "location": {"lat": lat, "lng": lng},
+        "recommendations": recommendations,
+        "total_results": len(recommendations),
+        "ranking": ranking
+    }), 200
+
+
+def rank_by_rating(attractions):
+    """The 10 best-rated attractions, used whenever the AI selection isn't"""
+    return sorted(
+        attractions,
+        key=lambda x: (x['rating'] or 0, x['user_ratings_total'] or 0),
+        reverse=True
+    )[:10]
+
+
+# Identical for every request, and sent first, so OpenAI's prompt caching can
+# reuse it; everything request-specific goes in the user message after it
+SELECTION_SYSTEM_PROMPT = """You are a travel recommendation expert. Pick the 10 attractions (or all of them, when there are fewer) from the candidate list that best match the user's preferences, considering what they loved and disliked and each attraction's rating and popularity.
+
+Candidates are listed one per line as: number|name|category|rating out of 5|number of reviews
+Answer with the numbers of exactly 10 different candidates, or of every candidate when there are fewer than 10, best first."""
+
+SELECTION_RESPONSE_FORMAT = {
+    'type': 'json_schema',
+    'json_schema': {
+        'name': 'attraction_selection',
+        'strict': True,
+        'schema': {
+            'type': 'object',
+            'properties': {'picks': {'type': 'array', 'items': {'type': 'integer'}}},
+            'required': ['picks'],
+            'additionalProperties': False,
+        },
+    },
+}
+
+# Same candidates and same preferences get the same answer, so reuse it
+AI_SELECTION_CACHE_TTL = float(os.getenv("AI_SELECTION_CACHE_TTL", "3600"))
+ai_selection_cache = TTLCache(maxsize=2048, ttl=AI_SELECTION_CACHE_TTL)
+
+
+def preference_summary(profile):
+    """A short description of the user's tastes, from their preference profile"""
+    loved = [p['place_name'] for p in profile['top_places'] if p['rating'] >= 8]
+    disliked = [p['place_name'] for p in profile['bottom_places'] if p['rating'] <= 4][:3]
+    affinity = sorted(profile['category_affinity'].items(), key=lambda item: item[1], reverse=True)
+    likes = [category for category, score in affinity[:3] if score > 0]
+    dislikes = [category for category, score in affinity[::-1][:2] if score < 0]
+    mean, variance = rating_stats(profile)
+    
+    parts = []
+    if loved:
+        parts.append(f"Loved (8+/10): {'; '.join(loved)}")
+    if disliked:
+        parts.append(f"Disliked (4-/10): {'; '.join(disliked)}")
+    if likes:
+        parts.append(f"Likes: {', '.join(likes)}")
+    if dislikes:
+        parts.append(f"Avoids: {', '.join(dislikes)}")
+    if mean is not None and profile['review_count'] >= 3:
+        parts.append(f"Average rating given: {mean:.1f}/10 (sd {variance ** 0.5:.1f})")
+    return '\n'.join(parts) or "No previous ratings."
+
+
+def selection_prompt(attractions, preferences, city):
+    candidates = '\n'.join(
+        f"{i}|{a['name']}|{a['category']}|{a['rating'] or 0}|{a['user_ratings_total'] or 0}"
+        for i, a in enumerate(attractions, start=1)
+    )
+    return f"City: {city}\n{preferences}\nCandidates:\n{candidates}"
+
+
+def parse_selection(text, count):
+    """0-based indices from the model's JSON answer, or None without 10 valid picks (or `count`, if fewer)"""
+    try:
+        picks = json.loads(text)['picks']
+    except (ValueError, TypeError, KeyError):
+        return None
+    indices = []
+    for pick in picks:
+        if isinstance(pick, int) and 1 <= pick <= count and pick - 1 not in indices:
+            indices.append(pick - 1)
+    wanted = min(10, count)
+    return indices[:wanted] if len(indices) >= wanted else None
+
+
+async def select_attractions_with_ai(http, attractions, profile, city, deadline, warmup=None):
+    """Use OpenAI to select the 10 best attractions based on user preferences.
+
+    Returns the attractions and how they were ranked: {'method': 'ai'}, or
+    {'method': 'rating', 'reason': ...} when the rating sort was used instead.
+    On a cache miss, `warmup()` (if given) is awaited first, as in google_get_async.
+    """
+    def fallback(reason):
+        return rank_by_rating(attractions), {'method': 'rating', 'reason': reason}
+
+    # If no OpenAI key or no attractions, fall back to simple selection
+    if not os.getenv("OPENAI_API_KEY"):
+        return fallback('not_configured')
+    
+    if not attractions:
+        return [], {'method': 'ai'}
+    
+    prompt = selection_prompt(attractions, preference_summary(profile), city)
+    selected_indices = ai_selection_cache.get(prompt)
+    if selected_indices is None and warmup is not None:
+        await warmup()
+        selected_indices = ai_selection_cache.get(prompt)
+    if selected_indices is not None:
+        record_warmed('selection', {'prompt': prompt, 'picks': selected_indices})
+        return [attractions[i] for i in selected_indices], {'method': 'ai', 'cached': True}
+    
+    # Don't start a call that can't finish before the request's deadline
+    budget = min(OPENAI_STAGE_BUDGET, deadline - time.monotonic())
+    if budget < OPENAI_MIN_BUDGET:
+        return fallback('deadline')
+    
+    # Over its rate limit, a client only gets what's already cached
+    if cache_only():
+        return fallback('rate_limited')
+    
+    try:
+        selection_text = await asyncio.wait_for(openai_chat_async(
+            http,
             model="gpt-4o-mini-2024-07-18",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=100,
+            messages=[
+                {"role": "system", "content": SELECTION_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            response_format=SELECTION_RESPONSE_FORMAT,
+            max_tokens=60,
             temperature=0.3
-        )
-        
-        
-        # Parse OpenAI response
-        selection_text = response.choices[0].message.content.strip()
-        print(selection_text, prompt)
-        selected_indices = []
-        
-        for num in selection_text.split(','):
-            try:
-                index = int(num.strip()) - 1  # Convert to 0-based index
-                if 0 <= index < len(attractions):
-                    selected_indices.append(index)
-            except ValueError:
-                continue
-        
-        # If we don't have exactly 10 selections, fall back to top-rated
-        if len(selected_indices) != 10:
-            # Sort by rating and user_ratings_total
-            sorted_attractions = sorted(
-                enumerate(attractions), 
-                key=lambda x: (x[1]['rating'] or 0, x[1]['user_ratings_total'] or 0), 
-                reverse=True
-            )
-            selected_indices = [i for i, _ in sorted_attractions[:10]]
-        
-        # Return selected attractions in the original order
-        return [attractions[i] for i in selected_indices[:10]]
-        
+        ), timeout=budget)
+        
+        selected_indices = parse_selection(selection_text, len(attractions))
+        if selected_indices is None:
+            return fallback('invalid_response')
+        
+        ai_selection_cache.put(prompt, selected_indices)
+        record_warmed('selection', {'prompt': prompt, 'picks': selected_indices})
+        return [attractions[i] for i in selected_indices], {'method': 'ai'}
+        
+    except CircuitOpen:
+        # OpenAI has been failing or slow: skipped rather than wait out another timeout
+        return fallback('circuit_open')
+    except asyncio.TimeoutError:
+        return fallback('deadline')
+    except Overloaded:
+        return fallback('overloaded')
     except Exception as e:
         # If OpenAI fails, fall back to rating-based selection
-        sorted_attractions = sorted(
-            attractions, 
-            key=lambda x: (x['rating'] or 0, x['user_ratings_total'] or 0), 
-            reverse=True
-        )
-        return sorted_attractions[:10]
+        return fallback('error')
 
 
 def get_user_friends(user_id):
@@ -732,23 +1591,23 @@ def get_user_friends(user_id):
         return {}
 
 
-def get_friend_indicators(place_id, friends):
-    """Get friend indicators for a specific place"""
-    friends_who_liked = []
+def get_friend_indicators(place_ids, friends):
+    """Get friend indicators for a batch of places, keyed by place_id"""
+    likes = {place_id: [] for place_id in place_ids}
     
-    if friends and place_id:
+    if friends and place_ids:
         try:
-            # Get reviews for this place from friends with high ratings
+            # Get high ratings from friends for all of these places in one query
             friend_reviews = supabase.table('reviews').select(
-                'user_id, rating'
-            ).eq('place_id', place_id).in_('user_id', list(friends.keys())).gte('rating', 8).execute()
+                'user_id, place_id, rating'
+            ).in_('place_id', list(likes.keys())).in_('user_id', list(friends.keys())).gte('rating', 8).execute()
             
             for review in friend_reviews.data:
                 friend_id = review['user_id']
-                if friend_id in friends:
+                if friend_id in friends and review['place_id'] in likes:
                     friend_data = friends[friend_id]
                     friend_name = friend_data['name'] if friend_data['name'] else friend_data['email'].split('@')[0].title()
-                    friends_who_liked.append({
+                    likes[review['place_id']].append({
                         'id': friend_id,
                         'name': friend_name,
                         'email': friend_data['email'],
@@ -758,19 +1617,44 @@ def get_friend_indicators(place_id, friends):
         except Exception as e:
             pass
     
-    # Create friend indicator text
-    friend_indicator = None
-    if friends_who_liked:
-        count = len(friends_who_liked)
-        if count == 1:
-            friend_indicator = f"{friends_who_liked[0]['name']} liked this place"
-        elif count == 2:
-            friend_indicator = f"{friends_who_liked[0]['name']} and {friends_who_liked[1]['name']} liked this place"
-        else:
-            friend_indicator = f"{friends_who_liked[0]['name']} and {count - 1} others liked this place"
+    return {place_id: (friends_who_liked, friend_indicator_text(friends_who_liked)) for place_id, friends_who_liked in likes.items()}
+
+
+def friend_indicator_text(friends_who_liked):
+    """Create friend indicator text"""
+    if not friends_who_liked:
+        return None
     
-    return friends_who_liked, friend_indicator
+    count = len(friends_who_liked)
+    if count == 1:
+        return f"{friends_who_liked[0]['name']} liked this place"
+    elif count == 2:
+        return f"{friends_who_liked[0]['name']} and {friends_who_liked[1]['name']} liked this place"
+    else:
+        return f"{friends_who_liked[0]['name']} and {count - 1} others liked this place"
+
+
+@app.route('/cities/autocomplete', methods=['GET'])
+@conditional_get
+def autocomplete_cities():
+    """City suggestions for a partial name, from the bundled gazetteer"""
+    query = request.args.get('q', '')
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 25)
+    except ValueError:
+        return jsonify({"error": "Invalid limit"}), 400
+
+    gazetteer = default_gazetteer()
+    cities = gazetteer.autocomplete(query, limit) if gazetteer else []
+    response = jsonify({"cities": cities})
+    # The same for everyone and only changes on deploy
+    response.headers['Cache-Control'] = 'public, max-age=86400'
+    return response
+
+
 @app.route('/attractions', methods=['GET'])
+@conditional_get
+@rate_limited('attractions')
 def get_attractions():
     """Get attractions near the user's location using Google Places API"""
     # Get location parameters from query string
@@ -778,6 +1662,7 @@ def get_attractions():
     lng = request.args.get('lng')
     radius = request.args.get('radius', '5000')  # Default 5km radius
     type_filter = request.args.get('type', 'tourist_attraction')  # Default to tourist attractions
+    fields = requested_fields()  # Optional sparse fieldset, e.g. fields=name,rating,geometry
     
     # Validate required parameters
     if not lat or not lng:
@@ -809,11 +1694,8 @@ def get_attractions():
             'key': GOOGLE_MAPS_API_KEY
         }
         
-        # Make the API request
-        response = requests.get(url, params=params)
-        response.raise_for_status()  # Raise exception for HTTP errors
-        
-        data = response.json()
+        # Make the API request (raises for HTTP errors)
+        data = google_get(url, params)
         
         # Check if the API request was successful
         if data.get('status') != 'OK':
@@ -844,7 +1726,8 @@ def get_attractions():
                     for photo in place.get('photos', [])
                 ] if place.get('photos') else []
             }
-            attractions.append(attraction)
+            attractions.append(select_fields(attraction, fields))
+        remember_places(catalog_row(place) for place in data.get('results', []))
         
         return jsonify({
             "attractions": attractions,
@@ -854,34 +1737,54 @@ def get_attractions():
             "type": type_filter
         }), 200
         
-    except requests.RequestException as e:
+    except Overloaded as e:
+        return too_busy(e)
+    except (requests.RequestException, httpx.HTTPError) as e:
         return jsonify({"error": f"Failed to fetch attractions: {str(e)}"}), 500
     except Exception as e:
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
 
 
 @app.route('/attraction_details', methods=['GET'])
+@conditional_get
+@rate_limited('attraction_details')
 def get_attraction_details():
     """Get detailed information about a specific attraction"""
     place_id = request.args.get('place_id')
+    fields = requested_fields()
     
     if not place_id:
         return jsonify({"error": "Missing required parameter: place_id"}), 400
     
+    # Only ask Google for what the client wants, which also keeps us out of
+    # the pricier Contact/Atmosphere SKUs when those fields aren't needed
+    google_fields = PLACE_DETAILS_FIELDS
+    if fields is not None:
+        google_fields = [field for field in PLACE_DETAILS_FIELDS if field in fields] or ['name']
+    
+    # Build the Places API request URL for details
+    url = f"{PLACES_API_BASE_URL}/details/json"
+    params = {
+        'place_id': place_id,
+        'fields': ','.join(google_fields),
+        'key': GOOGLE_MAPS_API_KEY
+    }
+    
+    # Places looked up before are answered from the catalog, unless Google's
+    # answer is already in memory. The catalog is only a shortcut: when it
+    # can't be read, Google is asked as if it had no copy
+    if google_cache.get(google_flight_key(url, params)) is None:
+        try:
+            cached = catalog_details(place_id, fields)
+        except Exception as e:
+            app.logger.warning("Could not read place %s from the catalog: %s", place_id, e)
+            cached = None
+        if cached is not None:
+            return jsonify({"attraction": select_fields(cached, fields)}), 200
+    
     try:
-        # Build the Places API request URL for details
-        url = f"{PLACES_API_BASE_URL}/details/json"
-        params = {
-            'place_id': place_id,
-            'fields': 'name,formatted_address,formatted_phone_number,website,rating,user_ratings_total,opening_hours,geometry,photos,reviews,types,price_level',
-            'key': GOOGLE_MAPS_API_KEY
-        }
-        
         # Make the API request
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        
-        data = response.json()
+        data = google_get(url, params)
         
         # Check if the API request was successful
         if data.get('status') != 'OK':
@@ -893,8 +1796,9 @@ def get_attraction_details():
         place = data.get('result', {})
         
         # Format the detailed attraction data
+        # PLACE_DETAILS_FIELDS doesn't ask for place_id; it's the one we looked up
         attraction_details = {
-            'place_id': place.get('place_id'),
+            'place_id': place_id,
             'name': place.get('name'),
             'formatted_address': place.get('formatted_address'),
             'formatted_phone_number': place.get('formatted_phone_number'),
@@ -924,15 +1828,61 @@ def get_attraction_details():
             ] if place.get('reviews') else []
         }
         
-        return jsonify({"attraction": attraction_details}), 200
+        if fields is None:
+            # Only a full response is complete enough to answer later requests from
+            row = catalog_row({**place, 'place_id': place_id}, address=place.get('formatted_address'))
+            row['details'] = attraction_details
+            row['details_refreshed_at'] = row['refreshed_at']
+            remember_places([row])
         
-    except requests.RequestException as e:
+        return jsonify({"attraction": select_fields(attraction_details, fields)}), 200
+        
+    except Overloaded as e:
+        return too_busy(e)
+    except (requests.RequestException, httpx.HTTPError) as e:
         return jsonify({"error": f"Failed to fetch attraction details: {str(e)}"}), 500
     except Exception as e:
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
 
 
+def activity_item(kind, row, user_data):
+    """A friend_activity entry for /feed and /feed/stream, from a review or trip row"""
+    if kind == 'review':
+        item_id = f"review_{row['user_id']}_{row['place_id']}_{row['created_at']}"
+    else:
+        item_id = f"trip_{row['user_id']}_{row['created_at']}"
+    item = {
+        'type': kind,
+        'id': item_id,
+        'user_id': row['user_id'],
+        'user_name': user_data['name'] if user_data['name'] else user_data['email'].split('@')[0].title(),
+        'user_email': user_data['email'],
+    }
+    if kind == 'review':
+        item.update({
+            'place_id': row['place_id'],
+            'place_name': row.get('place_name', 'Unknown Place'),
+            'rating': row['rating'],
+            'comment': row['comment'],
+        })
+    else:
+        item.update({
+            'city': row['city'],
+            'country': row['country'],
+            'start_date': row['start_date'],
+            'end_date': row['end_date'],
+        })
+    item['created_at'] = row['created_at']
+    return item
+
+
+def publish_activity(kind, row):
+    """Push a new review or finished trip to the author's friends' open feed streams"""
+    activity_hub.publish(row['user_id'], {'kind': kind, 'row': row})
+
+
 @app.route('/feed', methods=['GET'])
+@conditional_get
 @require_auth
 def get_feed():
     """Get feed data including featured lists and friend activity"""
@@ -940,30 +1890,13 @@ def get_feed():
     
     try:
         # Get user's friends
-        friend_ids = []
-        
-        # Get friends where user is person_1_id
-        result1 = supabase.table('friends').select(
-            'person_2_id'
-        ).eq('person_1_id', user_id).execute()
-        
-        # Get friends where user is person_2_id
-        result2 = supabase.table('friends').select(
-            'person_1_id'
-        ).eq('person_2_id', user_id).execute()
-        
-        # Collect friend IDs
-        for row in result1.data:
-            friend_ids.append(row['person_2_id'])
-        for row in result2.data:
-            friend_ids.append(row['person_1_id'])
+        friend_ids = [friend_id for friend_id, _ in load_friendships(user_id)]
         
         # Get recent friend activity (reviews and completed trips)
         friend_activity = []
         
         if friend_ids:
             # Calculate date 30 days ago
-            from datetime import datetime, timedelta
             thirty_days_ago = (datetime.now() - timedelta(days=30)).isoformat()
             
             # Get recent reviews from friends (last 30 days)
@@ -984,92 +1917,23 @@ def get_feed():
             
             # Get user details for the activities
             if friend_ids:
-                users_details = supabase.table('users').select(
-                    'id, email, name'
-                ).in_('id', friend_ids).execute()
-                
-                users_map = {user['id']: user for user in users_details.data}
-                
-                # Format review activities
-                for review in recent_reviews.data:
-                    user_data = users_map.get(review['user_id'])
-                    if user_data:
-                        friend_name = user_data['name'] if user_data['name'] else user_data['email'].split('@')[0].title()
-                        friend_activity.append({
-                            'type': 'review',
-                            'id': f"review_{review['user_id']}_{review['place_id']}_{review['created_at']}",
-                            'user_id': review['user_id'],
-                            'user_name': friend_name,
-                            'user_email': user_data['email'],
-                            'place_id': review['place_id'],
-                            'place_name': review.get('place_name', 'Unknown Place'),
-                            'rating': review['rating'],
-                            'comment': review['comment'],
-                            'created_at': review['created_at']
-                        })
+                users_map = load_users(friend_ids)
                 
-                # Format trip activities
-                for trip in recent_trips.data:
-                    user_data = users_map.get(trip['user_id'])
-                    if user_data:
-                        friend_name = user_data['name'] if user_data['name'] else user_data['email'].split('@')[0].title()
-                        friend_activity.append({
-                            'type': 'trip',
-                            'id': f"trip_{trip['user_id']}_{trip['created_at']}",
-                            'user_id': trip['user_id'],
-                            'user_name': friend_name,
-                            'user_email': user_data['email'],
-                            'city': trip['city'],
-                            'country': trip['country'],
-                            'start_date': trip['start_date'],
-                            'end_date': trip['end_date'],
-                            'created_at': trip['created_at']
-                        })
+                # Format review and trip activities
+                for kind, rows in (('review', recent_reviews.data), ('trip', recent_trips.data)):
+                    for row in rows:
+                        user_data = users_map.get(row['user_id'])
+                        if user_data:
+                            friend_activity.append(activity_item(kind, row, user_data))
         
         # Sort all activities by creation date
         friend_activity.sort(key=lambda x: x['created_at'], reverse=True)
         
-        # Hardcoded featured lists for now
-        featured_lists = [
-            {
-                'id': 'nyc_nightlife',
-                'title': 'Best Places to Visit at Night in NYC',
-                'description': 'Discover the city that never sleeps',
-                'image_url': 'https://images.unsplash.com/photo-1496442226666-8d4d0e62e6e9?w=300&h=200&fit=crop',
-                'place_count': 12
-            },
-            {
-                'id': 'paris_cafes',
-                'title': 'Hidden Cafés in Paris',
-                'description': 'Local favorites off the beaten path',
-                'image_url': 'https://images.unsplash.com/photo-1511739001486-6bfe10ce785f?w=300&h=200&fit=crop',
-                'place_count': 8
-            },
-            {
-                'id': 'tokyo_temples',
-                'title': 'Sacred Temples in Tokyo',
-                'description': 'Find peace in the bustling city',
-                'image_url': 'https://images.unsplash.com/photo-1540959733332-eab4deabeeaf?w=300&h=200&fit=crop',
-                'place_count': 15
-            },
-            {
-                'id': 'london_pubs',
-                'title': 'Historic Pubs in London',
-                'description': 'Where history meets great beer',
-                'image_url': 'https://images.unsplash.com/photo-1513635269975-59663e0ac1ad?w=300&h=200&fit=crop',
-                'place_count': 10
-            },
-            {
-                'id': 'la_beaches',
-                'title': 'Best Beaches in Los Angeles',
-                'description': 'Sun, surf, and endless summer vibes',
-                'image_url': 'https://images.unsplash.com/photo-1506905925346-21bda4d32df4?w=300&h=200&fit=crop',
-                'place_count': 7
-            }
-        ]
+        # Precomputed by the refresh_featured_lists job
+        featured = featured_lists.summaries(FEED_FEATURED_LISTS)
         
         return jsonify({
-            'featured_lists': featured_lists,
+            'featured_lists': featured,
             'friend_activity': friend_activity[:15],  # Limit to 15 most recent activities
             'total_activities': len(friend_activity)
         }), 200
@@ -1078,7 +1942,174 @@ def get_feed():
         return jsonify({'error': str(e)}), 500
 
 
+def friend_users(user_id):
+    """id -> users row for each of the user's friends"""
+    return load_users(friend_id for friend_id, _ in load_friendships(user_id))
+
+
+def sse(event, data=None, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data if data is not None else {})}")
+    return '\n'.join(lines) + '\n\n'
+
+
+@app.route('/feed/stream', methods=['GET'])
+@require_auth
+def stream_feed():
+    """Server-sent events with friends' new activity, as it happens.
+
+    Each `activity` event holds one /feed friend_activity item. Clients load
+    /feed first and then keep this stream open. On reconnect, the
+    Last-Event-ID header (or ?last_event_id=) replays what was missed. A
+    `reset` event means that isn't possible and /feed should be reloaded.
+    A user gets FEED_STREAMS_PER_USER streams; opening another ends the
+    oldest with a `replaced` event, after which that client shouldn't
+    reconnect (it would just replace the newer one) but poll /feed.
+    """
+    user_id = request.user_id
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    last_seq = activity_hub.parse_event_id(last_event_id) if last_event_id else None
+    
+    try:
+        users_map = friend_users(user_id)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    subscription = activity_hub.subscribe(user_id, users_map, last_seq)
+    if subscription is None:
+        return jsonify({'error': 'Too many open feed streams, poll /feed instead'}), 503, {'Retry-After': '30'}
+    
+    def events(users_map):
+        try:
+            yield f"retry: {FEED_STREAM_RETRY_MS}\n\n"
+            if last_event_id and last_seq is None:
+                yield sse('reset', event_id=activity_hub.event_id(subscription.last_seq))
+            closes_at = time.monotonic() + FEED_STREAM_MAX_AGE
+            while (remaining := closes_at - time.monotonic()) > 0:
+                published = subscription.wait(min(FEED_STREAM_HEARTBEAT, remaining))
+                if subscription.closed:
+                    yield sse('replaced')
+                    return
+                if subscription.stale:
+                    users_map = friend_users(user_id)
+                    subscription.set_friends(users_map)
+                if published is None:
+                    yield sse('reset', event_id=activity_hub.event_id(subscription.last_seq))
+                elif not published:
+                    # Keeps proxies from timing out, and notices clients that went away
+                    yield ": keepalive\n\n"
+                for seq, event in published or ():
+                    user_data = users_map.get(event['row']['user_id'])
+                    if user_data:
+                        item = activity_item(event['kind'], event['row'], user_data)
+                        yield sse('activity', item, activity_hub.event_id(seq))
+        finally:
+            activity_hub.unsubscribe(subscription)
+    
+    return Response(events(users_map), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+
+@app.route('/featured_lists/<list_id>', methods=['GET'])
+@conditional_get
+@require_auth
+def get_featured_list(list_id):
+    """Page through the places of one featured list (?offset=0&limit=20)"""
+    featured_list = featured_lists.get(list_id)
+    if featured_list is None:
+        return jsonify({"error": "Featured list not found"}), 404
+    
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', FEATURED_PAGE_SIZE)), 1), 50)
+    except ValueError:
+        return jsonify({"error": "offset and limit must be integers"}), 400
+    
+    places = featured_list['places']
+    page = places[offset:offset + limit]
+    return jsonify({
+        "list": {key: value for key, value in featured_list.items() if key != 'places'},
+        "places": page,
+        "total_places": len(places),
+        "next_offset": offset + limit if offset + limit < len(places) else None
+    }), 200
+
+
+def fetch_all(table, columns):
+    """Every row of a table, read in pages by id (PostgREST caps each response)"""
+    rows, last_id = [], 0
+    while True:
+        page = supabase.table(table).select(f"id, {columns}").gt('id', last_id).order('id').limit(
+            SUPABASE_PAGE_SIZE
+        ).execute().data
+        rows.extend(page)
+        if len(page) < SUPABASE_PAGE_SIZE:
+            return rows
+        last_id = page[-1]['id']
+
+
+def claim_job(name, lease):
+    """Whether this worker may run `name` now. One claim succeeds per `lease` seconds, across all workers.
+
+    The claim is a conditional update of the job's `job_leases` row, which
+    only matches while the previous lease has expired, so exactly one of
+    several workers racing for it gets the row back.
+    """
+    now = datetime.now(timezone.utc)
+    supabase.table('job_leases').upsert(
+        {'name': name, 'owner': None, 'expires_at': datetime.fromtimestamp(0, timezone.utc).isoformat()},
+        on_conflict='name', ignore_duplicates=True
+    ).execute()
+    claimed = supabase.table('job_leases').update({
+        'owner': f"{socket.gethostname()}:{os.getpid()}",
+        'expires_at': (now + timedelta(seconds=lease)).isoformat(),
+    }).eq('name', name).lt('expires_at', now.isoformat()).execute().data
+    return bool(claimed)
+
+
+def refresh_featured_lists():
+    """Scheduled job: load the stored featured lists, and recompute them if they're stale.
+
+    Every worker runs this, but only the one that claims the lease does the
+    full-table aggregation. The others serve the stored snapshot and pick up
+    the new one on a later reload.
+    """
+    stored = supabase.table('featured_lists').select('*').execute().data
+    # Serve what's stored whatever happens to the recompute below
+    featured_lists.replace(stored)
+    computed_at = max((parse_timestamp(row['computed_at']) for row in stored), default=None)
+    now = datetime.now(timezone.utc)
+    
+    if computed_at is not None and (now - computed_at).total_seconds() < FEATURED_RECOMPUTE_INTERVAL:
+        return
+    try:
+        claimed = claim_job('refresh_featured_lists', FEATURED_RECOMPUTE_LEASE)
+    except Exception as e:
+        app.logger.warning("Could not claim the featured lists recompute: %s", e)
+        claimed = False
+    if not claimed:
+        return
+    
+    reviews = fetch_all('reviews', 'user_id, place_id, place_name, category, rating, latitude, longitude, created_at')
+    trips = fetch_all('trips', 'user_id, city, start_date, end_date')
+    computed = compute_featured_lists(reviews, trips, computed_at=now.isoformat())
+    if computed:
+        supabase.table('featured_lists').upsert(computed, on_conflict='id').execute()
+    # Lists that no longer qualify
+    supabase.table('featured_lists').delete().lt('computed_at', now.isoformat()).execute()
+    featured_lists.replace(computed)
+
+
+jobs.schedule('refresh_featured_lists', refresh_featured_lists, FEATURED_RELOAD_INTERVAL)
+jobs.schedule('flush_place_catalog', place_catalog.flush, PLACE_CATALOG_FLUSH_INTERVAL)
+
+
 @app.route('/user/reviewed-places', methods=['GET'])
+@conditional_get
 @require_auth
 def get_user_reviewed_places():
     """Get all places the user has reviewed with coordinates for map display"""
@@ -1113,6 +2144,7 @@ def get_user_reviewed_places():
 
 
 @app.route('/trip/past', methods=['GET'])
+@conditional_get
 @require_auth
 def get_past_trips():
     """Get all completed trips for the user"""
@@ -1126,42 +2158,52 @@ def get_past_trips():
             'end_date', desc=True
         ).execute()
         
-        past_trips = []
-        for trip in result.data:
-            # Get reviews for this trip (reviews created between start and end dates)
-            reviews_query = supabase.table('reviews').select(
-                'id, rating', count='exact'
-            ).eq('user_id', user_id)
+        trips = result.data
+        
+        # Fetch the user's reviews once and bucket them by trip below, instead
+        # of running a separate query per trip
+        review_times, review_ratings = [], []
+        if trips:
+            reviews_query = supabase.table('reviews').select('rating, created_at').eq('user_id', user_id)
+            if all(trip.get('start_date') for trip in trips):
+                earliest_start = min(parse_timestamp(trip['start_date']) for trip in trips)
+                reviews_query = reviews_query.gte('created_at', earliest_start.isoformat())
             
+            reviews = sorted(
+                (parse_timestamp(review['created_at']), review['rating'])
+                for review in reviews_query.execute().data
+            )
+            review_times = [created_at for created_at, _ in reviews]
+            review_ratings = [rating for _, rating in reviews]
+        
+        past_trips = []
+        for trip in trips:
+            # Reviews for this trip are the ones created between start and end dates
+            lo, hi = 0, len(review_times)
             if trip.get('start_date') and trip.get('end_date'):
-                reviews_query = reviews_query.gte(
-                    'created_at', trip['start_date']
-                ).lte('created_at', trip['end_date'])
+                lo = bisect_left(review_times, parse_timestamp(trip['start_date']))
+                hi = bisect_right(review_times, parse_timestamp(trip['end_date']))
             elif trip.get('start_date'):
                 # If no end_date, use trip creation time + 1 day as fallback
-                from datetime import datetime, timedelta
-                start_time = datetime.fromisoformat(trip['start_date'].replace('Z', '+00:00'))
-                end_time = start_time + timedelta(days=1)
-                reviews_query = reviews_query.gte(
-                    'created_at', trip['start_date']
-                ).lte('created_at', end_time.isoformat())
+                start_time = parse_timestamp(trip['start_date'])
+                lo = bisect_left(review_times, start_time)
+                hi = bisect_right(review_times, start_time + timedelta(days=1))
             
-            reviews_result = reviews_query.execute()
-            review_count = reviews_result.count if reviews_result.count else 0
+            trip_ratings = review_ratings[lo:hi]
+            review_count = len(trip_ratings)
             
             # Calculate average rating for this trip
             average_rating = None
-            if reviews_result.data and len(reviews_result.data) > 0:
-                ratings = [review['rating'] for review in reviews_result.data if review.get('rating')]
-                if ratings:
-                    average_rating = round(sum(ratings) / len(ratings), 1)
+            ratings = [rating for rating in trip_ratings if rating]
+            if ratings:
+                average_rating = round(sum(ratings) / len(ratings), 1)
             
             # Calculate trip duration
             duration_days = None
             if trip.get('start_date') and trip.get('end_date'):
                 try:
-                    start_date = datetime.fromisoformat(trip['start_date'].replace('Z', '+00:00'))
-                    end_date = datetime.fromisoformat(trip['end_date'].replace('Z', '+00:00'))
+                    start_date = parse_timestamp(trip['start_date'])
+                    end_date = parse_timestamp(trip['end_date'])
                     duration_days = (end_date - start_date).days + 1  # +1 to include the start day
                 except:
                     duration_days = None
@@ -1187,11 +2229,217 @@ def get_past_trips():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/user/export', methods=['GET'])
+@require_auth
+def export_user_data():
+    """Download everything the user has stored (?format=ndjson|csv&tables=reviews,trips,friends).
+
+    NDJSON can hold several tables in one file; CSV takes exactly one. The
+    body is streamed as it's read from Supabase, gzipped on the fly for
+    clients that accept it.
+    """
+    user_id = request.user_id
+    fmt = request.args.get('format', 'ndjson')
+    names = [name for name in request.args.get('tables', ','.join(EXPORT_TABLES)).split(',') if name]
+    
+    unknown = [name for name in names if name not in EXPORT_TABLES]
+    if unknown or not names:
+        return jsonify({"error": f"tables must be some of: {', '.join(EXPORT_TABLES)}"}), 400
+    if fmt == 'ndjson':
+        chunks, mimetype = ndjson_export(supabase, user_id, names), 'application/x-ndjson'
+    elif fmt == 'csv':
+        if len(names) != 1:
+            return jsonify({"error": "CSV exports one table at a time, e.g. tables=reviews"}), 400
+        chunks, mimetype = csv_export(supabase, user_id, names[0]), 'text/csv'
+    else:
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+    
+    filename = f"wander-{'-'.join(names)}.{fmt}"
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"', 'Cache-Control': 'private, no-store'}
+    if request.accept_encodings['gzip']:
+        chunks = gzip_stream(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    response = Response(chunks, mimetype=mimetype, headers=headers)
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+@app.route('/batch', methods=['POST'])
+@require_auth
+def run_batch():
+    """Run several GET requests to other endpoints in one round trip.
+
+    Body: {"requests": [{"id": "feed", "path": "/feed"}, {"path": "/trip/past"}]}.
+    Sub-requests run concurrently as the authenticated user, without each
+    checking the token again, and share lookups like the friend list.
+    Returns {"responses": [{"id", "status", "body"}]} in request order.
+    """
+    data = request.get_json(silent=True) or {}
+    sub_requests = data.get('requests')
+    
+    if not isinstance(sub_requests, list) or not sub_requests:
+        return jsonify({"error": "requests must be a non-empty list"}), 400
+    if len(sub_requests) > BATCH_MAX_REQUESTS:
+        return jsonify({"error": f"At most {BATCH_MAX_REQUESTS} requests per batch"}), 400
+    
+    adapter = app.url_map.bind('')
+    for sub_request in sub_requests:
+        if not isinstance(sub_request, dict) or not str(sub_request.get('path', '')).startswith('/'):
+            return jsonify({"error": "Each request needs a path starting with /"}), 400
+        if sub_request.get('method', 'GET').upper() != 'GET':
+            return jsonify({"error": "Only GET requests can be batched"}), 400
+        try:
+            endpoint, _ = adapter.match(sub_request['path'].split('?', 1)[0], method='GET')
+        except Exception:
+            continue  # Answered with the endpoint's own 404/405
+        if endpoint in BATCH_EXCLUDED_ENDPOINTS:
+            return jsonify({"error": f"{sub_request['path']} can't be batched"}), 400
+    
+    batch = Batch(request.user_id, request.user_email)
+    environ_base = {'REMOTE_ADDR': request.remote_addr, BATCH_ENVIRON_KEY: batch}
+    futures = [
+        batch_executor.submit(run_sub_request, sub_request['path'], environ_base)
+        for sub_request in sub_requests
+    ]
+    
+    responses = []
+    for sub_request, future in zip(sub_requests, futures):
+        status, body = future.result()
+        responses.append({"id": sub_request.get('id'), "status": status, "body": body})
+    return jsonify({"responses": responses}), 200
+
+
+def run_sub_request(path, environ_base):
+    """Dispatch one /batch sub-request through the app, returning (status, body)"""
+    builder = EnvironBuilder(path=path, method='GET', environ_base=environ_base)
+    try:
+        environ = builder.get_environ()
+    finally:
+        builder.close()
+    
+    try:
+        with app.request_context(environ):
+            response = app.full_dispatch_request()
+            body = response.get_json(silent=True)
+            if body is None:
+                # Werkzeug's own errors (404, 405) are HTML pages
+                body = {"error": response.status} if response.status_code >= 400 else response.get_data(as_text=True)
+            return response.status_code, body
+    except Exception as e:
+        return 500, {"error": f"Unexpected error: {str(e)}"}
+
+
+@app.route('/photo', methods=['GET'])
+@rate_limited('photo')
+def get_photo():
+    """Serve a Google Place photo from our own cache, resized server-side"""
+    photo_reference = request.args.get('ref')
+    
+    if not photo_reference:
+        return jsonify({"error": "Missing required parameter: ref"}), 400
+    
+    try:
+        width = snap_width(int(request.args.get('width', '400')))
+    except ValueError:
+        return jsonify({"error": "Invalid width"}), 400
+    
+    # Only send WebP to clients that explicitly ask for it
+    accepts_webp = any(mimetype == 'image/webp' for mimetype, _ in request.accept_mimetypes)
+    fmt = 'webp' if RESIZE_AVAILABLE and accepts_webp else 'jpg'
+    key = f"{photo_reference}:{width}:{fmt}"
+    
+    try:
+        path = photo_cache.get(key, fmt)
+        if path is not None:
+            try:
+                return photo_response(path, fmt)
+            except FileNotFoundError:
+                pass  # Evicted by another worker since the lookup, so fetch it again
+        path = photo_flight.do(key, build_photo_variant, key, photo_reference, width, fmt)
+        return photo_response(path, fmt)
+    except Overloaded as e:
+        return too_busy(e)
+    except requests.RequestException as e:
+        return jsonify({"error": f"Failed to fetch photo: {str(e)}"}), 500
+    except Exception as e:
+        return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
+
+
+def photo_response(path, fmt):
+    response = send_file(path, mimetype=CONTENT_TYPES[fmt], max_age=PHOTO_MAX_AGE, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept')
+    return response
+
+
+def build_photo_variant(key, photo_reference, width, fmt):
+    """Resize a photo into the cache, fetching the original from Google only once"""
+    if not RESIZE_AVAILABLE:
+        # Without Pillow let Google do the resizing, one fetch per width
+        return photo_cache.put(key, fmt, google_photo(photo_reference, width))
+    
+    original_key = f"{photo_reference}:original"
+    original = None
+    original_path = photo_cache.get(original_key, 'img')
+    if original_path:
+        try:
+            with open(original_path, 'rb') as f:
+                original = f.read()
+        except FileNotFoundError:
+            original = None  # Evicted between the lookup and the read
+    
+    if original is None:
+        original = google_photo(photo_reference, ORIGINAL_WIDTH)
+        photo_cache.put(original_key, 'img', original)
+    
+    return photo_cache.put(key, fmt, resize_image(original, width, fmt))
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Simple health check endpoint"""
     return jsonify({"status": "healthy", "message": "Flask + Supabase backend is running"}), 200
 
 
+@app.route('/admin/startup', methods=['GET'])
+@require_admin
+def get_startup_report():
+    """Import and init cost of the SDKs this worker has loaded so far"""
+    return jsonify(startup_report()), 200
+
+
+@app.route('/admin/profiles', methods=['GET'])
+@require_admin
+def list_profiles():
+    """List recently captured request profiles, newest first"""
+    profiles = profiler.list_profiles()
+    return jsonify({"profiles": profiles, "total_profiles": len(profiles)}), 200
+
+
+@app.route('/admin/profiles/<profile_id>', methods=['GET'])
+@require_admin
+def get_profile(profile_id):
+    """Download a profile as collapsed stacks, or as a text summary with ?format=text"""
+    path = profiler.find(profile_id)
+    
+    if not path:
+        return jsonify({"error": "Profile not found"}), 404
+    
+    if request.args.get('format') == 'text':
+        sort = request.args.get('sort', 'cumulative')
+        if sort not in ('cumulative', 'self'):
+            return jsonify({"error": "sort must be one of cumulative, self"}), 400
+        return Response(profiler.summary(path, sort=sort), mimetype='text/plain')
+    
+    return send_file(path, mimetype='text/plain', as_attachment=True)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint for request and stage latency"""
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
 if __name__ == '__main__':
     app.run(debug=True, port=5001)
\ No newline at end of file
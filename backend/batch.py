@@ -0,0 +1,35 @@
+import threading
+from concurrent.futures import Future
+
+# WSGI environ key carrying the Batch into each sub-request. Client headers
+# only ever reach the environ as HTTP_*, so a request can't forge it
+BATCH_ENVIRON_KEY = 'wander.batch'
+
+
+class Batch:
+    """The caller's identity and shared lookups for the sub-requests of one /batch call.
+
+    `memo` runs a lookup once per batch: the first sub-request to ask for a
+    key loads it, and the others, running concurrently in other threads,
+    wait for and share its result (or exception). Results are shared, so
+    callers must not modify them.
+    """
+
+    def __init__(self, user_id, user_email):
+        self.user_id = user_id
+        self.user_email = user_email
+        self._lock = threading.Lock()
+        self._memo = {}
+
+    def memo(self, key, fn):
+        with self._lock:
+            future = self._memo.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = self._memo[key] = Future()
+        if is_owner:
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                future.set_exception(e)
+        return future.result()
@@ -0,0 +1,142 @@
+"""Upstream call budgets per endpoint.
+
+Runs every scenario as a brand new user, as a user with a little history and
+as the heaviest seeded user (most friends, reviews and trips), recording the
+calls that reach the fakes. Any endpoint that exceeds its budget, or whose query
+count grows with the user's data (an N+1), fails the run.
+
+    python -m bench.budgets
+
+tests/test_call_budgets.py runs the same checks as part of the unit tests.
+"""
+import os
+import random
+import sys
+
+import requests
+
+from bench.recorder import UpstreamRecorder
+from bench.run import SCENARIOS, Harness, parse_args
+
+# Max calls per request: PostgREST queries, token checks, Google and OpenAI
+BUDGETS = {
+    'feed': {'supabase': 5, 'auth': 1},
+    'trip_current': {'supabase': 1, 'auth': 1},
+    'friends': {'supabase': 3, 'auth': 1},
+    'reviewed_places': {'supabase': 1, 'auth': 1},
+    'past_trips': {'supabase': 2, 'auth': 1},
+    'get_reviews': {'supabase': 1},
+    'user_rating': {'supabase': 1, 'auth': 1},
+    'attractions': {'google': 1},
+    'attraction_details': {'supabase': 1, 'google': 1},
+    # Including the lookup of a trip start's warmed results, made when the caches miss
+    'recommendations': {'supabase': 6, 'auth': 1, 'google': 1, 'openai': 1},
+    'rate_place': {'supabase': 5, 'auth': 1},
+    'start_trip': {'supabase': 2, 'auth': 1},
+    # A page each of reviews and trips, and of friends (plus their users) from both sides
+    'export': {'supabase': 6, 'auth': 1},
+    # trip_current + feed + friends + reviewed_places + past_trips, sharing the friend lookups
+    'launch_batch': {'supabase': 9, 'auth': 1},
+}
+KINDS = ('supabase', 'auth', 'google', 'openai')
+
+# No injected latency or errors; only call counts matter here
+BUDGET_ARGS = [
+    '--google-latency', '0', '--openai-latency', '0', '--supabase-latency', '0', '--jitter', '0', '--error-rate', '0',
+]
+# Count each request's own calls: no background jobs, and no answers served from cache
+BUDGET_ENV = {'BACKGROUND_WORKERS': '0', 'GOOGLE_CACHE_TTL': '0', 'AI_SELECTION_CACHE_TTL': '0'}
+
+
+def pick_users(supabase):
+    """Three users: brand new, the lightest with some of everything, and the heaviest.
+
+    Empty users skip queries (no friends means no friend lookups), so N+1
+    growth is checked between the light and heavy users only.
+    """
+    new_id = '00000000-0000-4000-8000-000000000000'
+    with supabase.db_lock:
+        supabase.db.execute(
+            "INSERT OR IGNORE INTO users (id, email, name) VALUES (?, 'new@bench.test', 'New User')", (new_id,)
+        )
+        supabase.db.commit()
+        rows = supabase.db.execute("""
+            SELECT id, friends + reviews + trips AS weight FROM (
+                SELECT u.id,
+                    (SELECT COUNT(*) FROM friends f WHERE f.person_1_id = u.id OR f.person_2_id = u.id) AS friends,
+                    (SELECT COUNT(*) FROM reviews r WHERE r.user_id = u.id) AS reviews,
+                    (SELECT COUNT(*) FROM trips t WHERE t.user_id = u.id AND t.is_active = 0) AS trips
+                FROM users u
+            ) WHERE friends > 0 AND reviews > 0 AND trips > 0
+            ORDER BY weight, id
+        """).fetchall()
+    return {'new': new_id, 'light': rows[0]['id'], 'heavy': rows[-1]['id']}
+
+
+def check_scenario(harness, recorder, users, session, scenario):
+    """Budget violations for one scenario, and its call counts per user"""
+    budget = BUDGETS.get(scenario)
+    if budget is None:
+        return [f"{scenario}: no budget defined"], {}
+
+    failures = []
+    counts = {}
+    for label, user_id in users.items():
+        with recorder.record() as recording:
+            _, status = harness.send(session, scenario, random.Random(scenario), user_id)
+        counts[label] = {kind: recording.count(kind) for kind in KINDS}
+
+        if status >= 500:
+            failures.append(f"{scenario} ({label}): HTTP {status}")
+        for kind in KINDS:
+            if counts[label][kind] > budget.get(kind, 0):
+                failures.append(
+                    f"{scenario} ({label}): {counts[label][kind]} {kind} calls, budget {budget.get(kind, 0)} "
+                    f"[{recording.describe()}]"
+                )
+
+    if counts['heavy']['supabase'] > counts['light']['supabase']:
+        failures.append(
+            f"{scenario}: query count grows with user data "
+            f"({counts['light']['supabase']} -> {counts['heavy']['supabase']})"
+        )
+    return failures, counts
+
+
+def check(harness, scenarios):
+    recorder = UpstreamRecorder(harness.google, harness.openai, harness.supabase)
+    users = pick_users(harness.supabase)
+    session = requests.Session()
+    failures = []
+
+    for scenario in scenarios:
+        scenario_failures, counts = check_scenario(harness, recorder, users, session, scenario)
+        failures.extend(scenario_failures)
+        if counts:
+            print(f"{scenario:<20} " + '  '.join(f"{label} {counts[label]}" for label in users))
+
+    return failures
+
+
+def main(argv=None):
+    args = parse_args([*BUDGET_ARGS, *(argv or [])])
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip() in SCENARIOS]
+    os.environ.update(BUDGET_ENV)
+
+    harness = Harness(args)
+    harness.start()
+    try:
+        failures = check(harness, scenarios)
+    finally:
+        harness.stop()
+
+    if failures:
+        print('\nBudget violations:')
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print('\nAll endpoints within budget')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,658 @@
+"""Local stand-ins for Google Maps, OpenAI and Supabase.
+
+Each fake is a threaded HTTP server with configurable latency, jitter, tail
+latency and error rate that counts every call it receives. Payloads are shaped like the
+real APIs closely enough for the SDKs and for app.py to parse them.
+"""
+import csv
+import hashlib
+import io
+import json
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+from preferences import profile_from_reviews
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Cities the benchmark plans trips to, with real-ish coordinates
+CITIES = {
+    'paris': (48.8566, 2.3522, 'Paris, France'),
+    'new york': (40.7128, -74.0060, 'New York, NY, USA'),
+    'tokyo': (35.6762, 139.6503, 'Tokyo, Japan'),
+    'london': (51.5074, -0.1278, 'London, UK'),
+    'toronto': (43.6532, -79.3832, 'Toronto, ON, Canada'),
+    'rome': (41.9028, 12.4964, 'Rome, Italy'),
+}
+
+PLACES_PER_SEARCH = 20
+PLACE_TYPES = [
+    ['museum', 'tourist_attraction', 'point_of_interest', 'establishment'],
+    ['park', 'tourist_attraction', 'point_of_interest', 'establishment'],
+    ['church', 'place_of_worship', 'tourist_attraction', 'point_of_interest'],
+    ['shopping_mall', 'store', 'point_of_interest', 'establishment'],
+    ['restaurant', 'food', 'point_of_interest', 'establishment'],
+    ['tourist_attraction', 'point_of_interest', 'establishment'],
+]
+# What the app's place_category() makes of each entry above
+PLACE_CATEGORIES = ['Museum', 'Park', 'Religious Site', 'Shopping', 'Restaurant', 'Landmark']
+
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _stable_random(*parts):
+    digest = hashlib.sha256('|'.join(str(p) for p in parts).encode()).digest()
+    return random.Random(digest)
+
+
+def place_ids_near(lat, lng):
+    """Place ids the fake nearbysearch returns around a point (on a ~10km grid)"""
+    grid = f"{round(lat, 1)}_{round(lng, 1)}"
+    return [f"place_{grid}_{i}" for i in range(PLACES_PER_SEARCH)]
+
+
+def fake_place(place_id, lat=None, lng=None):
+    """Deterministic Places API result for a place id"""
+    rng = _stable_random(place_id)
+    if lat is None:
+        match = re.match(r'place_(-?[\d.]+)_(-?[\d.]+)_\d+$', place_id)
+        lat, lng = (float(match.group(1)), float(match.group(2))) if match else (0.0, 0.0)
+    return {
+        'place_id': place_id,
+        'name': f"Place {place_id[-6:]}",
+        'vicinity': f"{rng.randint(1, 300)} Fake Street",
+        'formatted_address': f"{rng.randint(1, 300)} Fake Street, Benchville",
+        'formatted_phone_number': f"+1 555-{rng.randint(1000, 9999)}",
+        'website': f"https://example.com/{place_id}",
+        'rating': round(rng.uniform(3.0, 5.0), 1),
+        'user_ratings_total': rng.randint(10, 50000),
+        'price_level': rng.randint(0, 4),
+        'types': PLACE_TYPES[rng.randrange(len(PLACE_TYPES))],
+        'geometry': {
+            'location': {'lat': lat + rng.uniform(-0.05, 0.05), 'lng': lng + rng.uniform(-0.05, 0.05)},
+            'viewport': {},
+        },
+        'opening_hours': {'open_now': rng.random() < 0.7},
+        'photos': [
+            {
+                'photo_reference': f"photo_{place_id}_{i}",
+                'width': 4032,
+                'height': 3024,
+                'html_attributions': [],
+            }
+            for i in range(rng.randint(1, 10))
+        ],
+        'reviews': [
+            {
+                'author_name': f"Reviewer {i}",
+                'rating': rng.randint(1, 5),
+                'relative_time_description': 'a month ago',
+                'text': 'Lorem ipsum dolor sit amet. ' * rng.randint(1, 20),
+            }
+            for i in range(5)
+        ],
+    }
+
+
+class FakeUpstream:
+    """Base class: a threaded HTTP server that delays, fails and counts calls"""
+
+    name = 'upstream'
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, seed=0, tail_rate=0.0, tail_ms=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        # A `tail_rate` fraction of calls take an extra `tail_ms`, like a slow backend or a retransmit
+        self.tail_rate = tail_rate
+        self.tail_ms = tail_ms
+        self.calls = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _dispatch(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                status, headers, payload = upstream._serve(self.command, self.path, self.headers, body)
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = _dispatch
+
+            def handle(self):
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client hung up first (a lost hedge, a timeout); nothing to answer
+                    self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def reset_counts(self):
+        with self._lock:
+            self.calls.clear()
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def _serve(self, method, raw_path, headers, body):
+        parts = urlsplit(raw_path)
+        route = self.route_name(method, parts.path)
+        with self._lock:
+            self.calls[route] += 1
+            delay = self.latency_ms + self._rng.uniform(0, self.jitter_ms)
+            if self.tail_rate and self._rng.random() < self.tail_rate:
+                delay += self.tail_ms
+            fail = self._rng.random() < self.error_rate
+        if delay:
+            time.sleep(delay / 1000)
+        if fail:
+            return 503, {'Content-Type': 'application/json'}, b'{"error": "injected failure"}'
+        try:
+            return self.handle(method, parts.path, parse_qsl(parts.query, keep_blank_values=True), headers, body)
+        except Exception as e:
+            return 500, {'Content-Type': 'application/json'}, json.dumps({'message': str(e)}).encode()
+
+    def route_name(self, method, path):
+        return f"{method} {path}"
+
+    def handle(self, method, path, query, headers, body):
+        raise NotImplementedError
+
+
+def _json(status, obj, extra_headers=None):
+    headers = {'Content-Type': 'application/json'}
+    headers.update(extra_headers or {})
+    return status, headers, json.dumps(obj).encode()
+
+
+class FakeGoogleMaps(FakeUpstream):
+    """Geocoding, Places nearbysearch/details and photo endpoints"""
+
+    name = 'google'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._photo = self._make_photo()
+
+    @staticmethod
+    def _make_photo():
+        if Image is None:
+            return b'\xff\xd8\xff\xe0' + b'\x00' * 20000 + b'\xff\xd9'
+        out = io.BytesIO()
+        Image.new('RGB', (1600, 1200), (90, 140, 200)).save(out, 'JPEG', quality=85)
+        return out.getvalue()
+
+    def route_name(self, method, path):
+        return path.rsplit('/maps/api/', 1)[-1]
+
+    def handle(self, method, path, query, headers, body):
+        params = dict(query)
+        route = self.route_name(method, path)
+
+        if route == 'geocode/json':
+            address = params.get('address', '').strip().lower()
+            if 'nowhere' in address:
+                return _json(200, {'status': 'ZERO_RESULTS', 'results': []})
+            if address in CITIES:
+                lat, lng, formatted = CITIES[address]
+            else:
+                rng = _stable_random(address)
+                lat, lng, formatted = rng.uniform(-60, 60), rng.uniform(-180, 180), address.title()
+            return _json(200, {'status': 'OK', 'results': [{
+                'formatted_address': formatted,
+                'geometry': {'location': {'lat': lat, 'lng': lng}, 'location_type': 'APPROXIMATE'},
+                'place_id': f"city_{address}",
+                'types': ['locality', 'political'],
+            }]})
+
+        if route == 'place/nearbysearch/json':
+            lat, lng = (float(v) for v in params['location'].split(','))
+            results = []
+            for place_id in place_ids_near(lat, lng):
+                place = fake_place(place_id, round(lat, 1), round(lng, 1))
+                for detail_only in ('formatted_address', 'formatted_phone_number', 'website', 'reviews', 'opening_hours'):
+                    place.pop(detail_only)
+                results.append(place)
+            return _json(200, {'status': 'OK', 'results': results, 'html_attributions': []})
+
+        if route == 'place/details/json':
+            place = fake_place(params['place_id'])
+            fields = params.get('fields')
+            if fields:
+                place = {k: v for k, v in place.items() if k in fields.split(',')}
+            return _json(200, {'status': 'OK', 'result': place, 'html_attributions': []})
+
+        if route == 'place/photo':
+            return 200, {'Content-Type': 'image/jpeg'}, self._photo
+
+        return _json(404, {'status': 'NOT_FOUND'})
+
+
+class FakeOpenAI(FakeUpstream):
+    """Chat completions endpoint that picks the first ten candidates"""
+
+    name = 'openai'
+
+    def route_name(self, method, path):
+        return path.rsplit('/v1/', 1)[-1]
+
+    def completion_text(self, request_body):
+        picks = list(range(1, 11))
+        if (request_body.get('response_format') or {}).get('type') == 'json_schema':
+            return json.dumps({'picks': picks})
+        return ','.join(str(i) for i in picks)
+
+    def handle(self, method, path, query, headers, body):
+        if self.route_name(method, path) != 'chat/completions':
+            return _json(404, {'error': {'message': 'not found'}})
+        request_body = json.loads(body or b'{}')
+        content = self.completion_text(request_body)
+        return _json(200, {
+            'id': f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request_body.get('model', 'fake-model'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop',
+            }],
+            'usage': {'prompt_tokens': len(body) // 4, 'completion_tokens': len(content) // 4, 'total_tokens': (len(body) + len(content)) // 4},
+        })
+
+
+TIMESTAMP_DEFAULT = "(strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))"
+
+SCHEMA = {
+    'users': f"""
+        id TEXT PRIMARY KEY,
+        email TEXT,
+        name TEXT,
+        created_at TEXT DEFAULT {TIMESTAMP_DEFAULT}
+    """,
+    'friends': f"""
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        person_1_id TEXT NOT NULL,
+        person_2_id TEXT NOT NULL,
+        created_at TEXT DEFAULT {TIMESTAMP_DEFAULT},
+        UNIQUE(person_1_id, person_2_id)
+    """,
+    'trips': f"""
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        city TEXT NOT NULL,
+        country TEXT,
+        start_date TEXT DEFAULT {TIMESTAMP_DEFAULT},
+        end_date TEXT,
+        is_active INTEGER DEFAULT 1,
+        created_at TEXT DEFAULT {TIMESTAMP_DEFAULT},
+        updated_at TEXT DEFAULT {TIMESTAMP_DEFAULT}
+    """,
+    'reviews': f"""
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        review_id TEXT NOT NULL UNIQUE,
+        user_id TEXT NOT NULL,
+        place_id TEXT NOT NULL,
+        place_name TEXT,
+        category TEXT,
+        rating INTEGER NOT NULL,
+        comment TEXT,
+        latitude REAL,
+        longitude REAL,
+        created_at TEXT DEFAULT {TIMESTAMP_DEFAULT},
+        updated_at TEXT DEFAULT {TIMESTAMP_DEFAULT}
+    """,
+    'user_preferences': f"""
+        user_id TEXT PRIMARY KEY,
+        weight REAL NOT NULL DEFAULT 0,
+        rating_sum REAL NOT NULL DEFAULT 0,
+        rating_sq_sum REAL NOT NULL DEFAULT 0,
+        review_count INTEGER NOT NULL DEFAULT 0,
+        category_affinity TEXT NOT NULL DEFAULT '{{}}',
+        top_places TEXT NOT NULL DEFAULT '[]',
+        bottom_places TEXT NOT NULL DEFAULT '[]',
+        updated_at TEXT DEFAULT {TIMESTAMP_DEFAULT}
+    """,
+    'recommendation_warmups': """
+        user_id TEXT NOT NULL,
+        city TEXT NOT NULL,
+        entries TEXT NOT NULL DEFAULT '{}',
+        warmed_at TEXT NOT NULL,
+        PRIMARY KEY (user_id, city)
+    """,
+    'job_leases': """
+        name TEXT PRIMARY KEY,
+        owner TEXT,
+        expires_at TEXT NOT NULL
+    """,
+    'featured_lists': """
+        id TEXT PRIMARY KEY,
+        city TEXT NOT NULL,
+        category TEXT,
+        title TEXT NOT NULL,
+        description TEXT,
+        image_url TEXT,
+        place_count INTEGER NOT NULL,
+        places TEXT NOT NULL DEFAULT '[]',
+        computed_at TEXT NOT NULL
+    """,
+    'places': """
+        place_id TEXT PRIMARY KEY,
+        name TEXT,
+        address TEXT,
+        latitude REAL,
+        longitude REAL,
+        category TEXT,
+        types TEXT NOT NULL DEFAULT '[]',
+        rating REAL,
+        user_ratings_total INTEGER,
+        photos TEXT NOT NULL DEFAULT '[]',
+        details TEXT,
+        refreshed_at TEXT NOT NULL,
+        details_refreshed_at TEXT
+    """,
+}
+
+INDEXES = [
+    "CREATE INDEX idx_reviews_user_id ON reviews(user_id)",
+    "CREATE INDEX idx_reviews_place_id ON reviews(place_id)",
+    "CREATE INDEX idx_friends_person_2_id ON friends(person_2_id)",
+    "CREATE INDEX idx_trips_user_id ON trips(user_id)",
+]
+
+BOOLEAN_COLUMNS = {'is_active'}
+JSON_COLUMNS = {
+    'category_affinity', 'top_places', 'bottom_places', 'places', 'types', 'photos', 'details', 'entries',
+}
+RESERVED_PARAMS = {'select', 'order', 'limit', 'offset', 'on_conflict', 'columns'}
+OPERATORS = {'eq': '=', 'neq': '!=', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<=', 'like': 'LIKE', 'ilike': 'LIKE'}
+IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def _identifier(name):
+    name = name.strip().strip('"')
+    if not IDENTIFIER.match(name):
+        raise ValueError(f"Unsupported identifier: {name}")
+    return name
+
+
+def _coerce(column, value):
+    if value == 'now()':
+        return now_iso()
+    if column in BOOLEAN_COLUMNS and value in ('true', 'false'):
+        return 1 if value == 'true' else 0
+    if column in JSON_COLUMNS and not isinstance(value, str):
+        return json.dumps(value)
+    return value
+
+
+class FakeSupabase(FakeUpstream):
+    """PostgREST and GoTrue subset backed by an in-memory SQLite database.
+
+    Supports the select/insert/upsert/update/delete calls and the filters
+    (eq, neq, gt(e), lt(e), like, in, is, not.*), order, limit, offset and
+    count=exact that postgrest-py generates. Bearer tokens are user ids.
+    """
+
+    name = 'supabase'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.db = sqlite3.connect(':memory:', check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db_lock = threading.Lock()
+        with self.db_lock:
+            for table, columns in SCHEMA.items():
+                self.db.execute(f"CREATE TABLE {table} ({columns})")
+            for statement in INDEXES:
+                self.db.execute(statement)
+
+    def route_name(self, method, path):
+        if path.startswith('/rest/v1/'):
+            return f"{method} {path[len('/rest/v1/'):]}"
+        return f"{method} {path}"
+
+    def handle(self, method, path, query, headers, body):
+        if path == '/auth/v1/user':
+            return self._get_user(headers)
+        if path.startswith('/rest/v1/'):
+            table = _identifier(path[len('/rest/v1/'):])
+            payload = json.loads(body) if body else None
+            return self._rest(method, table, query, headers, payload)
+        return _json(404, {'message': 'not found'})
+
+    def _get_user(self, headers):
+        token = (headers.get('Authorization') or '').removeprefix('Bearer ').strip()
+        with self.db_lock:
+            row = self.db.execute('SELECT id, email, created_at FROM users WHERE id = ?', (token,)).fetchone()
+        if row is None:
+            return _json(401, {'code': 401, 'msg': 'invalid JWT'})
+        return _json(200, {
+            'id': row['id'],
+            'aud': 'authenticated',
+            'role': 'authenticated',
+            'email': row['email'],
+            'app_metadata': {'provider': 'email'},
+            'user_metadata': {},
+            'created_at': row['created_at'],
+        })
+
+    def _where(self, query):
+        clauses, args = [], []
+        for key, raw in query:
+            if key in RESERVED_PARAMS:
+                continue
+            column = _identifier(key)
+            negate = raw.startswith('not.')
+            if negate:
+                raw = raw[len('not.'):]
+            op, _, value = raw.partition('.')
+
+            if op == 'is':
+                clause = f"{column} IS {'NULL' if value == 'null' else int(value == 'true')}"
+            elif op == 'in':
+                values = next(csv.reader([value.strip('()')], skipinitialspace=True)) if value.strip('()') else []
+                clause = f"{column} IN ({','.join('?' * len(values))})"
+                args.extend(_coerce(column, v) for v in values)
+            elif op in OPERATORS:
+                if op in ('like', 'ilike'):
+                    value = value.replace('*', '%')
+                    column_sql = f"LOWER({column})" if op == 'ilike' else column
+                    clause = f"{column_sql} LIKE {'LOWER(?)' if op == 'ilike' else '?'}"
+                else:
+                    clause = f"{column} {OPERATORS[op]} ?"
+                args.append(_coerce(column, value))
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+            clauses.append(f"NOT ({clause})" if negate else clause)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', args
+
+    @staticmethod
+    def _rows(cursor, columns=None):
+        rows = []
+        for row in cursor.fetchall():
+            item = {key: row[key] for key in row.keys() if columns is None or key in columns}
+            for key in BOOLEAN_COLUMNS & item.keys():
+                if item[key] is not None:
+                    item[key] = bool(item[key])
+            for key in JSON_COLUMNS & item.keys():
+                if isinstance(item[key], str):
+                    item[key] = json.loads(item[key])
+            rows.append(item)
+        return rows
+
+    def _rest(self, method, table, query, headers, payload):
+        params = dict(query)
+        prefer = headers.get('Prefer') or ''
+        where, args = self._where(query)
+
+        with self.db_lock:
+            if method == 'GET':
+                select = params.get('select', '*')
+                columns = None if select.strip() == '*' else [_identifier(c) for c in select.split(',')]
+                sql = f"SELECT {'*' if columns is None else ', '.join(columns)} FROM {table}{where}"
+                if params.get('order'):
+                    terms = []
+                    for term in params['order'].split(','):
+                        column, _, direction = term.partition('.')
+                        terms.append(f"{_identifier(column)} {'DESC' if direction.startswith('desc') else 'ASC'}")
+                    sql += ' ORDER BY ' + ', '.join(terms)
+                if params.get('limit'):
+                    sql += f" LIMIT {int(params['limit'])}"
+                    if params.get('offset'):
+                        sql += f" OFFSET {int(params['offset'])}"
+                rows = self._rows(self.db.execute(sql, args))
+
+                extra = {}
+                if 'count=exact' in prefer:
+                    total = self.db.execute(f"SELECT COUNT(*) FROM {table}{where}", args).fetchone()[0]
+                    extra['Content-Range'] = f"0-{max(len(rows) - 1, 0)}/{total}" if rows else f"*/{total}"
+                return _json(200, rows, extra)
+
+            if method == 'POST':
+                records = payload if isinstance(payload, list) else [payload]
+                rows = []
+                for record in records:
+                    columns = [_identifier(c) for c in record]
+                    values = [_coerce(c, record[c]) for c in record]
+                    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+                    if 'resolution=merge-duplicates' in prefer and params.get('on_conflict'):
+                        conflict = [_identifier(c) for c in params['on_conflict'].split(',')]
+                        updates = ', '.join(f"{c} = excluded.{c}" for c in columns if c not in conflict)
+                        sql += f" ON CONFLICT ({', '.join(conflict)}) DO " + (f"UPDATE SET {updates}" if updates else 'NOTHING')
+                    elif 'resolution=ignore-duplicates' in prefer:
+                        sql = sql.replace('INSERT INTO', 'INSERT OR IGNORE INTO', 1)
+                    rows.extend(self._rows(self.db.execute(sql + ' RETURNING *', values)))
+                self.db.commit()
+                return _json(201, rows)
+
+            if method == 'PATCH':
+                assignments = ', '.join(f"{_identifier(c)} = ?" for c in payload)
+                values = [_coerce(c, v) for c, v in payload.items()]
+                rows = self._rows(self.db.execute(f"UPDATE {table} SET {assignments}{where} RETURNING *", values + args))
+                self.db.commit()
+                return _json(200, rows)
+
+            if method == 'DELETE':
+                rows = self._rows(self.db.execute(f"DELETE FROM {table}{where} RETURNING *", args))
+                self.db.commit()
+                return _json(200, rows)
+
+        return _json(405, {'message': f"Unsupported method {method}"})
+
+    def seed(self, users=200, friends_per_user=10, reviews_per_user=15, trips_per_user=3, seed=42):
+        """Fill the tables with a deterministic social graph and review history"""
+        rng = random.Random(seed)
+        user_ids = [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(users)]
+        now = datetime.now(timezone.utc)
+        city_places = {name: place_ids_near(lat, lng) for name, (lat, lng, _) in CITIES.items()}
+
+        with self.db_lock:
+            self.db.executemany(
+                'INSERT INTO users (id, email, name) VALUES (?, ?, ?)',
+                [(uid, f"user{i}@bench.test", f"Bench User {i}" if i % 3 else None) for i, uid in enumerate(user_ids)]
+            )
+
+            pairs = set()
+            for uid in user_ids:
+                for friend in rng.sample(user_ids, min(friends_per_user, users - 1)):
+                    if friend != uid:
+                        pairs.add((min(uid, friend), max(uid, friend)))
+            self.db.executemany('INSERT INTO friends (person_1_id, person_2_id) VALUES (?, ?)', sorted(pairs))
+
+            reviews, trips = [], []
+            for uid in user_ids:
+                for _ in range(rng.randint(0, reviews_per_user * 2)):
+                    city = rng.choice(list(CITIES))
+                    place_id = rng.choice(city_places[city])
+                    place = fake_place(place_id)
+                    has_coordinates = rng.random() < 0.9
+                    created = (now - timedelta(days=rng.uniform(0, 90))).isoformat()
+                    reviews.append((
+                        str(uuid.UUID(int=rng.getrandbits(128), version=4)), uid, place_id, place['name'],
+                        rng.randint(1, 10), rng.choice(['', 'Loved it', 'Too crowded', 'Worth the trip']),
+                        place['geometry']['location']['lat'] if has_coordinates else None,
+                        place['geometry']['location']['lng'] if has_coordinates else None,
+                        created, created
+                    ))
+                for i in range(rng.randint(0, trips_per_user * 2)):
+                    start = now - timedelta(days=rng.uniform(1, 60))
+                    city = rng.choice(list(CITIES))
+                    trips.append((uid, city.title(), None, start.isoformat(), (start + timedelta(days=rng.randint(1, 7))).isoformat(), 0, start.isoformat()))
+                if rng.random() < 0.3:
+                    city = rng.choice(list(CITIES))
+                    trips.append((uid, city.title(), None, now.isoformat(), None, 1, now.isoformat()))
+
+            # Keep review_id unique even if two rows land on the same place
+            seen = set()
+            reviews = [r for r in reviews if (r[1], r[2]) not in seen and not seen.add((r[1], r[2]))]
+            self.db.executemany(
+                'INSERT INTO reviews (review_id, user_id, place_id, place_name, rating, comment, latitude, longitude, created_at, updated_at, category) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [review + (PLACE_CATEGORIES[PLACE_TYPES.index(fake_place(review[2])['types'])],) for review in reviews]
+            )
+            self.db.executemany(
+                'INSERT INTO trips (user_id, city, country, start_date, end_date, is_active, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                trips
+            )
+
+            # Existing users already have preference profiles in a deployed database
+            by_user = defaultdict(list)
+            for review_id, uid, place_id, place_name, rating, *_, created, _ in reviews:
+                by_user[uid].append({'place_id': place_id, 'place_name': place_name, 'rating': rating, 'created_at': created})
+            profiles = [profile_from_reviews(uid, user_reviews) for uid, user_reviews in by_user.items()]
+            self.db.executemany(
+                'INSERT INTO user_preferences (user_id, weight, rating_sum, rating_sq_sum, review_count, category_affinity, '
+                'top_places, bottom_places, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(
+                    p['user_id'], p['weight'], p['rating_sum'], p['rating_sq_sum'], p['review_count'],
+                    json.dumps(p['category_affinity']), json.dumps(p['top_places']), json.dumps(p['bottom_places']),
+                    p['updated_at'],
+                ) for p in profiles]
+            )
+            self.db.commit()
+        return user_ids
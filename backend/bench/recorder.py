@@ -0,0 +1,53 @@
+"""Count the upstream calls a single endpoint invocation makes."""
+from collections import Counter
+from contextlib import contextmanager
+
+
+class UpstreamRecorder:
+    """Snapshots the fakes' call counters around a block of requests.
+
+    Supabase calls are split into `auth` (token checks) and `supabase`
+    (PostgREST queries); each recording also keeps per-route detail so a
+    budget failure shows which queries were issued.
+    """
+
+    def __init__(self, google, openai, supabase):
+        self.google = google
+        self.openai = openai
+        self.supabase = supabase
+
+    def _snapshot(self):
+        routes = Counter()
+        for upstream in (self.google, self.openai, self.supabase):
+            with upstream._lock:
+                for route, count in upstream.calls.items():
+                    routes[(upstream.name, route)] += count
+        return routes
+
+    @contextmanager
+    def record(self):
+        recording = Recording()
+        before = self._snapshot()
+        try:
+            yield recording
+        finally:
+            recording.routes = self._snapshot() - before
+
+
+class Recording:
+    def __init__(self):
+        self.routes = Counter()
+
+    def count(self, kind):
+        total = 0
+        for (upstream, route), calls in self.routes.items():
+            if kind == 'auth' and upstream == 'supabase' and route.endswith('/auth/v1/user'):
+                total += calls
+            elif kind == 'supabase' and upstream == 'supabase' and not route.endswith('/auth/v1/user'):
+                total += calls
+            elif kind == upstream and kind != 'supabase':
+                total += calls
+        return total
+
+    def describe(self):
+        return ', '.join(f"{route} x{calls}" for (_, route), calls in sorted(self.routes.items()))
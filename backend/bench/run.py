@@ -0,0 +1,343 @@
+"""Offline load test for the Flask backend.
+
+Starts fake Google Maps, OpenAI and Supabase servers, seeds the Supabase fake,
+serves app.py against them on a local port and drives a weighted request mix.
+Reports p50/p95/p99 latency, throughput and upstream calls per request for
+every endpoint, and can save results as JSON to compare across commits.
+
+    python -m bench.run --concurrency 16 --requests 2000 --output before.json
+    python -m bench.run --concurrency 16 --requests 2000 --compare before.json
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bench.fakes import CITIES, FakeGoogleMaps, FakeOpenAI, FakeSupabase, place_ids_near
+
+# Shaped like a service-role JWT; the fakes never check it
+DUMMY_SERVICE_KEY = 'eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.bench'
+
+ALL_PLACE_IDS = [place_id for lat, lng, _ in CITIES.values() for place_id in place_ids_near(lat, lng)]
+
+
+def _city_point(rng):
+    lat, lng, _ = CITIES[rng.choice(list(CITIES))]
+    return lat + rng.uniform(-0.03, 0.03), lng + rng.uniform(-0.03, 0.03)
+
+
+# name -> (weight, builder(rng) -> (method, path, params, json body))
+SCENARIOS = {
+    'feed': (20, lambda rng: ('GET', '/feed', None, None)),
+    'trip_current': (12, lambda rng: ('GET', '/trip/current', None, None)),
+    'friends': (8, lambda rng: ('GET', '/friends', None, None)),
+    'reviewed_places': (8, lambda rng: ('GET', '/user/reviewed-places', None, None)),
+    'past_trips': (8, lambda rng: ('GET', '/trip/past', None, None)),
+    'get_reviews': (10, lambda rng: ('GET', '/get_reviews', {'place_id': rng.choice(ALL_PLACE_IDS)}, None)),
+    'user_rating': (6, lambda rng: ('GET', '/get_user_rating', {'place_id': rng.choice(ALL_PLACE_IDS)}, None)),
+    'attractions': (10, lambda rng: ('GET', '/attractions', dict(zip(('lat', 'lng'), _city_point(rng))), None)),
+    'attraction_details': (6, lambda rng: ('GET', '/attraction_details', {'place_id': rng.choice(ALL_PLACE_IDS)}, None)),
+    'recommendations': (6, lambda rng: ('GET', '/trip/recommendations', {'city': rng.choice(list(CITIES))}, None)),
+    'rate_place': (4, lambda rng: ('POST', '/rate_place', None, {
+        'place_id': rng.choice(ALL_PLACE_IDS),
+        'place_name': 'Bench Place',
+        'rating': rng.randint(1, 10),
+        'comment': 'bench',
+    })),
+    'start_trip': (2, lambda rng: ('POST', '/trip/start', None, {'city': rng.choice(list(CITIES)).title()})),
+    'export': (1, lambda rng: ('GET', '/user/export', None, None)),
+    # What the app requests on launch, in one round trip
+    'launch_batch': (2, lambda rng: ('POST', '/batch', None, {'requests': [
+        {'id': 'current_trip', 'path': '/trip/current'},
+        {'id': 'feed', 'path': '/feed'},
+        {'id': 'friends', 'path': '/friends'},
+        {'id': 'reviewed_places', 'path': '/user/reviewed-places'},
+        {'id': 'past_trips', 'path': '/trip/past'},
+    ]})),
+}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Harness:
+    """Fakes + app server + request driver"""
+
+    def __init__(self, args):
+        self.args = args
+        self.google = FakeGoogleMaps(
+            latency_ms=args.google_latency, jitter_ms=args.jitter, error_rate=args.error_rate, seed=args.seed,
+            tail_rate=args.google_tail_rate, tail_ms=args.google_tail_latency,
+        )
+        self.openai = FakeOpenAI(latency_ms=args.openai_latency, jitter_ms=args.jitter, error_rate=args.error_rate, seed=args.seed + 1)
+        self.supabase = FakeSupabase(latency_ms=args.supabase_latency, jitter_ms=args.jitter, error_rate=args.error_rate, seed=args.seed + 2)
+        self.upstreams = [self.google, self.openai, self.supabase]
+        self.server = None
+        self.process = None
+        self.base_url = None
+        self.user_ids = []
+
+    def start(self):
+        for upstream in self.upstreams:
+            upstream.start()
+        self.user_ids = self.supabase.seed(users=self.args.users, seed=self.args.seed)
+
+        # Point the app at the fakes before it is imported
+        os.environ.update({
+            'SUPABASE_URL': self.supabase.url,
+            'SUPABASE_SERVICE_ROLE_KEY': DUMMY_SERVICE_KEY,
+            'OPENAI_API_KEY': 'bench',
+            'OPENAI_BASE_URL': f"{self.openai.url}/v1",
+            'GOOGLE_MAPS_API_KEY': 'bench',
+            'GOOGLE_MAPS_API_BASE_URL': f"{self.google.url}/maps/api",
+            'PHOTO_CACHE_DIR': tempfile.mkdtemp(prefix='wander-bench-photos-'),
+            # A handful of seeded users stand in for many real ones, so per-user limits would skew results
+            'RATE_LIMIT_RECOMMENDATIONS': 'off',
+            'RATE_LIMIT_ATTRACTIONS': 'off',
+            'RATE_LIMIT_ATTRACTION_DETAILS': 'off',
+            'RATE_LIMIT_PHOTO': 'off',
+        })
+        if self.args.server == 'production':
+            self._start_production()
+            return
+
+        from werkzeug.serving import make_server
+        from app import app
+
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def _start_production(self):
+        """Run main.py in a subprocess, configured by the WEB_*/WORKER_* environment"""
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        env = dict(os.environ, BIND=f"127.0.0.1:{port}", ACCESS_LOG='')
+        backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.process = subprocess.Popen([sys.executable, 'main.py'], cwd=backend_dir, env=env)
+        self.base_url = f"http://127.0.0.1:{port}"
+
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            try:
+                if requests.get(f"{self.base_url}/health", timeout=1).ok:
+                    return
+            except requests.RequestException:
+                time.sleep(0.2)
+        self.stop()
+        raise RuntimeError('production server did not become healthy within 30s')
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+        if self.process:
+            self.process.terminate()
+            self.process.wait(timeout=60)
+        for upstream in self.upstreams:
+            upstream.stop()
+
+    def send(self, session, scenario, rng, user_id):
+        method, path, params, body = SCENARIOS[scenario][1](rng)
+        start = time.perf_counter()
+        response = session.request(
+            method, self.base_url + path, params=params, json=body,
+            headers={'Authorization': f"Bearer {user_id}"}, timeout=60
+        )
+        response.content  # make sure the whole body is read
+        return time.perf_counter() - start, response.status_code
+
+    def calibrate(self, scenarios):
+        """Serially measure upstream calls per request for each scenario"""
+        per_request = {}
+        rng = random.Random(self.args.seed)
+        session = requests.Session()
+        for scenario in scenarios:
+            for upstream in self.upstreams:
+                upstream.reset_counts()
+            for _ in range(self.args.calibration_requests):
+                self.send(session, scenario, rng, rng.choice(self.user_ids))
+            per_request[scenario] = {
+                upstream.name: upstream.total_calls() / self.args.calibration_requests
+                for upstream in self.upstreams
+            }
+        return per_request
+
+    def load(self, scenarios):
+        """Drive the weighted mix with `concurrency` clients"""
+        weights = [SCENARIOS[name][0] for name in scenarios]
+        samples = defaultdict(list)
+        errors = defaultdict(int)
+        lock = threading.Lock()
+        remaining = [self.args.requests]
+
+        def client(worker):
+            rng = random.Random(self.args.seed * 1000 + worker)
+            session = requests.Session()
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                scenario = rng.choices(scenarios, weights)[0]
+                try:
+                    elapsed, status = self.send(session, scenario, rng, rng.choice(self.user_ids))
+                except requests.RequestException:
+                    elapsed, status = None, 0
+                with lock:
+                    if elapsed is not None:
+                        samples[scenario].append(elapsed)
+                    if status >= 400 or status == 0:
+                        errors[scenario] += 1
+
+        for upstream in self.upstreams:
+            upstream.reset_counts()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(self.args.concurrency) as pool:
+            list(pool.map(client, range(self.args.concurrency)))
+        wall = time.perf_counter() - start
+        upstream_totals = {upstream.name: dict(upstream.calls) for upstream in self.upstreams}
+        return samples, errors, wall, upstream_totals
+
+
+def summarize(samples, errors, wall, per_request):
+    endpoints = {}
+    for scenario in sorted(set(samples) | set(errors)):
+        values = sorted(samples.get(scenario, []))
+        endpoints[scenario] = {
+            'requests': len(values),
+            'errors': errors.get(scenario, 0),
+            'p50_ms': round(percentile(values, 50) * 1000, 2) if values else None,
+            'p95_ms': round(percentile(values, 95) * 1000, 2) if values else None,
+            'p99_ms': round(percentile(values, 99) * 1000, 2) if values else None,
+            'upstream_calls_per_request': per_request.get(scenario, {}),
+        }
+    total = sum(len(v) for v in samples.values())
+    everything = sorted(v for values in samples.values() for v in values)
+    return {
+        'throughput_rps': round(total / wall, 2) if wall else None,
+        'wall_seconds': round(wall, 3),
+        'overall': {
+            'requests': total,
+            'p50_ms': round(percentile(everything, 50) * 1000, 2) if everything else None,
+            'p95_ms': round(percentile(everything, 95) * 1000, 2) if everything else None,
+            'p99_ms': round(percentile(everything, 99) * 1000, 2) if everything else None,
+        },
+        'endpoints': endpoints,
+    }
+
+
+def print_report(results, baseline=None):
+    def delta(key, scenario=None):
+        if baseline is None:
+            return ''
+        old = baseline['overall'] if scenario is None else baseline['endpoints'].get(scenario, {})
+        new = results['overall'] if scenario is None else results['endpoints'][scenario]
+        if old.get(key) in (None, 0) or new.get(key) is None:
+            return ''
+        return f" ({(new[key] - old[key]) / old[key] * 100:+.0f}%)"
+
+    print(f"commit {results['commit']}  throughput {results['throughput_rps']} req/s  wall {results['wall_seconds']}s")
+    header = f"{'endpoint':<20}{'reqs':>6}{'errs':>6}{'p50 ms':>18}{'p95 ms':>18}{'p99 ms':>18}  upstream calls/req"
+    print(header)
+    print('-' * len(header))
+    for scenario, row in results['endpoints'].items():
+        calls = ', '.join(f"{name}={count:g}" for name, count in row['upstream_calls_per_request'].items() if count)
+        print(
+            f"{scenario:<20}{row['requests']:>6}{row['errors']:>6}"
+            f"{str(row['p50_ms']) + delta('p50_ms', scenario):>18}"
+            f"{str(row['p95_ms']) + delta('p95_ms', scenario):>18}"
+            f"{str(row['p99_ms']) + delta('p99_ms', scenario):>18}  {calls}"
+        )
+    overall = results['overall']
+    print(
+        f"{'overall':<20}{overall['requests']:>6}{'':>6}"
+        f"{str(overall['p50_ms']) + delta('p50_ms'):>18}"
+        f"{str(overall['p95_ms']) + delta('p95_ms'):>18}"
+        f"{str(overall['p99_ms']) + delta('p99_ms'):>18}"
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=1000, help='total requests in the load phase')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--users', type=int, default=200, help='seeded users')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated scenarios to run')
+    parser.add_argument('--calibration-requests', type=int, default=5, help='serial requests per scenario when counting upstream calls')
+    parser.add_argument('--google-latency', type=float, default=80, help='fake Google latency in ms')
+    parser.add_argument('--openai-latency', type=float, default=600, help='fake OpenAI latency in ms')
+    parser.add_argument('--supabase-latency', type=float, default=15, help='fake Supabase latency in ms')
+    parser.add_argument('--jitter', type=float, default=10, help='extra uniform random latency in ms')
+    parser.add_argument('--google-tail-rate', type=float, default=0.0, help='fraction of Google calls that are slow')
+    parser.add_argument('--google-tail-latency', type=float, default=1000, help='extra latency of a slow Google call in ms')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of upstream calls that fail')
+    parser.add_argument('--server', choices=('dev', 'production'), default='dev',
+                        help='dev: in-process threaded werkzeug server; production: main.py in a subprocess')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--compare', help='baseline results JSON to diff against')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    harness = Harness(args)
+    harness.start()
+    try:
+        per_request = harness.calibrate(scenarios)
+        samples, errors, wall, upstream_totals = harness.load(scenarios)
+    finally:
+        harness.stop()
+
+    results = summarize(samples, errors, wall, per_request)
+    results.update({
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'upstream_totals': upstream_totals,
+    })
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+    def __init__(self, name):
+        super().__init__(f"{name} circuit is open")
+        self.name = name
+
+
+class CircuitBreaker:
+    """Stop calling an upstream that is failing or slow, and probe it before trusting it again.
+
+    Outcomes from the last `window` seconds are kept. Once at least
+    `min_calls` are recorded, the circuit opens if the share of failures
+    reaches `failure_rate`, or the share of calls slower than `slow_call`
+    seconds reaches `slow_rate`. While open, `allow()` is False, so callers
+    skip the upstream and use their fallback. After `open_for` seconds the
+    circuit goes half-open and lets `probes` calls through. It closes if all
+    of them succeed quickly and opens again as soon as one doesn't.
+
+    Counts are per process, so each worker trips on its own traffic.
+    """
+
+    def __init__(self, name, failure_rate=0.5, slow_call=5.0, slow_rate=0.5,
+                 min_calls=5, window=60.0, open_for=30.0, probes=2, on_state_change=None):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_for = open_for
+        self.probes = probes
+        self.on_state_change = on_state_change
+        self._lock = threading.Lock()
+        self._outcomes = deque()  # (timestamp, failed, slow)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_started = 0
+        self._probes_passed = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return self._state
+
+    def allow(self):
+        """Whether a call may go to the upstream right now"""
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes_started < self.probes:
+                self._probes_started += 1
+                return True
+            return False
+
+    def release(self):
+        """Give back a call `allow()` let through that ended without an outcome to record.
+
+        A half-open probe that never reached the upstream (turned away by
+        our own concurrency limit, say) frees its slot for another probe;
+        otherwise the circuit would stay half-open with no probes left.
+        """
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes_started > self._probes_passed:
+                self._probes_started -= 1
+
+    def record(self, success, duration):
+        """Report the outcome of a call that `allow()` let through"""
+        now = time.monotonic()
+        failed = not success
+        slow = duration >= self.slow_call
+        with self._lock:
+            if self._state == HALF_OPEN:
+                if failed or slow:
+                    self._transition(OPEN, now)
+                else:
+                    self._probes_passed += 1
+                    if self._probes_passed >= self.probes:
+                        self._transition(CLOSED, now)
+                return
+            if self._state == OPEN:
+                # A call that started before the circuit opened
+                return
+
+            self._outcomes.append((now, failed, slow))
+            while self._outcomes and self._outcomes[0][0] < now - self.window:
+                self._outcomes.popleft()
+
+            total = len(self._outcomes)
+            if total < self.min_calls:
+                return
+            failures = sum(1 for _, f, _ in self._outcomes if f)
+            slow_calls = sum(1 for _, _, s in self._outcomes if s)
+            if failures / total >= self.failure_rate or slow_calls / total >= self.slow_rate:
+                self._transition(OPEN, now)
+
+    def stats(self):
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return {
+                'state': self._state,
+                'recent_calls': len(self._outcomes),
+                'recent_failures': sum(1 for _, f, _ in self._outcomes if f),
+                'recent_slow_calls': sum(1 for _, _, s in self._outcomes if s),
+            }
+
+    def _maybe_half_open(self, now):
+        if self._state == OPEN and now - self._opened_at >= self.open_for:
+            self._transition(HALF_OPEN, now)
+
+    def _transition(self, state, now):
+        self._state = state
+        self._probes_started = 0
+        self._probes_passed = 0
+        if state == OPEN:
+            self._opened_at = now
+        if state != HALF_OPEN:
+            # Judge the upstream on fresh calls from here on
+            self._outcomes.clear()
+        if self.on_state_change is not None:
+            self.on_state_change(self.name, state)
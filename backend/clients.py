@@ -0,0 +1,143 @@
+"""Process-wide SDK clients, created on first use.
+
+The Supabase and OpenAI SDKs take most of the app's import time, so app.py
+doesn't import them until a request needs them. A worker that only serves
+/health or /get_reviews never loads OpenAI at all.
+
+Each client belongs to the process that created it. After a fork (gunicorn
+with PRELOAD_APP) the child drops the parent's client and builds its own, so
+workers never share connection pools or locks.
+
+`python -m clients` prints the import cost of each top-level package.
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+BOOT_TIME = time.time()
+
+# dependency -> {'import_ms': ..., 'init_ms': ...}, for this process only
+_startup = {}
+_startup_lock = threading.Lock()
+_startup_pid = os.getpid()
+
+
+@contextmanager
+def timed(dependency, phase):
+    """Record how long `phase` ('import' or 'init') of a dependency takes"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with _startup_lock:
+            _startup.setdefault(dependency, {})[f"{phase}_ms"] = round(elapsed_ms, 1)
+
+
+def startup_report():
+    """Import and initialization cost of each dependency loaded in this worker.
+
+    A client's init_ms includes its SDK's import_ms.
+    """
+    with _startup_lock:
+        dependencies = {name: dict(phases) for name, phases in _startup.items()}
+    return {
+        'pid': os.getpid(),
+        'uptime_s': round(time.time() - BOOT_TIME, 1),
+        'forked': os.getpid() != _startup_pid,
+        'dependencies': dependencies,
+        'clients': {client.name: client.initialized for client in _clients},
+    }
+
+
+_clients = weakref.WeakSet()
+
+
+class LazyClient:
+    """Proxy that builds its client on first use, once per process.
+
+    Attribute access is forwarded to the real client, so a LazyClient can
+    stand in wherever the client itself was used.
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._client = None
+        self._pid = None
+        _clients.add(self)
+
+    @property
+    def initialized(self):
+        return self._client is not None and self._pid == os.getpid()
+
+    def get(self):
+        client, pid = self._client, self._pid
+        if client is not None and pid == os.getpid():
+            return client
+
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                with timed(self.name, 'init'):
+                    self._client = self._factory()
+                self._pid = os.getpid()
+            return self._client
+
+    def reset(self):
+        """Forget the client (and its connection pool); the next use builds a new one"""
+        self._lock = threading.Lock()
+        self._client = None
+        self._pid = None
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+def _after_fork_in_child():
+    # The parent's lock may have been held mid-init by a thread that doesn't exist here
+    global _startup_lock
+    _startup_lock = threading.Lock()
+    for client in list(_clients):
+        client.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def import_costs(module='app'):
+    """Cumulative import time per top-level package when importing `module`, slowest first"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    costs = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or line.count('|') != 2:
+            continue
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        if depth == 0:
+            # Children are listed before their parent, so a top-level line closes a block
+            if name == module:
+                break
+            costs = {}
+        elif depth == 1:
+            package = name.split('.')[0]
+            costs[package] = costs.get(package, 0) + int(cumulative) / 1000
+    return sorted(costs.items(), key=lambda item: item[1], reverse=True)
+
+
+if __name__ == '__main__':
+    module = sys.argv[1] if len(sys.argv) > 1 else 'app'
+    for package, ms in import_costs(module):
+        if ms >= 1:
+            print(f"{package:<30} {ms:>9.1f} ms")
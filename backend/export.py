@@ -0,0 +1,111 @@
+"""Streaming export of everything a user has stored: reviews, trips and friends.
+
+Rows are read from Supabase a page at a time with keyset pagination (`id >
+last id seen`, which stays fast however deep the export goes, unlike
+OFFSET) and written out as they arrive, so memory use doesn't depend on how
+much history the user has.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timezone
+
+EXPORT_PAGE_SIZE = 500
+
+# name -> (table, columns), in export order
+EXPORT_TABLES = {
+    'reviews': ('reviews', (
+        'id', 'review_id', 'place_id', 'place_name', 'category', 'rating', 'comment',
+        'latitude', 'longitude', 'created_at', 'updated_at',
+    )),
+    'trips': ('trips', ('id', 'city', 'country', 'start_date', 'end_date', 'is_active', 'created_at')),
+    'friends': ('friends', ('id', 'friend_id', 'friend_email', 'friend_name', 'created_at')),
+}
+RECORD_TYPES = {'reviews': 'review', 'trips': 'trip', 'friends': 'friend'}
+
+
+def keyset_pages(query, page_size=EXPORT_PAGE_SIZE):
+    """Pages of rows from `query()` (a fresh filtered select each call), in id order"""
+    last_id = 0
+    while True:
+        page = query().gt('id', last_id).order('id').limit(page_size).execute().data
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        last_id = page[-1]['id']
+
+
+def export_pages(supabase, user_id, name, page_size=EXPORT_PAGE_SIZE):
+    """Pages of export records for one of EXPORT_TABLES"""
+    table, columns = EXPORT_TABLES[name]
+    if name != 'friends':
+        select = ', '.join(columns)
+        yield from keyset_pages(
+            lambda: supabase.table(table).select(select).eq('user_id', user_id), page_size
+        )
+        return
+
+    # A friendship is stored once, with the user on either side
+    for own_side, friend_side in (('person_1_id', 'person_2_id'), ('person_2_id', 'person_1_id')):
+        pages = keyset_pages(
+            lambda own_side=own_side, friend_side=friend_side: supabase.table('friends').select(
+                f"id, {friend_side}, created_at"
+            ).eq(own_side, user_id),
+            page_size
+        )
+        for page in pages:
+            friend_ids = [row[friend_side] for row in page]
+            users = supabase.table('users').select('id, email, name').in_('id', friend_ids).execute().data
+            users_map = {user['id']: user for user in users}
+            yield [{
+                'id': row['id'],
+                'friend_id': row[friend_side],
+                'friend_email': users_map.get(row[friend_side], {}).get('email'),
+                'friend_name': users_map.get(row[friend_side], {}).get('name'),
+                'created_at': row['created_at'],
+            } for row in page]
+
+
+def ndjson_export(supabase, user_id, names):
+    """One JSON object per line: a header, then `{"type": "review", ...}` records per table"""
+    yield json.dumps({
+        'type': 'export',
+        'user_id': user_id,
+        'tables': list(names),
+        'exported_at': datetime.now(timezone.utc).isoformat(),
+    }) + '\n'
+    try:
+        for name in names:
+            for page in export_pages(supabase, user_id, name):
+                yield ''.join(json.dumps({'type': RECORD_TYPES[name], **row}) + '\n' for row in page)
+    except Exception as e:
+        # The status line is long gone; say the export is incomplete in-band
+        yield json.dumps({'type': 'error', 'error': str(e)}) + '\n'
+
+
+def csv_export(supabase, user_id, name):
+    """One table as CSV with a header row"""
+    columns = EXPORT_TABLES[name][1]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+    for page in export_pages(supabase, user_id, name):
+        writer.writerows(page)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.getvalue():
+        # No rows: just the header
+        yield buffer.getvalue()
+
+
+def gzip_stream(chunks, level=6):
+    """Gzip a stream of str chunks on the fly, flushing after each so output isn't held back"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode()) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
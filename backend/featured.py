@@ -0,0 +1,186 @@
+"""Featured lists for the feed, computed from everyone's reviews.
+
+A review belongs to a city when it was written during one of its author's
+trips there. For each city, and each category within a city, places are
+ranked by a Bayesian average of their ratings. The average is pulled toward
+the mean of all reviews by PRIOR_WEIGHT imaginary ratings, so a place with
+one 10/10 review doesn't outrank one with forty 9s. Places need
+MIN_REVIEWS reviews to be ranked, and a list needs MIN_PLACES places.
+
+The aggregation runs as a scheduled job that stores its results as a
+snapshot. Requests only read the snapshot held in memory.
+"""
+import os
+import re
+import threading
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timezone
+
+PRIOR_WEIGHT = float(os.getenv("FEATURED_PRIOR_WEIGHT", "5"))
+MIN_REVIEWS = int(os.getenv("FEATURED_MIN_REVIEWS", "3"))
+MIN_PLACES = int(os.getenv("FEATURED_MIN_PLACES", "3"))
+MAX_PLACES = 50
+
+LIST_TITLES = {
+    None: ('Top Rated in {city}', 'The places travelers loved most'),
+    'Museum': ('Top Museums in {city}', 'Art, history and culture worth the ticket'),
+    'Park': ('Best Parks in {city}', 'Green spaces to slow down in'),
+    'Religious Site': ('Sacred Sites in {city}', 'Find peace in the bustling city'),
+    'Shopping': ('Where to Shop in {city}', 'Markets, malls and local favorites'),
+    'Restaurant': ('Favorite Restaurants in {city}', 'Where travelers actually ate well'),
+    'Landmark': ('Must-See Landmarks in {city}', 'The sights you came for'),
+    'Attraction': ('Top Attractions in {city}', 'Highly rated things to do'),
+}
+
+CITY_IMAGES = {
+    'New York': 'https://images.unsplash.com/photo-1496442226666-8d4d0e62e6e9?w=300&h=200&fit=crop',
+    'Paris': 'https://images.unsplash.com/photo-1511739001486-6bfe10ce785f?w=300&h=200&fit=crop',
+    'Tokyo': 'https://images.unsplash.com/photo-1540959733332-eab4deabeeaf?w=300&h=200&fit=crop',
+    'London': 'https://images.unsplash.com/photo-1513635269975-59663e0ac1ad?w=300&h=200&fit=crop',
+    'Los Angeles': 'https://images.unsplash.com/photo-1506905925346-21bda4d32df4?w=300&h=200&fit=crop',
+}
+DEFAULT_IMAGE = 'https://images.unsplash.com/photo-1488646953014-85cb44e25828?w=300&h=200&fit=crop'
+
+
+def _timestamp(value):
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def normalize_city(city):
+    return ' '.join(city.split()).title() if city else None
+
+
+def list_id(city, category=None):
+    return re.sub(r'[^a-z0-9]+', '-', f"{city} {category or 'top'}".lower()).strip('-')
+
+
+class TripIndex:
+    """Finds the city a user was in at a given time, from their trips"""
+
+    def __init__(self, trips):
+        now = datetime.now(timezone.utc)
+        by_user = defaultdict(list)
+        for trip in trips:
+            start = _timestamp(trip.get('start_date'))
+            city = normalize_city(trip.get('city'))
+            if start and city:
+                by_user[trip['user_id']].append((start, _timestamp(trip.get('end_date')) or now, city))
+        self._trips = {}
+        for user_id, user_trips in by_user.items():
+            user_trips.sort()
+            self._trips[user_id] = ([start for start, _, _ in user_trips], user_trips)
+
+    def city_at(self, user_id, when):
+        starts, trips = self._trips.get(user_id, ((), ()))
+        i = bisect_right(starts, when) - 1
+        if i >= 0 and when <= trips[i][1]:
+            return trips[i][2]
+        return None
+
+
+def compute_featured_lists(reviews, trips, computed_at=None):
+    """Featured lists (each with its ranked places) from raw review and trip rows"""
+    computed_at = computed_at or datetime.now(timezone.utc).isoformat()
+    if not reviews:
+        return []
+    prior_mean = sum(r['rating'] for r in reviews) / len(reviews)
+    trip_index = TripIndex(trips)
+
+    # (city, place_id) -> aggregate
+    places = {}
+    for review in reviews:
+        created = _timestamp(review.get('created_at'))
+        city = trip_index.city_at(review['user_id'], created) if created else None
+        if not city:
+            continue
+        place = places.setdefault((city, review['place_id']), {
+            'place_id': review['place_id'],
+            'place_name': review.get('place_name'),
+            'category': None,
+            'rating_sum': 0,
+            'review_count': 0,
+            'reviewers': set(),
+            'latitude': None,
+            'longitude': None,
+        })
+        place['rating_sum'] += review['rating']
+        place['review_count'] += 1
+        place['reviewers'].add(review['user_id'])
+        place['category'] = review.get('category') or place['category']
+        if review.get('latitude') is not None and review.get('longitude') is not None:
+            place['latitude'], place['longitude'] = float(review['latitude']), float(review['longitude'])
+
+    ranked = defaultdict(list)
+    for (city, _), place in places.items():
+        if place['review_count'] < MIN_REVIEWS:
+            continue
+        score = (PRIOR_WEIGHT * prior_mean + place['rating_sum']) / (PRIOR_WEIGHT + place['review_count'])
+        entry = {
+            'place_id': place['place_id'],
+            'place_name': place['place_name'],
+            'category': place['category'],
+            'score': round(score, 3),
+            'average_rating': round(place['rating_sum'] / place['review_count'], 2),
+            'review_count': place['review_count'],
+            'latitude': place['latitude'],
+            'longitude': place['longitude'],
+        }
+        reviewers = place['reviewers']
+        ranked[(city, None)].append((entry, reviewers))
+        if place['category']:
+            ranked[(city, place['category'])].append((entry, reviewers))
+
+    lists = []
+    for (city, category), entries in ranked.items():
+        if len(entries) < MIN_PLACES:
+            continue
+        entries.sort(key=lambda item: (-item[0]['score'], -item[0]['review_count'], item[0]['place_id']))
+        title, description = LIST_TITLES.get(category, LIST_TITLES[None])
+        reviewers = set().union(*(reviewers for _, reviewers in entries))
+        lists.append({
+            'id': list_id(city, category),
+            'city': city,
+            'category': category,
+            'title': title.format(city=city),
+            'description': f"{description} · rated by {len(reviewers)} travelers",
+            'image_url': CITY_IMAGES.get(city, DEFAULT_IMAGE),
+            'place_count': min(len(entries), MAX_PLACES),
+            'places': [entry for entry, _ in entries[:MAX_PLACES]],
+            'computed_at': computed_at,
+        })
+
+    # Lists backed by the most reviews first
+    lists.sort(key=lambda l: (-sum(p['review_count'] for p in l['places']), l['id']))
+    return lists
+
+
+def summary(featured_list):
+    """A list without its places, as shown in the feed"""
+    return {key: value for key, value in featured_list.items() if key != 'places'}
+
+
+class FeaturedLists:
+    """The current snapshot of featured lists, swapped in whole by the refresh job"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._summaries = []
+        self._by_id = {}
+        self.computed_at = None
+
+    def replace(self, lists):
+        summaries = [summary(featured_list) for featured_list in lists]
+        by_id = {featured_list['id']: featured_list for featured_list in lists}
+        computed_at = max((featured_list['computed_at'] for featured_list in lists), default=None)
+        with self._lock:
+            self._summaries, self._by_id, self.computed_at = summaries, by_id, computed_at
+
+    def summaries(self, limit=None):
+        return self._summaries[:limit]
+
+    def get(self, featured_list_id):
+        return self._by_id.get(featured_list_id)
@@ -0,0 +1,283 @@
+"""Offline city gazetteer for autocomplete and geocoding without Google.
+
+Cities live in a compact TSV (data/cities.tsv by default, or
+GAZETTEER_PATH), one per line, largest population first, so a city's line
+number doubles as its rank. The file is memory-mapped; only a sorted array
+of normalized names and aliases, plus a trigram index of names, is held in
+Python objects. Full records are parsed from the mapping on demand.
+
+The bundled file covers popular destinations. A fuller one can be built
+from the GeoNames dumps (https://download.geonames.org/export/dump/):
+
+    python -m gazetteer build cities500.txt --countries countryInfo.txt \\
+        --admin1 admin1CodesASCII.txt --min-population 15000 -o data/cities.tsv
+"""
+import argparse
+import array
+import heapq
+import logging
+import mmap
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+GAZETTEER_PATH = os.getenv(
+    "GAZETTEER_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'cities.tsv')
+)
+COLUMNS = (
+    'name', 'alternate_names', 'country_code', 'country_iso3', 'country',
+    'admin1_code', 'admin1', 'latitude', 'longitude', 'population',
+)
+# Countries whose cities are usually labelled with their state or province
+ADMIN1_IN_LABEL = {'US', 'CA', 'AU'}
+# Prefix matches looked at per query; very short prefixes only rank the first ones
+MAX_PREFIX_SCAN = 2000
+# Trigrams shared by more cities than this are too common to narrow a fuzzy search
+MAX_POSTINGS = 5000
+MIN_SIMILARITY = 0.3
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(text):
+    """Lowercase, strip accents and punctuation: 'Montréal' and 'montreal' are the same key"""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(re.sub(r'[\W_]+', ' ', text.lower()).split())
+
+
+def trigrams(key):
+    padded = f" {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class Gazetteer:
+    def __init__(self, path=GAZETTEER_PATH):
+        with open(path, 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._offsets = array.array('Q')
+        self._gram_counts = array.array('H')
+        keys = []
+        postings = defaultdict(list)
+
+        data = self._data
+        offset = 0
+        while offset < len(data):
+            end = data.find(b'\n', offset)
+            if end == -1:
+                end = len(data)
+            if end > offset and data[offset] != ord('#'):
+                city_id = len(self._offsets)
+                self._offsets.append(offset)
+                name, alternates = data[offset:end].decode().split('\t', 2)[:2]
+                names = {normalize(name)} | {normalize(alias) for alias in alternates.split(',')}
+                names.discard('')
+                keys.extend((key, city_id) for key in names)
+                grams = trigrams(normalize(name))
+                for gram in grams:
+                    postings[gram].append(city_id)
+                self._gram_counts.append(len(grams))
+            offset = end + 1
+
+        keys.sort()
+        self._keys = [key for key, _ in keys]
+        self._ids = array.array('L', (city_id for _, city_id in keys))
+        self._postings = {gram: array.array('L', ids) for gram, ids in postings.items()}
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def _fields(self, city_id):
+        start = self._offsets[city_id]
+        end = self._data.find(b'\n', start)
+        return dict(zip(COLUMNS, self._data[start:end if end != -1 else len(self._data)].decode().split('\t')))
+
+    def city(self, city_id):
+        """The full record for a city, parsed from the mapped file"""
+        fields = self._fields(city_id)
+        label = [fields['name']]
+        if fields['country_code'] in ADMIN1_IN_LABEL and fields['admin1'] and fields['admin1'] != fields['name']:
+            label.append(fields['admin1'])
+        if fields['country']:
+            label.append(fields['country'])
+        return {
+            'name': fields['name'],
+            'label': ', '.join(label),
+            'country_code': fields['country_code'],
+            'country': fields['country'],
+            'admin1': fields['admin1'],
+            'lat': float(fields['latitude']),
+            'lng': float(fields['longitude']),
+            'population': int(fields['population'] or 0),
+        }
+
+    def _exact(self, key):
+        lo, hi = bisect_left(self._keys, key), bisect_right(self._keys, key)
+        return sorted(set(self._ids[lo:hi]))
+
+    def _prefix(self, key, limit):
+        start = bisect_left(self._keys, key)
+        end = min(start + MAX_PREFIX_SCAN, len(self._keys))
+        matches = set()
+        for i in range(start, end):
+            if not self._keys[i].startswith(key):
+                break
+            matches.add(self._ids[i])
+        return heapq.nsmallest(limit, matches)
+
+    def _fuzzy(self, key, limit):
+        grams = trigrams(key)
+        shared = defaultdict(int)
+        for gram in grams:
+            ids = self._postings.get(gram)
+            if ids is None or len(ids) > MAX_POSTINGS:
+                continue
+            for city_id in ids:
+                shared[city_id] += 1
+        scored = []
+        for city_id, count in shared.items():
+            similarity = count / (len(grams) + self._gram_counts[city_id] - count)
+            if similarity >= MIN_SIMILARITY:
+                scored.append((-similarity, city_id))
+        return [city_id for _, city_id in heapq.nsmallest(limit, scored)]
+
+    def autocomplete(self, query, limit=10):
+        """Cities for a partial name: exact matches, then prefix matches, then near misses (typos)"""
+        key = normalize(query)
+        if not key:
+            return []
+        ids = self._exact(key)
+        ids += [city_id for city_id in self._prefix(key, limit) if city_id not in ids]
+        if len(ids) < limit and len(key) >= 3:
+            ids += [city_id for city_id in self._fuzzy(key, limit) if city_id not in ids]
+        ids = ids[:limit]
+        return [self.city(city_id) for city_id in ids]
+
+    def geocode(self, query):
+        """The most populous city named exactly `query`, or None.
+
+        Qualifiers after commas ('Portland, OR', 'Paris, France') must each
+        match the city's country, country code or state. Near misses aren't
+        guessed at here; they're left to Google.
+        """
+        name, *qualifiers = query.split(',')
+        qualifiers = [q for q in (normalize(q) for q in qualifiers) if q]
+        for city_id in self._exact(normalize(name)):
+            if qualifiers:
+                fields = self._fields(city_id)
+                known = {normalize(fields[column]) for column in COLUMNS[2:7]}
+                if not all(q in known for q in qualifiers):
+                    continue
+            return self.city(city_id)
+        return None
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_gazetteer():
+    """The gazetteer at GAZETTEER_PATH, loaded on first use.
+
+    None when the file is missing, unreadable or malformed, so callers fall
+    back to Google Geocoding. The failure is logged once and not retried.
+    """
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                try:
+                    _default = Gazetteer(GAZETTEER_PATH)
+                except (OSError, ValueError) as e:
+                    logger.warning("Could not load the gazetteer at %s, geocoding with Google instead: %s",
+                                   GAZETTEER_PATH, e)
+                    _default = False
+    return _default or None
+
+
+def _latin(text):
+    return all(ord(c) < 0x250 for c in unicodedata.normalize('NFKD', text))
+
+
+def build(cities_path, out_path, countries_path=None, admin1_path=None, min_population=15000, max_alternates=8):
+    """Write the compact file from a GeoNames cities dump (cities500.txt, cities15000.txt, ...)"""
+    countries = {}
+    if countries_path:
+        with open(countries_path, encoding='utf-8') as f:
+            for line in f:
+                if not line.startswith('#'):
+                    fields = line.rstrip('\n').split('\t')
+                    countries[fields[0]] = (fields[1], fields[4])
+    admin1 = {}
+    if admin1_path:
+        with open(admin1_path, encoding='utf-8') as f:
+            for line in f:
+                code, name = line.split('\t', 2)[:2]
+                admin1[code] = name
+
+    rows = []
+    with open(cities_path, encoding='utf-8') as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            population = int(fields[14] or 0)
+            if population < min_population:
+                continue
+            name, country_code, admin1_code = fields[1], fields[8], fields[10]
+            # GeoNames lists names in every language; keep a few short Latin-script ones
+            alternates, seen = [], {normalize(name)}
+            for alias in fields[3].split(','):
+                key = normalize(alias)
+                if key and key not in seen and len(alias) <= 40 and _latin(alias) and ',' not in alias:
+                    seen.add(key)
+                    alternates.append(alias)
+                    if len(alternates) == max_alternates:
+                        break
+            iso3, country = countries.get(country_code, ('', ''))
+            rows.append((population, (
+                name, ','.join(alternates), country_code, iso3, country, admin1_code,
+                admin1.get(f"{country_code}.{admin1_code}", ''), fields[4], fields[5], str(population),
+            )))
+
+    rows.sort(key=lambda row: -row[0])
+    with open(out_path, 'w', encoding='utf-8') as f:
+        f.write('# ' + '\t'.join(COLUMNS) + '\n')
+        for _, row in rows:
+            f.write('\t'.join(value.replace('\t', ' ') for value in row) + '\n')
+    return len(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m gazetteer', description=__doc__.split('\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    build_parser = commands.add_parser('build', help='build the compact file from a GeoNames dump')
+    build_parser.add_argument('cities')
+    build_parser.add_argument('--countries', help='GeoNames countryInfo.txt, for country names')
+    build_parser.add_argument('--admin1', help='GeoNames admin1CodesASCII.txt, for state names')
+    build_parser.add_argument('--min-population', type=int, default=15000)
+    build_parser.add_argument('-o', '--output', default=GAZETTEER_PATH)
+    lookup_parser = commands.add_parser('lookup', help='autocomplete a query against the current file')
+    lookup_parser.add_argument('query')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        count = build(args.cities, args.output, args.countries, args.admin1, args.min_population)
+        print(f"Wrote {count} cities to {args.output}")
+    else:
+        started = time.perf_counter()
+        gazetteer = Gazetteer(GAZETTEER_PATH)
+        loaded = time.perf_counter()
+        cities = gazetteer.autocomplete(args.query)
+        done = time.perf_counter()
+        for city in cities:
+            print(f"{city['label']:<50} {city['lat']:>9.4f} {city['lng']:>10.4f} {city['population']:>10}")
+        print(f"{len(gazetteer)} cities loaded in {(loaded - started) * 1000:.1f} ms, "
+              f"query took {(done - loaded) * 1000:.3f} ms", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
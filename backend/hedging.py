@@ -0,0 +1,162 @@
+"""Hedged requests: send a duplicate when a call is slower than usual.
+
+A call that hasn't finished after the `percentile` latency of recent calls
+to the same endpoint is probably stuck in the tail (a slow backend or a
+lost packet), so `Hedger.run` starts a second, identical call. The first
+to succeed wins and the other is cancelled. Hedges are paid for from a
+budget that grows by `max_ratio` per call, so at most that fraction of
+extra calls is sent. That keeps quota use flat, and keeps a slow upstream
+from being hit twice as hard just when it's struggling.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from metrics import Counter
+
+hedged_calls = Counter(
+    'wander_hedged_calls_total', 'Calls slow enough to hedge, by who won (primary, hedge) or why none was sent',
+    ('upstream', 'endpoint', 'outcome')
+)
+
+
+class LatencyTracker:
+    """Recent latencies per endpoint, and their percentiles"""
+
+    def __init__(self, window=200, min_samples=20):
+        self.window = window
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._samples = {}  # endpoint -> deque of seconds
+        self._sorted = {}  # endpoint -> sorted copy, rebuilt after new samples
+
+    def record(self, endpoint, seconds):
+        with self._lock:
+            self._samples.setdefault(endpoint, deque(maxlen=self.window)).append(seconds)
+            self._sorted.pop(endpoint, None)
+
+    def percentile(self, endpoint, pct):
+        """The `pct` percentile of recent latency, or None without enough samples yet"""
+        with self._lock:
+            samples = self._samples.get(endpoint)
+            if samples is None or len(samples) < self.min_samples:
+                return None
+            ordered = self._sorted.get(endpoint)
+            if ordered is None:
+                ordered = self._sorted[endpoint] = sorted(samples)
+        return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+class Hedger:
+    def __init__(self, upstream, percentile=95.0, max_ratio=0.05, min_delay=0.1, window=200, min_samples=20):
+        self.upstream = upstream
+        self.percentile = percentile
+        self.max_ratio = max_ratio
+        self.min_delay = min_delay
+        self.latency = LatencyTracker(window=window, min_samples=min_samples)
+        self._lock = threading.Lock()
+        # Hedges that may be sent right now; never more than one burst's worth
+        self._budget = 0.0
+        self._max_budget = max(1.0, max_ratio * window)
+
+    def delay(self, endpoint):
+        """Seconds to wait before hedging a call to `endpoint`, or None to never hedge it"""
+        if self.max_ratio <= 0:
+            return None
+        slow = self.latency.percentile(endpoint, self.percentile)
+        return None if slow is None else max(slow, self.min_delay)
+
+    def _earn(self):
+        with self._lock:
+            self._budget = min(self._budget + self.max_ratio, self._max_budget)
+
+    def _spend(self):
+        with self._lock:
+            if self._budget < 1:
+                return False
+            self._budget -= 1
+            return True
+
+    async def _timed(self, endpoint, call):
+        started = time.monotonic()
+        try:
+            return await call()
+        finally:
+            # A call cancelled because its hedge won still says how slow it was
+            self.latency.record(endpoint, time.monotonic() - started)
+
+    def _timed_sync(self, endpoint, call):
+        started = time.monotonic()
+        try:
+            return call()
+        finally:
+            self.latency.record(endpoint, time.monotonic() - started)
+
+    async def run(self, endpoint, call):
+        """Await `call()`, hedging it with a second `call()` if it runs past the endpoint's usual latency"""
+        self._earn()
+        delay = self.delay(endpoint)
+        primary = asyncio.ensure_future(self._timed(endpoint, call))
+        if delay is None:
+            return await primary
+
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return primary.result()
+            if not self._spend():
+                hedged_calls.inc(upstream=self.upstream, endpoint=endpoint, outcome='over_budget')
+                return await primary
+
+            hedge = asyncio.ensure_future(self._timed(endpoint, call))
+            pending = {primary, hedge}
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # The first success wins (the primary on a tie); a failure waits for the other call
+                winner = min(done, key=lambda task: (task.exception() is not None, task is not primary))
+                if winner.exception() is None or not pending:
+                    outcome = 'primary' if winner is primary else 'hedge'
+                    hedged_calls.inc(upstream=self.upstream, endpoint=endpoint, outcome=outcome)
+                    return winner.result()
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def run_sync(self, endpoint, call, executor):
+        """Like `run`, for a blocking `call()`, from a sync view.
+
+        Once the endpoint can be hedged, the calls run on `executor` while the
+        caller waits for the first good answer. A blocking call can't be
+        cancelled once it has started, so the losing call finishes in the
+        background and its answer is dropped.
+        """
+        self._earn()
+        delay = self.delay(endpoint)
+        if delay is None:
+            return self._timed_sync(endpoint, call)
+
+        primary = executor.submit(self._timed_sync, endpoint, call)
+        done, _ = wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        if not self._spend():
+            hedged_calls.inc(upstream=self.upstream, endpoint=endpoint, outcome='over_budget')
+            return primary.result()
+
+        hedge = executor.submit(self._timed_sync, endpoint, call)
+        pending = {primary, hedge}
+        try:
+            while True:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                winner = min(done, key=lambda future: (future.exception() is not None, future is not primary))
+                if winner.exception() is None or not pending:
+                    outcome = 'primary' if winner is primary else 'hedge'
+                    hedged_calls.inc(upstream=self.upstream, endpoint=endpoint, outcome=outcome)
+                    return winner.result()
+        finally:
+            # Only helps while the hedge is still queued for a thread
+            hedge.cancel()
@@ -0,0 +1,75 @@
+import gzip
+import hashlib
+import os
+from functools import wraps
+
+from flask import request, make_response, current_app
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# Bodies smaller than this aren't worth the CPU to compress
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def choose_encoding(body_size):
+    """Pick the best content coding the client accepts, or None for identity"""
+    if body_size < COMPRESSION_MIN_SIZE:
+        return None
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def conditional_get(f):
+    """Decorator that adds strong ETags, 304 responses and compression to a GET endpoint.
+
+    The ETag is a hash of the uncompressed body, suffixed with the content
+    coding so each representation gets its own strong validator. Clients that
+    send a matching If-None-Match get an empty 304 instead of the full body.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        response = make_response(current_app.ensure_sync(f)(*args, **kwargs))
+
+        if request.method != 'GET' or response.status_code != 200 or response.direct_passthrough:
+            return response
+
+        body = response.get_data()
+        encoding = choose_encoding(len(body))
+        etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        if encoding:
+            etag = f"{etag}-{encoding}"
+
+        response.set_etag(etag)
+        response.vary.add('Accept-Encoding')
+        if 'Cache-Control' not in response.headers:
+            # Always revalidate, and keep per-user responses out of shared caches
+            response.headers['Cache-Control'] = 'private, no-cache' if request.authorization else 'no-cache'
+
+        if request.if_none_match.contains(etag):
+            response.status_code = 304
+            response.set_data(b'')
+            response.headers.pop('Content-Length', None)
+            return response
+
+        if encoding:
+            response.set_data(compress(body, encoding))
+            response.headers['Content-Encoding'] = encoding
+
+        return response
+
+    return decorated_function
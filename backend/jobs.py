@@ -0,0 +1,119 @@
+import os
+import queue
+import threading
+import time
+
+from metrics import Counter
+
+background_jobs = Counter(
+    'wander_background_jobs_total', 'Background jobs by outcome (done, failed, rejected, duplicate)',
+    ('job', 'outcome')
+)
+
+
+class JobQueue:
+    """In-process background jobs: a fixed pool of worker threads fed by a bounded queue.
+
+    `submit` never blocks. When the queue is full the job is dropped (and
+    counted as rejected), so a burst of work can't pile up unbounded memory
+    or delay the request that submitted it. A job submitted with a `key`
+    is skipped while another job with the same key is queued or running.
+
+    `schedule` registers a job to run every `interval` seconds. A scheduler
+    thread submits it through the same queue, and skips a run while the
+    previous one is still going.
+
+    Jobs are best effort: they live in this process only and are lost on
+    restart. Threads start on first use (or `start()`) in each process, so a
+    forked worker runs its own.
+    """
+
+    def __init__(self, workers=2, max_queued=100, on_error=None):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.on_error = on_error
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._pending = set()
+        self._schedules = []
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # The parent's worker threads don't exist in the child, and its lock may be held
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._queue = queue.Queue(maxsize=self.max_queued)
+            self._pending = set()
+            for i in range(self.workers):
+                threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True).start()
+            if self._schedules:
+                threading.Thread(target=self._run_schedules, name='job-scheduler', daemon=True).start()
+            self._pid = pid
+
+    def schedule(self, name, fn, interval, *args, **kwargs):
+        """Run `fn(*args, **kwargs)` every `interval` seconds, starting as soon as the queue starts"""
+        self._schedules.append((name, fn, interval, args, kwargs))
+
+    def _run_schedules(self):
+        next_runs = [0.0] * len(self._schedules)
+        while True:
+            now = time.monotonic()
+            for i, (name, fn, interval, args, kwargs) in enumerate(self._schedules):
+                if now >= next_runs[i]:
+                    self.submit(name, fn, *args, key=name, **kwargs)
+                    next_runs[i] = now + interval
+            time.sleep(max(min(next_runs) - time.monotonic(), 0.1))
+
+    def submit(self, name, fn, *args, key=None, **kwargs):
+        """Queue `fn(*args, **kwargs)`; returns False if it was dropped"""
+        if self.workers <= 0:
+            return False
+        self.start()
+        with self._lock:
+            if key is not None and key in self._pending:
+                background_jobs.inc(job=name, outcome='duplicate')
+                return False
+            try:
+                self._queue.put_nowait((name, key, fn, args, kwargs))
+            except queue.Full:
+                background_jobs.inc(job=name, outcome='rejected')
+                return False
+            if key is not None:
+                self._pending.add(key)
+        return True
+
+    def _work(self):
+        jobs = self._queue
+        while True:
+            name, key, fn, args, kwargs = jobs.get()
+            try:
+                fn(*args, **kwargs)
+                background_jobs.inc(job=name, outcome='done')
+            except Exception as e:
+                background_jobs.inc(job=name, outcome='failed')
+                if self.on_error is not None:
+                    self.on_error(name, e)
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+                jobs.task_done()
+
+    def join(self):
+        """Wait until every queued job has finished"""
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def stats(self):
+        with self._lock:
+            queued = self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0
+            return {'workers': self.workers, 'queued': queued, 'max_queued': self.max_queued}
@@ -1,5 +1,96 @@
+"""Production entry point: serves app.py under gunicorn.
+
+Nearly every handler spends its time waiting on Supabase, Google or OpenAI,
+so the default is a few processes with many threads each (gthread) rather
+than one request per process. Everything is tunable through the environment:
+
+    PORT / BIND           where to listen (default 0.0.0.0:5001)
+    WEB_CONCURRENCY       worker processes (default: CPU count). Each worker enforces
+                          1/WEB_CONCURRENCY of the per-user rate limits
+    WORKER_CLASS          gthread (default) or gevent
+    WORKER_THREADS        threads per gthread worker (default 64)
+    WORKER_CONNECTIONS    max concurrent connections per worker (default 1000)
+    WORKER_TIMEOUT        seconds before a stuck worker is killed (default 60)
+    GRACEFUL_TIMEOUT      seconds to finish in-flight requests on shutdown (default 30)
+    KEEPALIVE             seconds to hold idle keep-alive connections (default 5)
+    MAX_REQUESTS          recycle a worker after this many requests, 0 = never
+    PRELOAD_APP           import the app once in the master before forking (default off).
+                          SDK clients are created lazily in each worker either way
+
+Run with `uv run --extra serve python main.py`. `python app.py` still starts the debug server.
+"""
+import multiprocessing
+import os
+import sys
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def env_bool(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def server_options():
+    worker_class = os.getenv("WORKER_CLASS", "gthread")
+    preload = env_bool("PRELOAD_APP", False)
+    if worker_class == 'gevent' and preload:
+        # gevent monkey-patches in the worker, too late for modules the master already imported
+        print("PRELOAD_APP is not supported with gevent workers, disabling it", file=sys.stderr)
+        preload = False
+
+    max_requests = env_int("MAX_REQUESTS", 0)
+    return {
+        'bind': os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '5001')}"),
+        'workers': env_int("WEB_CONCURRENCY", multiprocessing.cpu_count()),
+        'worker_class': worker_class,
+        'threads': env_int("WORKER_THREADS", 64),
+        'worker_connections': env_int("WORKER_CONNECTIONS", 1000),
+        'timeout': env_int("WORKER_TIMEOUT", 60),
+        'graceful_timeout': env_int("GRACEFUL_TIMEOUT", 30),
+        'keepalive': env_int("KEEPALIVE", 5),
+        'max_requests': max_requests,
+        'max_requests_jitter': max_requests // 10,
+        'preload_app': preload,
+        'accesslog': os.getenv("ACCESS_LOG", '-') or None,
+        'errorlog': '-',
+    }
+
+
 def main():
-    print("Hello from backend!")
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("gunicorn is not installed (uv sync --extra serve), falling back to the threaded dev server", file=sys.stderr)
+        from app import app
+        host, _, port = server_options()['bind'].rpartition(':')
+        app.run(host=host, port=int(port), threaded=True, debug=False)
+        return
+
+    class WanderApplication(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from clients import timed
+            with timed('app', 'import'):
+                from app import app
+            return app
+
+    options = server_options()
+    # The app splits its per-process rate limits between this many workers
+    os.environ['WEB_CONCURRENCY'] = str(options['workers'])
+    WanderApplication(options).run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,212 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, request, has_request_context
+
+# Latency buckets in seconds, from fast cache hits up to slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REGISTRY = []
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for name, value in pairs]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class Counter:
+    """Monotonic counter with labels, rendered in Prometheus text format"""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with labels"""
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = _format_labels(self.labelnames, key, ('le', repr(bound)))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.labelnames, key, ('le', '+Inf'))
+                lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {series[-2]}")
+                lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+request_duration = Histogram(
+    'wander_request_duration_seconds', 'Time spent handling a request',
+    ('endpoint', 'method', 'status')
+)
+stage_duration = Histogram(
+    'wander_stage_duration_seconds', 'Time spent in each stage of a request',
+    ('endpoint', 'stage')
+)
+upstream_calls = Counter(
+    'wander_upstream_calls_total', 'Outbound calls actually sent to an upstream service',
+    ('upstream',)
+)
+circuit_transitions = Counter(
+    'wander_circuit_transitions_total', 'Circuit breaker state changes',
+    ('circuit', 'state')
+)
+city_geocodes = Counter(
+    'wander_city_geocodes_total', 'City lookups by where the coordinates came from (gazetteer, google)',
+    ('source',)
+)
+recommendation_rankings = Counter(
+    'wander_recommendation_rankings_total', 'How recommendations were ranked, and why the AI was skipped',
+    ('method', 'reason')
+)
+
+
+def current_endpoint():
+    if has_request_context():
+        return request.endpoint or 'unknown'
+    return 'background'
+
+
+@contextmanager
+def stage(name):
+    """Time a block as a named stage of the current request.
+
+    Durations feed the per-endpoint stage histogram and, inside a request,
+    the Server-Timing header.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_duration.observe(elapsed, endpoint=current_endpoint(), stage=name)
+        if has_request_context():
+            timings = g.setdefault('stage_timings', {})
+            total, count = timings.get(name, (0.0, 0))
+            timings[name] = (total + elapsed, count + 1)
+
+
+class _InstrumentedQuery:
+    """Wraps a postgrest query builder so `.execute()` is timed as a stage"""
+
+    def __init__(self, builder, table_name):
+        self._builder = builder
+        self._table_name = table_name
+
+    def _wrap(self, value):
+        if hasattr(value, 'execute'):
+            return _InstrumentedQuery(value, self._table_name)
+        return value
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if name == 'execute':
+            def execute(*args, **kwargs):
+                upstream_calls.inc(upstream='supabase')
+                with stage('supabase'):
+                    return attr(*args, **kwargs)
+            return execute
+        if callable(attr):
+            return lambda *args, **kwargs: self._wrap(attr(*args, **kwargs))
+        return self._wrap(attr)
+
+
+class InstrumentedSupabase:
+    """Supabase client wrapper that times every table query"""
+
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, table_name):
+        return _InstrumentedQuery(self._client.table(table_name), table_name)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def render_prometheus():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def init_metrics(app):
+    """Record per-endpoint latency and emit a Server-Timing header on every response"""
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.get('request_start')
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        request_duration.observe(
+            elapsed,
+            endpoint=request.endpoint or 'unknown',
+            method=request.method,
+            status=str(response.status_code)
+        )
+
+        entries = []
+        for name, (total, count) in g.get('stage_timings', {}).items():
+            entries.append(f'{name};desc="{count} calls";dur={total * 1000:.1f}')
+        entries.append(f'total;dur={elapsed * 1000:.1f}')
+        response.headers['Server-Timing'] = ', '.join(entries)
+        return response
@@ -0,0 +1,185 @@
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows, where the dev server is a single process with nothing to coordinate
+    fcntl = None
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional, without it we cache Google's own resizes
+    Image = None
+
+RESIZE_AVAILABLE = Image is not None
+
+# Widths we're willing to serve, so the number of variants per photo stays bounded
+PHOTO_WIDTHS = [100, 200, 400, 800, 1600]
+ORIGINAL_WIDTH = PHOTO_WIDTHS[-1]
+
+CONTENT_TYPES = {'jpg': 'image/jpeg', 'webp': 'image/webp'}
+
+# Seconds between rescans of the directory for files written (or evicted) by
+# other workers
+SYNC_INTERVAL = 60
+LOCK_FILE = '.lock'
+
+
+def snap_width(width):
+    """Round a requested width up to the nearest width we serve"""
+    for allowed in PHOTO_WIDTHS:
+        if width <= allowed:
+            return allowed
+    return ORIGINAL_WIDTH
+
+
+def resize_image(data, width, fmt):
+    """Downscale an image to `width` pixels wide and re-encode it as JPEG or WebP"""
+    image = Image.open(io.BytesIO(data))
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    if image.width > width:
+        height = round(image.height * width / image.width)
+        image = image.resize((width, height), Image.LANCZOS)
+
+    out = io.BytesIO()
+    if fmt == 'webp':
+        image.save(out, 'WEBP', quality=80, method=4)
+    else:
+        image.save(out, 'JPEG', quality=82, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+class PhotoCache:
+    """Content-addressed on-disk cache with LRU eviction by total size.
+
+    Files are named by a hash of their cache key and fanned out into
+    two-character subdirectories. Recency is tracked in memory and mirrored to
+    file mtimes so it survives restarts.
+
+    Worker processes share the directory. Each keeps its own index, adopts
+    files other workers wrote the first time it's asked for them, and every
+    `sync_interval` seconds rebuilds the index from the directory and evicts
+    by mtime, one worker at a time under a file lock. So a photo is fetched
+    once for all workers, and the directory stays within `max_bytes` plus
+    what the other workers wrote since the last rescan.
+
+    Nothing is scanned when the cache is created, so booting a worker doesn't
+    walk the directory. Run `sync()` in the background soon after; otherwise
+    the first `put` does it.
+    """
+
+    def __init__(self, directory, max_bytes, sync_interval=SYNC_INTERVAL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # path -> size, least recently used first
+        self._total_bytes = 0
+        self._synced_at = None
+        os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def _directory_lock(self):
+        """Exclusive across processes (and threads, since each call opens its own file)"""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, LOCK_FILE), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def sync(self):
+        """Rebuild the index from the files on disk, then evict down to max_bytes"""
+        with self._directory_lock():
+            files = []
+            for root, _, names in os.walk(self.directory):
+                for name in names:
+                    if name.endswith('.tmp') or name == LOCK_FILE:
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue  # Evicted by another worker mid-scan
+                    files.append((stat.st_mtime, path, stat.st_size))
+
+            with self._lock:
+                self._entries = OrderedDict((path, size) for _, path, size in sorted(files))
+                self._total_bytes = sum(size for _, _, size in files)
+                self._evict()
+                self._synced_at = time.monotonic()
+
+    def path_for(self, key, ext):
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.{ext}")
+
+    def get(self, key, ext):
+        """Return the cached file path for a key, or None on a miss"""
+        path = self.path_for(key, ext)
+        with self._lock:
+            indexed = path in self._entries
+            if indexed:
+                self._entries.move_to_end(path)
+
+        if not indexed:
+            # Written by another worker since our last sync?
+            try:
+                size = os.stat(path).st_size
+            except FileNotFoundError:
+                return None
+            with self._lock:
+                if path not in self._entries:
+                    self._entries[path] = size
+                    self._total_bytes += size
+                self._entries.move_to_end(path)
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._total_bytes -= self._entries.pop(path, 0)
+            return None
+        return path
+
+    def put(self, key, ext, data):
+        """Store bytes under a key and return the file path"""
+        path = self.path_for(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temp file first so readers never see a partial image
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._total_bytes -= self._entries.pop(path, 0)
+            self._entries[path] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+            sync_due = self._synced_at is None or time.monotonic() - self._synced_at > self.sync_interval
+        if sync_due:
+            self.sync()
+        return path
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            path, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {'files': len(self._entries), 'bytes': self._total_bytes, 'max_bytes': self.max_bytes}
@@ -0,0 +1,61 @@
+import threading
+
+from ttl_cache import TTLCache
+
+
+class PlaceCatalog:
+    """Write-behind buffer for the `places` catalog table.
+
+    Requests `add` rows for the places they see in Google responses. Rows
+    are merged by place_id in memory and written by `flush`, in batches of
+    up to `batch_size`, off the request path. At most `max_pending` places
+    are buffered; past that, new places are dropped until the next flush,
+    since the catalog is only an optimization.
+
+    A place written in the last `rewrite_after` seconds isn't queued again
+    with the same set of columns, so popular places (served from the Google
+    cache over and over) don't turn into a stream of identical upserts.
+    """
+
+    def __init__(self, write, batch_size=100, max_pending=2000, rewrite_after=3600.0):
+        self.write = write
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._recent = TTLCache(maxsize=20000, ttl=rewrite_after)
+
+    def add(self, rows):
+        """Buffer rows; returns True once a full batch is waiting to be flushed"""
+        with self._lock:
+            for row in rows:
+                place_id = row.get('place_id')
+                if not place_id or self._recent.get((place_id, frozenset(row))):
+                    continue
+                if place_id in self._pending:
+                    self._pending[place_id].update(row)
+                elif len(self._pending) < self.max_pending:
+                    self._pending[place_id] = dict(row)
+            return len(self._pending) >= self.batch_size
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of rows written"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        # A bulk upsert sets every column named in the batch, so rows that
+        # carry different columns (e.g. with and without details) go separately
+        groups = {}
+        for row in pending.values():
+            groups.setdefault(frozenset(row), []).append(row)
+        for columns, rows in groups.items():
+            for start in range(0, len(rows), self.batch_size):
+                batch = rows[start:start + self.batch_size]
+                self.write(batch)
+                for row in batch:
+                    self._recent.put((row['place_id'], columns), True)
+        return len(pending)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
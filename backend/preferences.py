@@ -0,0 +1,121 @@
+"""Per-user preference profile, updated one rating at a time.
+
+A profile is a single `user_preferences` row holding exponentially decayed
+running sums, so it reflects a user's whole rating history without
+re-reading it. A rating's weight halves every PREFERENCE_HALF_LIFE_DAYS:
+
+- `weight`, `rating_sum` and `rating_sq_sum` give the mean and variance of
+  the user's ratings
+- `category_affinity` maps a category to the decayed sum of the user's
+  ratings in it, centered so 1-10 becomes -1..+1
+- `top_places` / `bottom_places` are the user's best and worst rated places
+"""
+import os
+from datetime import datetime, timezone
+
+HALF_LIFE_DAYS = float(os.getenv("PREFERENCE_HALF_LIFE_DAYS", "180"))
+PLACES_KEPT = 5
+# Affinities that have decayed below this are dropped to keep the row small
+MIN_AFFINITY = 0.01
+
+
+def empty_profile(user_id):
+    return {
+        'user_id': user_id,
+        'weight': 0.0,
+        'rating_sum': 0.0,
+        'rating_sq_sum': 0.0,
+        'review_count': 0,
+        'category_affinity': {},
+        'top_places': [],
+        'bottom_places': [],
+        'updated_at': None,
+    }
+
+
+def _parse(value):
+    if isinstance(value, datetime):
+        return value
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _centered(rating):
+    return (rating - 5.5) / 4.5
+
+
+def _decay(profile, at):
+    if not profile['updated_at']:
+        return
+    days = (at - _parse(profile['updated_at'])).total_seconds() / 86400
+    if days <= 0:
+        return
+    factor = 0.5 ** (days / HALF_LIFE_DAYS)
+    profile['weight'] *= factor
+    profile['rating_sum'] *= factor
+    profile['rating_sq_sum'] *= factor
+    profile['category_affinity'] = {
+        category: round(score * factor, 4)
+        for category, score in profile['category_affinity'].items()
+        if abs(score * factor) >= MIN_AFFINITY
+    }
+
+
+def apply_rating(profile, place_id, place_name, rating, category=None, previous_rating=None,
+                 previous_category=None, at=None):
+    """Fold one rating into `profile` (in place) and return it.
+
+    When the user is changing an earlier rating, pass it as
+    `previous_rating`, with the category it was counted under as
+    `previous_category`, so it is replaced rather than counted twice. The
+    old value is subtracted at full weight, which slightly over-corrects for
+    ratings that have already decayed.
+    """
+    at = _parse(at) if at else datetime.now(timezone.utc)
+    _decay(profile, at)
+
+    if previous_rating is None:
+        profile['weight'] += 1
+        profile['review_count'] += 1
+        profile['rating_sum'] += rating
+        profile['rating_sq_sum'] += rating * rating
+    else:
+        profile['rating_sum'] += rating - previous_rating
+        profile['rating_sq_sum'] += rating * rating - previous_rating * previous_rating
+
+    affinity = profile['category_affinity']
+    if previous_rating is not None and previous_category:
+        affinity[previous_category] = round(affinity.get(previous_category, 0.0) - _centered(previous_rating), 4)
+    if category:
+        affinity[category] = round(affinity.get(category, 0.0) + _centered(rating), 4)
+
+    place = {'place_id': place_id, 'place_name': place_name, 'rating': rating, 'rated_at': at.isoformat()}
+    for key, best_first in (('top_places', True), ('bottom_places', False)):
+        places = [p for p in profile[key] if p['place_id'] != place_id] + [place]
+        # Most recent first among equal ratings
+        places.sort(key=lambda p: p['rated_at'], reverse=True)
+        places.sort(key=lambda p: p['rating'], reverse=best_first)
+        profile[key] = places[:PLACES_KEPT]
+
+    profile['updated_at'] = at.isoformat()
+    return profile
+
+
+def profile_from_reviews(user_id, reviews):
+    """Build a profile from a user's existing reviews, oldest first"""
+    profile = empty_profile(user_id)
+    for review in sorted(reviews, key=lambda r: r['created_at'] or ''):
+        apply_rating(
+            profile, review['place_id'], review['place_name'], review['rating'], review.get('category'),
+            at=review['created_at'] or None,
+        )
+    return profile
+
+
+def rating_stats(profile):
+    """Decayed mean and variance of the user's ratings, or (None, None) without any"""
+    if profile['weight'] <= 0:
+        return None, None
+    mean = profile['rating_sum'] / profile['weight']
+    variance = max(profile['rating_sq_sum'] / profile['weight'] - mean * mean, 0.0)
+    return mean, variance
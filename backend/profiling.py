@@ -0,0 +1,234 @@
+import asyncio
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, thread as futures_thread
+from contextvars import ContextVar
+from functools import wraps
+
+PROFILE_FILE = re.compile(r'^[\w.-]+\.folded$')
+
+# The sampler of the request being profiled in this context, if any
+_active_sampler = ContextVar('profile_sampler', default=None)
+
+# A pool thread waiting for work is sitting here, and isn't worth a sample
+IDLE_WORKER = futures_thread._worker.__code__
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ',')
+
+
+def collapse(frame):
+    """A stack as 'outermost;...;innermost', the collapsed format flame graph tools read"""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """Samples the stacks of chosen threads every `interval` seconds, from a background thread.
+
+    Only the threads working on the profiled request are sampled, so other
+    requests served by the same process at the same time don't show up.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self._thread_ids = set()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def follow(self, thread_id):
+        self._thread_ids.add(thread_id)
+
+    def unfollow(self, thread_id):
+        self._thread_ids.discard(thread_id)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in list(self._thread_ids):
+                frame = frames.get(thread_id)
+                if frame is not None and frame.f_code is not IDLE_WORKER:
+                    self.stacks[collapse(frame)] += 1
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def following(async_to_sync):
+    """Wrap Flask's `async_to_sync` so async views' threads are sampled with the request's.
+
+    Flask runs each async view on a fresh event loop in a thread of its own.
+    The view's context (and so the active sampler) is copied to that thread,
+    which then follows itself, and gives the loop a default executor whose
+    threads follow themselves too, so `asyncio.to_thread` work is included.
+    """
+    def convert(func):
+        @wraps(func)
+        async def sampled(*args, **kwargs):
+            sampler = _active_sampler.get()
+            if sampler is None:
+                return await func(*args, **kwargs)
+
+            thread_ids = [threading.get_ident()]
+            sampler.follow(thread_ids[0])
+
+            def follow_worker():
+                thread_ids.append(threading.get_ident())
+                sampler.follow(thread_ids[-1])
+
+            asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(initializer=follow_worker))
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                for thread_id in thread_ids:
+                    sampler.unfollow(thread_id)
+
+        return async_to_sync(sampled)
+
+    return convert
+
+
+class RequestProfiler:
+    """WSGI middleware that samples the stacks of selected requests.
+
+    A request is profiled when it carries `X-Profile: 1` plus the admin token
+    in `X-Admin-Token`, or when it is picked by the random sample rate. Its
+    thread's stack (and those of the threads running its async view, see
+    `following`) is sampled every `interval` seconds, and the samples are
+    written as collapsed stacks named after the request id, ready for
+    flamegraph.pl or speedscope. Only the newest `max_files` are kept.
+
+    Threads are sampled by OS thread id, so this needs thread-based workers
+    (gthread, or the dev server); under gevent every request shares a thread.
+    """
+
+    def __init__(self, wsgi_app, directory, admin_token=None, sample_rate=0.0, max_files=100, interval=0.005):
+        self.wsgi_app = wsgi_app
+        self.directory = directory
+        self.admin_token = admin_token
+        self.sample_rate = sample_rate
+        self.max_files = max_files
+        self.interval = interval
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def is_admin(self, token):
+        return bool(self.admin_token) and bool(token) and hmac.compare_digest(token, self.admin_token)
+
+    def should_profile(self, environ):
+        if environ.get('HTTP_X_PROFILE') == '1' and self.is_admin(environ.get('HTTP_X_ADMIN_TOKEN')):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, environ, start_response):
+        if not self.should_profile(environ):
+            return self.wsgi_app(environ, start_response)
+
+        request_id = environ.get('HTTP_X_REQUEST_ID') or uuid.uuid4().hex
+        request_id = re.sub(r'[^\w-]', '', request_id)[:64] or uuid.uuid4().hex
+        profile_id = f"{int(time.time() * 1000)}-{request_id}"
+
+        def start_profiled_response(status, headers, exc_info=None):
+            headers.append(('X-Profile-Id', profile_id))
+            return start_response(status, headers, exc_info)
+
+        sampler = StackSampler(self.interval)
+        sampler.follow(threading.get_ident())
+        token = _active_sampler.set(sampler)
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            return self.wsgi_app(environ, start_profiled_response)
+        finally:
+            sampler.stop()
+            _active_sampler.reset(token)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._save(sampler, profile_id, environ, elapsed_ms)
+
+    def _save(self, sampler, profile_id, environ, elapsed_ms):
+        method = environ.get('REQUEST_METHOD', 'GET')
+        segments = environ.get('PATH_INFO', '/').strip('/').split('/')
+        path = '.'.join(re.sub(r'[^\w-]', '_', segment) for segment in segments if segment) or 'root'
+        filename = f"{profile_id}.{method}.{path}.{elapsed_ms:.0f}ms.folded"
+        sampler.write(os.path.join(self.directory, filename))
+        self._prune()
+
+    def _prune(self):
+        with self._lock:
+            files = sorted(name for name in os.listdir(self.directory) if PROFILE_FILE.match(name))
+            for name in files[:-self.max_files] if self.max_files else []:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def list_profiles(self):
+        """Recent profiles, newest first"""
+        profiles = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if not PROFILE_FILE.match(name):
+                continue
+            profile_id, method, rest = name.split('.', 2)
+            path, elapsed, _ = rest.rsplit('.', 2)
+            profiles.append({
+                'id': profile_id,
+                'method': method,
+                'path': '/' + path.replace('.', '/') if path != 'root' else '/',
+                'duration_ms': int(elapsed.removesuffix('ms')),
+                'created_at': int(profile_id.split('-', 1)[0]) / 1000,
+                'size': os.path.getsize(os.path.join(self.directory, name)),
+            })
+        return profiles
+
+    def find(self, profile_id):
+        """Path to the collapsed stacks of a profile id, or None"""
+        for name in os.listdir(self.directory):
+            if PROFILE_FILE.match(name) and name.split('.', 1)[0] == profile_id:
+                return os.path.join(self.directory, name)
+        return None
+
+    @staticmethod
+    def summary(path, sort='cumulative', limit=40):
+        """Human-readable top functions from a saved profile, by samples on the stack or on top of it"""
+        total = 0
+        cumulative = Counter()
+        own = Counter()
+        with open(path) as f:
+            for line in f:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                count = int(count)
+                names = stack.split(';')
+                total += count
+                own[names[-1]] += count
+                for name in set(names):
+                    cumulative[name] += count
+
+        ranked = (cumulative if sort == 'cumulative' else own).most_common(limit)
+        lines = [f"{total} samples", f"{'cumulative':>12} {'self':>12}  function"]
+        for name, _ in ranked:
+            lines.append(
+                f"{cumulative[name]:>6} {cumulative[name] / total:>5.0%} {own[name]:>6} {own[name] / total:>5.0%}  {name}"
+            )
+        return '\n'.join(lines) + '\n'
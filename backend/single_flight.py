@@ -0,0 +1,87 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class LeaderCancelled(Exception):
+    """The call a waiter was sharing was cancelled before it finished"""
+
+
+class SingleFlight:
+    """Coalesce concurrent identical calls so only one of them hits the upstream.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running wait for and share its result or exception.
+    Waiters give up after `timeout` seconds and make their own call, so a
+    hung leader can't stall everyone behind it.
+
+    Results are shared through thread-safe futures, so sync callers (`do`)
+    and async callers (`do_async`) coalesce with each other, across threads
+    and event loops.
+    """
+
+    def __init__(self, timeout=10.0):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def _join(self, key):
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn, *args, **kwargs):
+        future, is_leader = self._join(key)
+
+        if not is_leader:
+            try:
+                return future.result(timeout=self.timeout)
+            except (TimeoutError, LeaderCancelled):
+                # Leader is taking too long, don't keep waiting on it
+                return fn(*args, **kwargs)
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    async def do_async(self, key, fn, *args, **kwargs):
+        """Like `do`, for a coroutine function"""
+        future, is_leader = self._join(key)
+
+        if not is_leader:
+            try:
+                return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.timeout)
+            except (asyncio.TimeoutError, LeaderCancelled):
+                return await fn(*args, **kwargs)
+
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            # The leader ran out of time, which says nothing about the waiters' budgets
+            self._finish(key, future, error=LeaderCancelled(key))
+            raise
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    def in_flight(self):
+        """Number of distinct keys currently being fetched"""
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,33 @@
+import unittest
+
+from activity import ActivityHub
+
+
+class StreamLimitTest(unittest.TestCase):
+    def test_new_stream_replaces_the_users_oldest(self):
+        hub = ActivityHub(max_subscribers=10, max_per_user=2)
+        first = hub.subscribe('alice', ['bob'])
+        second = hub.subscribe('alice', ['bob'])
+        third = hub.subscribe('alice', ['bob'])
+        self.assertTrue(first.closed)
+        self.assertFalse(second.closed or third.closed)
+        self.assertEqual(hub.stats()['subscribers'], 2)
+
+        # The replaced stream no longer hears about bob's activity
+        hub.publish('bob', {'kind': 'review'})
+        self.assertEqual(len(third.wait(0)), 1)
+        first.set_friends(['bob'])
+        self.assertNotIn(first, hub._followers['bob'])
+        hub.unsubscribe(first)
+        self.assertEqual(hub.stats()['subscribers'], 2)
+
+    def test_one_user_cannot_fill_the_process(self):
+        hub = ActivityHub(max_subscribers=3, max_per_user=2)
+        for _ in range(5):
+            hub.subscribe('alice', [])
+        self.assertIsNotNone(hub.subscribe('bob', []))
+        self.assertIsNone(hub.subscribe('carol', []))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import threading
+import unittest
+from unittest import mock
+
+from admission import ConcurrencyLimiter, Overloaded, RateLimiter, parse_rate
+
+
+class ParseRateTest(unittest.TestCase):
+    def test_requests_per_period(self):
+        self.assertEqual(parse_rate('10/60'), (10, 60.0))
+        self.assertEqual(parse_rate('5'), (5, 1.0))
+
+    def test_off(self):
+        for value in ('', '0', 'off', 'None'):
+            self.assertIsNone(parse_rate(value))
+
+
+class RateLimiterTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch('admission.time.monotonic', return_value=1000.0)
+        self.clock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_then_refill(self):
+        limiter = RateLimiter('test', 3, 60)
+        for _ in range(3):
+            self.assertEqual(limiter.acquire('alice'), 0)
+        self.assertAlmostEqual(limiter.acquire('alice'), 20.0)
+
+        self.clock.return_value += 20
+        self.assertEqual(limiter.acquire('alice'), 0)
+
+    def test_keys_have_their_own_buckets(self):
+        limiter = RateLimiter('test', 1, 60)
+        self.assertEqual(limiter.acquire('alice'), 0)
+        self.assertGreater(limiter.acquire('alice'), 0)
+        self.assertEqual(limiter.acquire('bob'), 0)
+
+    def test_each_process_enforces_its_share(self):
+        limiter = RateLimiter('test', 12, 60, processes=4)
+        admitted = sum(limiter.acquire('alice') == 0 for _ in range(12))
+        self.assertEqual(admitted, 3)
+        # Refills at a quarter of the rate too
+        self.clock.return_value += 20
+        self.assertEqual(limiter.acquire('alice'), 0)
+        self.assertGreater(limiter.acquire('alice'), 0)
+
+    def test_small_share_still_admits_one_request(self):
+        limiter = RateLimiter('test', 2, 60, processes=8)
+        self.assertEqual(limiter.acquire('alice'), 0)
+        self.assertGreater(limiter.acquire('alice'), 0)
+
+    def test_least_recently_seen_keys_are_dropped(self):
+        limiter = RateLimiter('test', 1, 60, max_keys=2)
+        for key in ('alice', 'bob', 'carol'):
+            limiter.acquire(key)
+        # alice's empty bucket was dropped, so she starts over
+        self.assertEqual(limiter.acquire('alice'), 0)
+        self.assertGreater(limiter.acquire('carol'), 0)
+
+
+class ConcurrencyLimiterTest(unittest.TestCase):
+    def test_rejects_when_the_queue_is_full(self):
+        limiter = ConcurrencyLimiter('test', 1, max_waiting=0)
+        with limiter.slot('alice'):
+            with self.assertRaises(Overloaded):
+                with limiter.slot('bob'):
+                    pass
+        self.assertEqual(limiter.stats(), {'limit': 1, 'active': 0, 'waiting': 0})
+
+    def test_waiter_times_out(self):
+        limiter = ConcurrencyLimiter('test', 1, timeout=0.05)
+        with limiter.slot('alice'):
+            with self.assertRaises(Overloaded):
+                with limiter.slot('bob'):
+                    pass
+            self.assertEqual(limiter.stats()['waiting'], 0)
+        self.assertEqual(limiter.stats()['active'], 0)
+
+    def test_per_key_queue_limit(self):
+        limiter = ConcurrencyLimiter('test', 1, max_waiting=10, max_waiting_per_key=1)
+        with limiter.slot('alice'):
+            limiter._enter('alice')
+            with self.assertRaises(Overloaded):
+                limiter._enter('alice')
+            # Another user can still queue
+            self.assertIsNotNone(limiter._enter('bob'))
+
+    def test_slots_are_handed_out_in_turns_between_keys(self):
+        limiter = ConcurrencyLimiter('test', 1, max_waiting=10, timeout=5)
+        order = []
+        self.assertIsNone(limiter._enter('holder'))
+
+        def wait_turn(key, future):
+            future.result(5)
+            order.append(key)
+            limiter._exit()
+
+        threads = [
+            threading.Thread(target=wait_turn, args=(key, limiter._enter(key)))
+            for key in ('alice', 'alice', 'alice', 'bob')
+        ]
+        # Handed over one at a time from here on, so the order is the queue's
+        for thread in threads:
+            thread.start()
+        limiter._exit()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(order, ['alice', 'bob', 'alice', 'alice'])
+        self.assertEqual(limiter.stats(), {'limit': 1, 'active': 0, 'waiting': 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
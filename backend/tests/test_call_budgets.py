@@ -0,0 +1,37 @@
+import os
+import unittest
+from unittest import mock
+
+import requests
+
+from bench.budgets import BUDGET_ARGS, BUDGET_ENV, check_scenario, pick_users
+from bench.recorder import UpstreamRecorder
+from bench.run import SCENARIOS, Harness, parse_args
+
+
+class CallBudgetTest(unittest.TestCase):
+    """Every endpoint stays within its upstream call budget (see bench/budgets.py)"""
+
+    @classmethod
+    def setUpClass(cls):
+        environ = mock.patch.dict(os.environ, {**BUDGET_ENV, 'WEB_CONCURRENCY': '1', 'WORKER_THREADS': '8'})
+        environ.start()
+        cls.addClassCleanup(environ.stop)
+        # The app runs in its own process, configured for the fakes, whatever
+        # other tests have already imported into this one
+        cls.harness = Harness(parse_args([*BUDGET_ARGS, '--server', 'production']))
+        cls.addClassCleanup(cls.harness.stop)
+        cls.harness.start()
+        cls.recorder = UpstreamRecorder(cls.harness.google, cls.harness.openai, cls.harness.supabase)
+        cls.users = pick_users(cls.harness.supabase)
+
+    def test_every_endpoint_within_budget(self):
+        session = requests.Session()
+        for scenario in SCENARIOS:
+            with self.subTest(scenario=scenario):
+                failures, _ = check_scenario(self.harness, self.recorder, self.users, session, scenario)
+                self.assertEqual(failures, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
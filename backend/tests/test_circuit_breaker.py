@@ -0,0 +1,57 @@
+import unittest
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+def half_open_breaker(probes=2):
+    """A breaker that has opened, and (with open_for=0) is half-open straight away"""
+    breaker = CircuitBreaker('test', min_calls=1, open_for=0.0, probes=probes)
+    breaker.record(False, 0.0)
+    assert breaker.state == HALF_OPEN
+    return breaker
+
+
+class HalfOpenProbeTest(unittest.TestCase):
+    def test_probes_that_pass_close_the_circuit(self):
+        breaker = half_open_breaker()
+        for _ in range(2):
+            self.assertTrue(breaker.allow())
+            breaker.record(True, 0.1)
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_failed_probe_reopens_the_circuit(self):
+        breaker = CircuitBreaker('test', min_calls=1, open_for=60.0, probes=2)
+        breaker.record(False, 0.0)
+        breaker._opened_at -= 60.0
+        self.assertTrue(breaker.allow())
+        breaker.record(False, 0.1)
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_no_more_probes_than_configured(self):
+        breaker = half_open_breaker()
+        self.assertTrue(breaker.allow())
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+    def test_released_probes_can_be_retried(self):
+        # Probes turned away before reaching the upstream (e.g. Overloaded)
+        # must not use up the half-open state's probes for good
+        breaker = half_open_breaker()
+        for _ in range(2):
+            self.assertTrue(breaker.allow())
+            breaker.release()
+        for _ in range(2):
+            self.assertTrue(breaker.allow())
+            breaker.record(True, 0.1)
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_release_when_closed_is_a_no_op(self):
+        breaker = CircuitBreaker('test')
+        self.assertTrue(breaker.allow())
+        breaker.release()
+        self.assertEqual(breaker.stats()['recent_calls'], 0)
+        self.assertEqual(breaker.state, CLOSED)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import gzip
+import json
+import unittest
+from types import SimpleNamespace
+
+from export import csv_export, export_pages, gzip_stream, keyset_pages, ndjson_export
+
+
+class FakeQuery:
+    """Just enough of a PostgREST query builder to page through a table"""
+
+    def __init__(self, supabase, table, columns):
+        self.supabase = supabase
+        self.table = table
+        self.columns = [column.strip() for column in columns.split(',')]
+        self.filters = []
+        self.count = None
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row[column] == value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row[column] > value)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda row: row[column] in values)
+        return self
+
+    def order(self, column):
+        return self
+
+    def limit(self, count):
+        self.count = count
+        return self
+
+    def execute(self):
+        self.supabase.queries.append(self.table)
+        if self.table in self.supabase.failing:
+            raise ConnectionError(f"{self.table} is unavailable")
+        rows = sorted(
+            (row for row in self.supabase.tables[self.table] if all(match(row) for match in self.filters)),
+            key=lambda row: row['id']
+        )[:self.count]
+        return SimpleNamespace(data=[{column: row[column] for column in self.columns} for row in rows])
+
+
+class FakeSupabase:
+    def __init__(self, **tables):
+        self.tables = tables
+        self.queries = []
+        self.failing = set()
+
+    def table(self, name):
+        return SimpleNamespace(select=lambda columns: FakeQuery(self, name, columns))
+
+
+def trip(id, user_id='alice'):
+    return {'id': id, 'user_id': user_id, 'city': f'City {id}', 'country': 'France', 'start_date': '2025-01-01',
+            'end_date': None, 'is_active': False, 'created_at': '2025-01-01T00:00:00+00:00'}
+
+
+class KeysetPagesTest(unittest.TestCase):
+    def test_pages_follow_the_last_id(self):
+        supabase = FakeSupabase(trips=[trip(id) for id in (9, 2, 5, 7, 3)])
+        pages = list(keyset_pages(lambda: supabase.table('trips').select('id'), page_size=2))
+        self.assertEqual(pages, [[{'id': 2}, {'id': 3}], [{'id': 5}, {'id': 7}], [{'id': 9}]])
+        self.assertEqual(len(supabase.queries), 3)
+
+    def test_full_last_page_needs_one_empty_read(self):
+        supabase = FakeSupabase(trips=[trip(id) for id in (1, 2, 3, 4)])
+        pages = list(keyset_pages(lambda: supabase.table('trips').select('id'), page_size=2))
+        self.assertEqual(len(pages), 2)
+        self.assertEqual(len(supabase.queries), 3)
+
+    def test_no_rows(self):
+        supabase = FakeSupabase(trips=[])
+        self.assertEqual(list(keyset_pages(lambda: supabase.table('trips').select('id'))), [])
+
+
+class ExportPagesTest(unittest.TestCase):
+    def test_only_the_users_rows(self):
+        supabase = FakeSupabase(trips=[trip(1), trip(2, 'bob'), trip(3)])
+        rows = [row for page in export_pages(supabase, 'alice', 'trips') for row in page]
+        self.assertEqual([row['id'] for row in rows], [1, 3])
+        self.assertNotIn('user_id', rows[0])
+
+    def test_friends_from_either_side(self):
+        supabase = FakeSupabase(
+            friends=[
+                {'id': 1, 'person_1_id': 'alice', 'person_2_id': 'bob', 'created_at': '2025-01-01'},
+                {'id': 2, 'person_1_id': 'carol', 'person_2_id': 'alice', 'created_at': '2025-01-02'},
+                {'id': 3, 'person_1_id': 'bob', 'person_2_id': 'carol', 'created_at': '2025-01-03'},
+            ],
+            users=[
+                {'id': 'bob', 'email': 'bob@example.com', 'name': 'Bob'},
+                {'id': 'carol', 'email': 'carol@example.com', 'name': 'Carol'},
+            ],
+        )
+        rows = [row for page in export_pages(supabase, 'alice', 'friends', page_size=1) for row in page]
+        self.assertEqual(
+            [(row['id'], row['friend_id'], row['friend_name']) for row in rows],
+            [(1, 'bob', 'Bob'), (2, 'carol', 'Carol')]
+        )
+
+
+class ExportFormatsTest(unittest.TestCase):
+    def test_ndjson_has_a_header_and_typed_records(self):
+        supabase = FakeSupabase(trips=[trip(1), trip(2)])
+        lines = ''.join(ndjson_export(supabase, 'alice', ['trips'])).splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(records[0]['type'], 'export')
+        self.assertEqual([(record['type'], record['id']) for record in records[1:]], [('trip', 1), ('trip', 2)])
+
+    def test_ndjson_reports_a_failed_read_in_band(self):
+        supabase = FakeSupabase(trips=[trip(1)])
+        supabase.failing.add('trips')
+        last = json.loads(''.join(ndjson_export(supabase, 'alice', ['trips'])).splitlines()[-1])
+        self.assertEqual(last, {'type': 'error', 'error': 'trips is unavailable'})
+
+    def test_csv_without_rows_is_just_the_header(self):
+        supabase = FakeSupabase(trips=[])
+        self.assertEqual(
+            ''.join(csv_export(supabase, 'alice', 'trips')).strip(),
+            'id,city,country,start_date,end_date,is_active,created_at'
+        )
+
+    def test_gzip_stream_round_trips(self):
+        chunks = ['{"type": "export"}\n', '{"type": "trip"}\n']
+        self.assertEqual(gzip.decompress(b''.join(gzip_stream(chunks))).decode(), ''.join(chunks))
+
+
+if __name__ == '__main__':
+    unittest.main()
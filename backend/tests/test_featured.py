@@ -0,0 +1,120 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import featured
+from featured import FeaturedLists, TripIndex, compute_featured_lists, list_id
+
+START = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+
+def trip(user_id, city, start_day, end_day=None):
+    return {
+        'user_id': user_id,
+        'city': city,
+        'start_date': (START + timedelta(days=start_day)).isoformat(),
+        'end_date': (START + timedelta(days=end_day)).isoformat() if end_day is not None else None,
+    }
+
+
+def review(user_id, place_id, rating, category='Museum', day=1):
+    return {
+        'user_id': user_id,
+        'place_id': place_id,
+        'place_name': place_id.title(),
+        'category': category,
+        'rating': rating,
+        'created_at': (START + timedelta(days=day)).isoformat(),
+    }
+
+
+class TripIndexTest(unittest.TestCase):
+    def test_city_during_a_trip(self):
+        index = TripIndex([trip('alice', 'paris', 0, 5), trip('alice', 'rome', 10, 12)])
+        self.assertEqual(index.city_at('alice', START + timedelta(days=3)), 'Paris')
+        self.assertEqual(index.city_at('alice', START + timedelta(days=11)), 'Rome')
+
+    def test_no_city_between_or_before_trips(self):
+        index = TripIndex([trip('alice', 'paris', 0, 5), trip('alice', 'rome', 10, 12)])
+        self.assertIsNone(index.city_at('alice', START + timedelta(days=7)))
+        self.assertIsNone(index.city_at('alice', START - timedelta(days=1)))
+        self.assertIsNone(index.city_at('bob', START + timedelta(days=3)))
+
+    def test_active_trip_runs_until_now(self):
+        index = TripIndex([trip('alice', 'paris', 0)])
+        self.assertEqual(index.city_at('alice', START + timedelta(days=30)), 'Paris')
+
+
+class ComputeFeaturedListsTest(unittest.TestCase):
+    def setUp(self):
+        for name, value in (('PRIOR_WEIGHT', 5), ('MIN_REVIEWS', 3), ('MIN_PLACES', 3)):
+            patcher = mock.patch.object(featured, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.users = [f'user{i}' for i in range(40)]
+        self.trips = [trip(user_id, 'Paris', 0, 10) for user_id in self.users]
+
+    def reviews(self, place_id, *ratings, category='Museum'):
+        return [review(user_id, place_id, rating, category) for user_id, rating in zip(self.users, ratings)]
+
+    def test_many_good_ratings_beat_a_few_perfect_ones(self):
+        reviews = (
+            self.reviews('louvre', *[9] * 40)
+            + self.reviews('orsay', 10, 10, 10)
+            + self.reviews('pompidou', *[4] * 30)
+        )
+        lists = compute_featured_lists(reviews, self.trips)
+        top = next(l for l in lists if l['id'] == list_id('Paris'))
+        self.assertEqual([p['place_id'] for p in top['places']], ['louvre', 'orsay', 'pompidou'])
+        # Pulled toward the mean of every review
+        prior_mean = sum(r['rating'] for r in reviews) / len(reviews)
+        self.assertAlmostEqual(top['places'][1]['score'], (5 * prior_mean + 30) / 8, places=3)
+
+    def test_places_and_lists_below_the_minimums_are_left_out(self):
+        reviews = (
+            self.reviews('louvre', 9, 9, 9)
+            + self.reviews('orsay', 8, 8, 8)
+            + self.reviews('pompidou', 10, 10)
+            + self.reviews('luxembourg', 7, 7, 7, category='Park')
+        )
+        lists = compute_featured_lists(reviews, self.trips)
+        self.assertEqual([l['id'] for l in lists], [list_id('Paris')])
+        self.assertEqual(
+            [p['place_id'] for p in lists[0]['places']], ['louvre', 'orsay', 'luxembourg']
+        )
+
+    def test_reviews_outside_a_trip_are_ignored(self):
+        reviews = self.reviews('louvre', 9, 9, 9) + self.reviews('orsay', 8, 8, 8)
+        reviews += [dict(r, created_at=(START + timedelta(days=20)).isoformat()) for r in self.reviews('pompidou', 10, 10, 10)]
+        self.assertEqual(compute_featured_lists(reviews, self.trips), [])
+
+    def test_category_lists(self):
+        reviews = []
+        for place_id in ('louvre', 'orsay', 'pompidou'):
+            reviews += self.reviews(place_id, 8, 9, 10)
+        lists = compute_featured_lists(reviews, self.trips)
+        self.assertEqual({l['id'] for l in lists}, {list_id('Paris'), list_id('Paris', 'Museum')})
+        museums = next(l for l in lists if l['category'] == 'Museum')
+        self.assertEqual(museums['title'], 'Top Museums in Paris')
+        self.assertIn('rated by 3 travelers', museums['description'])
+
+
+class FeaturedListsTest(unittest.TestCase):
+    def test_replace_swaps_the_snapshot(self):
+        snapshot = FeaturedLists()
+        lists = [
+            {'id': 'paris-top', 'places': [{'place_id': 'louvre'}], 'computed_at': '2025-06-01T00:00:00+00:00'},
+            {'id': 'rome-top', 'places': [], 'computed_at': '2025-06-02T00:00:00+00:00'},
+        ]
+        snapshot.replace(lists)
+        self.assertEqual(snapshot.summaries(1), [{'id': 'paris-top', 'computed_at': '2025-06-01T00:00:00+00:00'}])
+        self.assertEqual(snapshot.get('paris-top')['places'], [{'place_id': 'louvre'}])
+        self.assertEqual(snapshot.computed_at, '2025-06-02T00:00:00+00:00')
+
+        snapshot.replace([])
+        self.assertIsNone(snapshot.get('paris-top'))
+        self.assertIsNone(snapshot.computed_at)
+
+
+if __name__ == '__main__':
+    unittest.main()
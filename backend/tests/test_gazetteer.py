@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import gazetteer
+
+
+class DefaultGazetteerTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(gazetteer, '_default', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def load(self, path):
+        with mock.patch.object(gazetteer, 'GAZETTEER_PATH', path):
+            with self.assertLogs(gazetteer.logger, 'WARNING'):
+                return gazetteer.default_gazetteer()
+
+    def test_missing_file_falls_back_to_google(self):
+        self.assertIsNone(self.load('/nonexistent/cities.tsv'))
+
+    def test_unreadable_file_falls_back_to_google(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertIsNone(self.load(directory))
+
+    def test_malformed_file_falls_back_to_google(self):
+        for content in (b'', b'Paris with no columns\n', b'\xff\xfe\tbroken\n'):
+            with tempfile.NamedTemporaryFile(suffix='.tsv', delete=False) as f:
+                f.write(content)
+            self.addCleanup(os.unlink, f.name)
+            gazetteer._default = None
+            self.assertIsNone(self.load(f.name))
+
+    def test_failure_is_not_retried(self):
+        self.load('/nonexistent/cities.tsv')
+        with mock.patch.object(gazetteer, 'Gazetteer') as loader:
+            self.assertIsNone(gazetteer.default_gazetteer())
+        loader.assert_not_called()
+
+    def test_bundled_file_loads(self):
+        self.assertIsNotNone(gazetteer.default_gazetteer())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from hedging import Hedger, LatencyTracker
+
+
+def warmed(max_ratio=1.0, seconds=0.01):
+    """A hedger that has seen enough fast calls to hedge anything slower"""
+    hedger = Hedger('google', max_ratio=max_ratio, min_delay=0.01, min_samples=5)
+    for _ in range(5):
+        hedger.latency.record('details', seconds)
+    hedger._budget = hedger._max_budget
+    return hedger
+
+
+class LatencyTrackerTest(unittest.TestCase):
+    def test_percentile_needs_enough_samples(self):
+        tracker = LatencyTracker(min_samples=3)
+        tracker.record('details', 0.1)
+        self.assertIsNone(tracker.percentile('details', 95))
+        for seconds in (0.2, 0.3, 1.0):
+            tracker.record('details', seconds)
+        self.assertEqual(tracker.percentile('details', 50), 0.3)
+        self.assertEqual(tracker.percentile('details', 99), 1.0)
+
+    def test_old_samples_leave_the_window(self):
+        tracker = LatencyTracker(window=2, min_samples=1)
+        for seconds in (5.0, 0.1, 0.2):
+            tracker.record('details', seconds)
+        self.assertEqual(tracker.percentile('details', 100), 0.2)
+
+
+class HedgerRunTest(unittest.TestCase):
+    def test_no_hedge_without_latency_history(self):
+        hedger = Hedger('google', min_samples=5)
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'primary'
+
+        self.assertEqual(asyncio.run(hedger.run('details', call)), 'primary')
+        self.assertEqual(len(calls), 1)
+
+    def test_slow_primary_loses_to_the_hedge(self):
+        hedger = warmed()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(1.0 if len(calls) == 1 else 0.0)
+            return f'call {len(calls)}'
+
+        started = time.monotonic()
+        self.assertEqual(asyncio.run(hedger.run('details', call)), 'call 2')
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(len(calls), 2)
+
+    def test_failed_hedge_waits_for_the_primary(self):
+        hedger = warmed()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            if len(calls) == 2:
+                raise ValueError('hedge failed')
+            await asyncio.sleep(0.1)
+            return 'primary'
+
+        self.assertEqual(asyncio.run(hedger.run('details', call)), 'primary')
+
+    def test_over_budget_waits_for_the_primary(self):
+        hedger = warmed(max_ratio=0.05)
+        hedger._budget = 0
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'primary'
+
+        self.assertEqual(asyncio.run(hedger.run('details', call)), 'primary')
+        self.assertEqual(len(calls), 1)
+
+    def test_zero_ratio_turns_hedging_off(self):
+        hedger = warmed(max_ratio=0)
+        self.assertIsNone(hedger.delay('details'))
+
+
+class HedgerRunSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(4)
+        self.addCleanup(self.executor.shutdown, wait=True)
+
+    def test_fast_call_runs_once(self):
+        hedger = warmed(seconds=0.5)
+        calls = []
+
+        def call():
+            calls.append(threading.current_thread())
+            return 'primary'
+
+        self.assertEqual(hedger.run_sync('details', call, self.executor), 'primary')
+        self.assertEqual(len(calls), 1)
+
+    def test_slow_primary_loses_to_the_hedge(self):
+        hedger = warmed()
+        release = threading.Event()
+        self.addCleanup(release.set)
+        calls = []
+        lock = threading.Lock()
+
+        def call():
+            with lock:
+                calls.append(1)
+                first = len(calls) == 1
+            if first:
+                release.wait(5)
+                return 'primary'
+            return 'hedge'
+
+        self.assertEqual(hedger.run_sync('details', call, self.executor), 'hedge')
+        self.assertEqual(len(calls), 2)
+
+    def test_both_failing_raises(self):
+        hedger = warmed()
+
+        def call():
+            time.sleep(0.05)
+            raise ValueError('upstream down')
+
+        with self.assertRaises(ValueError):
+            hedger.run_sync('details', call, self.executor)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import app
+from circuit_breaker import HALF_OPEN, CircuitBreaker, CircuitOpen
+
+
+class FakeOpenAI:
+    """Stands in for the OpenAI client; each completion takes `delay` seconds, or raises `error`"""
+
+    def __init__(self, delay=0.05, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def with_options(self, **kwargs):
+        return self
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='{"picks": []}'))])
+
+
+class OpenAIBreakerTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker('openai', slow_call=1.0, min_calls=100)
+        self.openai = FakeOpenAI()
+        for name, value in (('openai_breaker', self.breaker), ('openai_client', self.openai)):
+            patcher = mock.patch.object(app, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def chat(self, prompt='hello'):
+        return app.openai_chat_async(None, model='test', messages=[{'role': 'user', 'content': prompt}])
+
+    async def test_coalesced_calls_count_once(self):
+        self.openai.error = RuntimeError('boom')
+        results = await asyncio.gather(*(self.chat() for _ in range(5)), return_exceptions=True)
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        self.assertEqual(self.openai.calls, 1)
+        self.assertEqual(self.breaker.stats()['recent_failures'], 1)
+
+    async def test_waiters_do_not_use_up_half_open_probes(self):
+        breaker = CircuitBreaker('openai', min_calls=1, open_for=0.0, probes=2)
+        breaker.record(False, 0.0)
+        with mock.patch.object(app, 'openai_breaker', breaker):
+            await asyncio.gather(*(self.chat() for _ in range(5)))
+            self.assertEqual(breaker.state, HALF_OPEN)
+            # The second probe is still available
+            await self.chat('another prompt')
+        self.assertEqual(breaker.stats()['state'], 'closed')
+
+    async def test_our_deadline_is_not_an_openai_failure(self):
+        self.openai.delay = 0.5
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(self.chat(), timeout=0.05)
+        self.assertEqual(self.breaker.stats()['recent_calls'], 0)
+
+    async def test_deadline_after_a_slow_call_counts_as_slow(self):
+        self.breaker.slow_call = 0.05
+        self.openai.delay = 0.5
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(self.chat(), timeout=0.1)
+        stats = self.breaker.stats()
+        self.assertEqual((stats['recent_failures'], stats['recent_slow_calls']), (0, 1))
+
+    async def test_open_circuit_skips_the_call(self):
+        breaker = CircuitBreaker('openai', min_calls=1, open_for=60.0)
+        breaker.record(False, 0.0)
+        with mock.patch.object(app, 'openai_breaker', breaker):
+            with self.assertRaises(CircuitOpen):
+                await self.chat()
+        self.assertEqual(self.openai.calls, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import copy
+import unittest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest import mock
+
+import app
+from preferences import HALF_LIFE_DAYS, apply_rating, empty_profile, profile_from_reviews, rating_stats
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def rated(*ratings):
+    """A profile from (place_id, rating, category) tuples, one day apart"""
+    profile = empty_profile('alice')
+    for day, (place_id, rating, category) in enumerate(ratings):
+        apply_rating(profile, place_id, place_id.title(), rating, category, at=START + timedelta(days=day))
+    return profile
+
+
+class ApplyRatingTest(unittest.TestCase):
+    def test_affinity_is_centered(self):
+        profile = rated(('louvre', 10, 'Museum'), ('park', 1, 'Park'))
+        self.assertAlmostEqual(profile['category_affinity']['Museum'], 1.0, places=2)
+        self.assertAlmostEqual(profile['category_affinity']['Park'], -1.0, places=2)
+
+    def test_rerating_replaces_the_old_rating(self):
+        profile = rated(('louvre', 10, 'Museum'))
+        apply_rating(profile, 'louvre', 'Louvre', 1, 'Museum', previous_rating=10, previous_category='Museum', at=START)
+        self.assertEqual(profile['review_count'], 1)
+        self.assertEqual(rating_stats(profile), (1.0, 0.0))
+        self.assertAlmostEqual(profile['category_affinity']['Museum'], -1.0, places=2)
+        self.assertEqual(profile['top_places'], profile['bottom_places'])
+        self.assertEqual(profile['top_places'][0]['rating'], 1)
+
+    def test_changing_category_moves_the_rating(self):
+        profile = rated(('louvre', 10, 'Museum'))
+        apply_rating(profile, 'louvre', 'Louvre', 10, 'Landmark', previous_rating=10, previous_category='Museum', at=START)
+        self.assertAlmostEqual(profile['category_affinity']['Museum'], 0.0, places=4)
+        self.assertAlmostEqual(profile['category_affinity']['Landmark'], 1.0, places=2)
+
+    def test_rerating_without_an_old_category_leaves_others_alone(self):
+        profile = rated(('park', 10, 'Park'), ('louvre', 1, None))
+        apply_rating(profile, 'louvre', 'Louvre', 10, 'Museum', previous_rating=1, at=START + timedelta(days=1))
+        self.assertAlmostEqual(profile['category_affinity']['Park'], 1.0, places=2)
+        self.assertAlmostEqual(profile['category_affinity']['Museum'], 1.0, places=2)
+
+    def test_weights_halve_every_half_life(self):
+        profile = rated(('louvre', 10, 'Museum'))
+        later = START + timedelta(days=HALF_LIFE_DAYS)
+        apply_rating(profile, 'park', 'Park', 1, 'Park', at=later)
+        self.assertAlmostEqual(profile['weight'], 1.5)
+        # The newer rating counts twice as much
+        self.assertAlmostEqual(rating_stats(profile)[0], (10 * 0.5 + 1) / 1.5)
+        self.assertAlmostEqual(profile['category_affinity']['Museum'], 0.5, places=2)
+
+    def test_faded_affinities_are_dropped(self):
+        profile = rated(('louvre', 10, 'Museum'))
+        apply_rating(profile, 'park', 'Park', 10, 'Park', at=START + timedelta(days=HALF_LIFE_DAYS * 7))
+        self.assertNotIn('Museum', profile['category_affinity'])
+
+    def test_profile_from_reviews_matches_incremental_updates(self):
+        reviews = [
+            {'place_id': 'park', 'place_name': 'Park', 'rating': 3, 'category': 'Park',
+             'created_at': (START + timedelta(days=1)).isoformat()},
+            {'place_id': 'louvre', 'place_name': 'Louvre', 'rating': 10, 'category': 'Museum',
+             'created_at': START.isoformat()},
+        ]
+        self.assertEqual(profile_from_reviews('alice', reviews), rated(('louvre', 10, 'Museum'), ('park', 3, 'Park')))
+
+
+class FakeQuery:
+    """Just enough of a PostgREST query builder for the user_preferences table"""
+
+    def __init__(self, table, action, values=None):
+        self.table = table
+        self.action = action
+        self.values = values
+        self.filters = []
+
+    def eq(self, column, value):
+        self.filters.append((column, value))
+        return self
+
+    def is_(self, column, value):
+        self.filters.append((column, None))
+        return self
+
+    def execute(self):
+        self.table.before_execute(self)
+        matches = [row for row in self.table.rows if all(row.get(c) == v for c, v in self.filters)]
+        if self.action == 'update':
+            for row in matches:
+                row.update(copy.deepcopy(self.values))
+        return SimpleNamespace(data=copy.deepcopy(matches))
+
+
+class FakePreferences:
+    def __init__(self, rows):
+        self.rows = rows
+        self.before_execute = lambda query: None
+
+    def table(self, name):
+        return self
+
+    def select(self, columns):
+        return FakeQuery(self, 'select')
+
+    def update(self, values):
+        return FakeQuery(self, 'update', values)
+
+
+class UpdatePreferenceProfileTest(unittest.TestCase):
+    def setUp(self):
+        profile = rated(('louvre', 10, 'Museum'))
+        self.supabase = FakePreferences([profile])
+        patchers = [mock.patch.object(app, 'supabase', self.supabase), mock.patch.object(app.time, 'sleep')]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_lost_race_is_redone_on_a_fresh_read(self):
+        writes = []
+
+        def concurrent_writer(query):
+            # Another request rates a park between our read and our write
+            if query.action == 'update' and not writes:
+                writes.append(query)
+                row = self.supabase.rows[0]
+                apply_rating(row, 'park', 'Park', 1, 'Park', at=datetime.now(timezone.utc))
+
+        self.supabase.before_execute = concurrent_writer
+        app.update_preference_profile('alice', 'tower', 'Tower', 9, 'Landmark')
+
+        row = self.supabase.rows[0]
+        self.assertEqual(row['review_count'], 3)
+        self.assertEqual(set(row['category_affinity']), {'Museum', 'Park', 'Landmark'})
+
+    def test_gives_up_after_repeated_races(self):
+        def always_beaten(query):
+            if query.action == 'update':
+                row = self.supabase.rows[0]
+                row['updated_at'] = (datetime.fromisoformat(row['updated_at']) + timedelta(seconds=1)).isoformat()
+
+        self.supabase.before_execute = always_beaten
+        with self.assertLogs(app.app.logger, 'WARNING') as logs:
+            app.update_preference_profile('alice', 'tower', 'Tower', 9, 'Landmark')
+        self.assertIn('Gave up', logs.output[0])
+        self.assertEqual(self.supabase.rows[0]['review_count'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
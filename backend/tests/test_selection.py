@@ -0,0 +1,29 @@
+import json
+import unittest
+
+from app import parse_selection
+
+
+def answer(*picks):
+    return json.dumps({'picks': list(picks)})
+
+
+class ParseSelectionTest(unittest.TestCase):
+    def test_first_ten_valid_picks(self):
+        self.assertEqual(parse_selection(answer(*range(12, 0, -1)), 25), list(range(11, 1, -1)))
+
+    def test_duplicates_and_out_of_range_picks_are_skipped(self):
+        picks = answer(1, 1, 0, 26, *range(2, 12))
+        self.assertEqual(parse_selection(picks, 25), list(range(0, 10)))
+
+    def test_too_few_picks(self):
+        self.assertIsNone(parse_selection(answer(*range(1, 10)), 25))
+        self.assertIsNone(parse_selection('not json', 25))
+
+    def test_city_with_fewer_than_ten_candidates(self):
+        self.assertEqual(parse_selection(answer(3, 1, 2), 3), [2, 0, 1])
+        self.assertIsNone(parse_selection(answer(3, 1), 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
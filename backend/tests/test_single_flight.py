@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import unittest
+
+from single_flight import SingleFlight
+
+
+class SingleFlightTest(unittest.TestCase):
+    def test_concurrent_calls_share_one_result(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'paris'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do('paris', fetch)))
+        leader.start()
+        started.wait(5)
+        waiters = [threading.Thread(target=lambda: results.append(flight.do('paris', fetch))) for _ in range(3)]
+        for thread in waiters:
+            thread.start()
+        release.set()
+        for thread in [leader, *waiters]:
+            thread.join(5)
+
+        self.assertEqual(results, ['paris'] * 4)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_leader_exception_reaches_the_waiters(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+
+        def fetch():
+            started.set()
+            release.wait(5)
+            raise ValueError('upstream down')
+
+        errors = []
+
+        def call():
+            try:
+                flight.do('paris', fetch)
+            except ValueError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait(5)
+        waiter = threading.Thread(target=call)
+        waiter.start()
+        release.set()
+        leader.join(5)
+        waiter.join(5)
+
+        self.assertEqual(len(errors), 2)
+        self.assertIs(errors[0], errors[1])
+        # The next call starts a new flight instead of replaying the error
+        self.assertEqual(flight.do('paris', lambda: 'paris'), 'paris')
+
+    def test_waiter_gives_up_on_a_slow_leader(self):
+        flight = SingleFlight(timeout=0.05)
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return 'leader'
+
+        leader = threading.Thread(target=flight.do, args=('paris', slow))
+        leader.start()
+        started.wait(5)
+        self.assertEqual(flight.do('paris', lambda: 'own call'), 'own call')
+        release.set()
+        leader.join(5)
+
+    def test_sync_and_async_callers_share_a_flight(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            started.set()
+            await asyncio.sleep(0.1)
+            return 'paris'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(asyncio.run(flight.do_async('paris', fetch))))
+        leader.start()
+        started.wait(5)
+        # A sync caller and an async caller on another loop join it
+        waiters = [
+            threading.Thread(target=lambda: results.append(flight.do('paris', lambda: 'own call'))),
+            threading.Thread(target=lambda: results.append(asyncio.run(flight.do_async('paris', fetch)))),
+        ]
+        for thread in waiters:
+            thread.start()
+        for thread in [leader, *waiters]:
+            thread.join(5)
+
+        self.assertEqual(results, ['paris'] * 3)
+        self.assertEqual(len(calls), 1)
+
+    def test_cancelled_leader_lets_waiters_call_themselves(self):
+        flight = SingleFlight()
+
+        async def scenario():
+            started = asyncio.Event()
+
+            async def hang():
+                started.set()
+                await asyncio.sleep(5)
+
+            async def own_call():
+                return 'own call'
+
+            leader = asyncio.ensure_future(flight.do_async('paris', hang))
+            await started.wait()
+            waiter = asyncio.ensure_future(flight.do_async('paris', own_call))
+            await asyncio.sleep(0)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await waiter
+
+        self.assertEqual(asyncio.run(scenario()), 'own call')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,7 @@
+-- Add the place category (Museum, Park, ...) to reviews so featured lists can be built per category
+-- Filled in by the backend when the app sends a category with a rating
+
+ALTER TABLE public.reviews
+ADD COLUMN IF NOT EXISTS category TEXT;
+
+COMMENT ON COLUMN public.reviews.category IS 'Category of the reviewed place, as shown in the app';
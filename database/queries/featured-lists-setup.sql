@@ -0,0 +1,37 @@
+-- =====================================================
+-- Featured Lists Table
+-- =====================================================
+
+-- Snapshot of the feed's featured lists, recomputed from reviews by the backend's
+-- refresh_featured_lists job (see backend/featured.py). Each row is one list with its ranked places.
+CREATE TABLE IF NOT EXISTS public.featured_lists (
+    id TEXT PRIMARY KEY,
+    city TEXT NOT NULL,
+    category TEXT,
+    title TEXT NOT NULL,
+    description TEXT,
+    image_url TEXT,
+    place_count INTEGER NOT NULL,
+    places JSONB NOT NULL DEFAULT '[]'::jsonb,
+    computed_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+-- Enable RLS on featured_lists table
+ALTER TABLE public.featured_lists ENABLE ROW LEVEL SECURITY;
+
+-- Featured lists are aggregate data: anyone can read them, only the backend (service role) writes them
+CREATE POLICY "Anyone can view featured lists" ON public.featured_lists
+    FOR SELECT USING (true);
+
+-- =====================================================
+-- Indexes for Performance
+-- =====================================================
+
+-- Index for removing lists left over from an older snapshot
+CREATE INDEX IF NOT EXISTS idx_featured_lists_computed_at ON public.featured_lists(computed_at);
+
+-- =====================================================
+-- Grant Permissions
+-- =====================================================
+
+GRANT SELECT ON public.featured_lists TO authenticated;
@@ -0,0 +1,17 @@
+-- =====================================================
+-- Job Leases Table
+-- =====================================================
+
+-- One row per scheduled backend job that must only run in one worker at a time
+-- (e.g. refresh_featured_lists). A worker runs the job after a conditional update
+-- moves expires_at forward, which only succeeds once the previous lease has expired.
+CREATE TABLE IF NOT EXISTS public.job_leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+-- Enable RLS on job_leases table
+ALTER TABLE public.job_leases ENABLE ROW LEVEL SECURITY;
+
+-- No policies: only the backend (service role) reads or writes leases
@@ -0,0 +1,45 @@
+-- =====================================================
+-- Places Catalog Table
+-- =====================================================
+
+-- One row per Google place the backend has seen, written in batches from
+-- /attractions, /trip/recommendations and /attraction_details responses.
+-- /attraction_details is answered from here while the row is fresh enough.
+CREATE TABLE IF NOT EXISTS public.places (
+    place_id TEXT PRIMARY KEY,
+    name TEXT,
+    address TEXT,
+    latitude DECIMAL(10, 8),
+    longitude DECIMAL(11, 8),
+    category TEXT,
+    types JSONB NOT NULL DEFAULT '[]'::jsonb,
+    rating REAL,
+    user_ratings_total INTEGER,
+    photos JSONB NOT NULL DEFAULT '[]'::jsonb,
+    details JSONB,
+    refreshed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    details_refreshed_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Enable RLS on places table
+ALTER TABLE public.places ENABLE ROW LEVEL SECURITY;
+
+-- Place data is public; only the backend (service role) writes it
+CREATE POLICY "Anyone can view places" ON public.places
+    FOR SELECT USING (true);
+
+-- =====================================================
+-- Indexes for Performance
+-- =====================================================
+
+-- Index for finding places by location
+CREATE INDEX IF NOT EXISTS idx_places_coordinates ON public.places(latitude, longitude);
+
+-- Index for finding places by category
+CREATE INDEX IF NOT EXISTS idx_places_category ON public.places(category);
+
+-- =====================================================
+-- Grant Permissions
+-- =====================================================
+
+GRANT SELECT ON public.places TO authenticated;
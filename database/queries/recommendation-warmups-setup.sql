@@ -0,0 +1,21 @@
+-- =====================================================
+-- Recommendation Warmups Table
+-- =====================================================
+
+-- What the backend's warm_recommendations job looked up when a user started a trip:
+-- the Google geocode/nearby search responses and the AI selection for that city.
+-- The worker that serves the user's next /trip/recommendations copies them into its
+-- in-memory caches, so the request doesn't wait on Google or OpenAI even when the
+-- job ran on another worker. Rows older than the caches' TTLs are ignored.
+CREATE TABLE IF NOT EXISTS public.recommendation_warmups (
+    user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    city TEXT NOT NULL,
+    entries JSONB NOT NULL DEFAULT '{}'::jsonb,
+    warmed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, city)
+);
+
+-- Enable RLS on recommendation_warmups table
+ALTER TABLE public.recommendation_warmups ENABLE ROW LEVEL SECURITY;
+
+-- No policies: only the backend (service role) reads or writes warmups
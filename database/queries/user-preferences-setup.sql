@@ -0,0 +1,32 @@
+-- =====================================================
+-- User Preferences Table
+-- =====================================================
+
+-- One row per user, maintained by the backend as ratings come in (see backend/preferences.py).
+-- Recommendations read this row instead of re-reading the user's reviews.
+-- Users who rated before this table existed get a row built from their reviews on first use.
+CREATE TABLE IF NOT EXISTS public.user_preferences (
+    user_id UUID PRIMARY KEY REFERENCES auth.users(id) ON DELETE CASCADE,
+    weight DOUBLE PRECISION NOT NULL DEFAULT 0,
+    rating_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    rating_sq_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    category_affinity JSONB NOT NULL DEFAULT '{}'::jsonb,
+    top_places JSONB NOT NULL DEFAULT '[]'::jsonb,
+    bottom_places JSONB NOT NULL DEFAULT '[]'::jsonb,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Enable RLS on user_preferences table
+ALTER TABLE public.user_preferences ENABLE ROW LEVEL SECURITY;
+
+-- RLS Policies for user_preferences table
+-- Users can only view their own profile; only the backend (service role) writes it
+CREATE POLICY "Users can view their own preferences" ON public.user_preferences
+    FOR SELECT USING (auth.uid() = user_id);
+
+-- =====================================================
+-- Grant Permissions
+-- =====================================================
+
+GRANT SELECT ON public.user_preferences TO authenticated;
@@ -299,6 +299,7 @@ export default function Trip() {
         body: JSON.stringify({
           place_id: selectedPlace.place_id,
           place_name: selectedPlace.name,
+          category: selectedPlace.category,
           rating: userRating,
           comment: userComment,
           latitude: selectedPlace.location.lat,